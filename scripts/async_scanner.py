@@ -0,0 +1,173 @@
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+import metrics
+from rpc_client import JSON_HEADERS, dumps, format_block, format_log, loads
+from rpc_pool import MIN_RATE, RATE_INCREASE, RATE_LIMIT_COOLDOWN, is_rate_limit_error
+
+# Constants
+ENDPOINT_RATE_LIMIT = float(os.getenv("ASYNC_ENDPOINT_RATE_LIMIT", "3"))  # Requests per second per endpoint
+ENDPOINT_CONCURRENCY = int(os.getenv("ASYNC_ENDPOINT_CONCURRENCY", "4"))  # In-flight requests per endpoint
+CALLS_PER_REQUEST = int(os.getenv("ASYNC_CALLS_PER_REQUEST", "10"))  # JSON-RPC calls per batched request
+MAX_ATTEMPTS = 3  # Attempts per call before giving up (each retry may land on another endpoint)
+RETRY_BACKOFF = 0.5  # Seconds a worker waits before requeueing a failed chunk, doubling per attempt
+REQUEST_TIMEOUT = 30
+
+
+# Token bucket that spaces out requests to a single endpoint. Its rate adapts like the sync pool's (AIMD):
+# halved with a pause after a 429, raised a little after each success up to the configured rate.
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    def slow_down(self, pause):
+        self.rate = max(self.rate / 2, MIN_RATE)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def speed_up(self):
+        self.rate = min(self.rate + RATE_INCREASE, self.max_rate)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Seconds a rate-limited endpoint asks to be left alone (aiohttp errors carry the response headers)
+def get_retry_after(error):
+    try:
+        return float(error.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+# Pull chunks of calls off the shared queue and send each chunk to one endpoint as a JSON-RPC batch.
+# A failed chunk is requeued after a backoff, so another endpoint can take it; a 429 also slows this endpoint.
+async def endpoint_worker(session, rpc_url, bucket, queue, results, errors):
+    while True:
+        chunk, attempt = await queue.get()
+        calls = [(method, params) for _, method, params in chunk]
+        start = None
+        try:
+            await bucket.acquire()
+            payload = [{"jsonrpc": "2.0", "id": index, "method": method, "params": params} for index, method, params in chunk]
+            start = time.perf_counter()
+            async with session.post(rpc_url, data=dumps(payload), headers=JSON_HEADERS) as response:
+                response.raise_for_status()
+                body = loads(await response.read())
+            if not isinstance(body, list):
+                raise RuntimeError(f"Batch rejected: {body}")
+            answered = set()
+            for item in body:
+                index = item.get("id")
+                answered.add(index)
+                if item.get("error") is not None:
+                    errors[index] = item["error"]
+                else:
+                    results[index] = item.get("result")
+                    errors[index] = None
+            for index, _, _ in chunk:
+                if index not in answered:
+                    errors[index] = "missing response in batch"
+            metrics.record_batch(rpc_url, calls, time.perf_counter() - start, sum(1 for index, _, _ in chunk if errors[index] is not None))
+            bucket.speed_up()
+        except Exception as e:
+            if start is not None:
+                metrics.record_batch(rpc_url, calls, time.perf_counter() - start, failed_calls=len(chunk))
+            for index, _, _ in chunk:
+                errors[index] = str(e)
+            if getattr(e, "status", None) == 429 or is_rate_limit_error(e):
+                bucket.slow_down(get_retry_after(e) or RATE_LIMIT_COOLDOWN)
+                logging.warning(f"Async RPC {rpc_url} rate limited, slowing to {bucket.rate:.2f} req/s")
+            if attempt + 1 < MAX_ATTEMPTS:
+                logging.warning(f"Async batch via {rpc_url} failed (attempt {attempt + 1}/{MAX_ATTEMPTS}): {str(e)}")
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+                queue.put_nowait((chunk, attempt + 1))
+        finally:
+            queue.task_done()
+
+
+# Run (method, params) calls concurrently across all endpoints.
+# Returns (results, errors) in the same order as calls.
+async def run_calls_async(rpc_urls, calls):
+    import aiohttp
+
+    results = [None] * len(calls)
+    errors = [None] * len(calls)
+    queue = asyncio.Queue()
+    indexed = [(index, method, params) for index, (method, params) in enumerate(calls)]
+    for chunk_start in range(0, len(indexed), CALLS_PER_REQUEST):
+        queue.put_nowait((indexed[chunk_start:chunk_start + CALLS_PER_REQUEST], 0))
+
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        workers = []
+        for rpc_url in rpc_urls:
+            bucket = TokenBucket(ENDPOINT_RATE_LIMIT)
+            for _ in range(ENDPOINT_CONCURRENCY):
+                workers.append(asyncio.create_task(endpoint_worker(session, rpc_url.strip(), bucket, queue, results, errors)))
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return results, errors
+
+
+def run_calls(rpc_urls, calls):
+    return asyncio.run(run_calls_async(rpc_urls, calls))
+
+
+# Fetch blocks concurrently, with full transactions only when full_transactions is set (the query plan's
+# "transactions"). Returns {block_number: block} for successful fetches.
+def fetch_blocks(rpc_urls, block_numbers, full_transactions=True):
+    start_time = time.time()
+    calls = [("eth_getBlockByNumber", [hex(block_number), full_transactions]) for block_number in block_numbers]
+    results, errors = run_calls(rpc_urls, calls)
+    fetched = {}
+    for block_number, result, error in zip(block_numbers, results, errors):
+        if error or result is None:
+            logging.warning(f"Async fetch failed for block {block_number}: {error}")
+            continue
+        fetched[block_number] = format_block(result)
+    elapsed = time.time() - start_time
+    logging.info(f"Async fetched {len(fetched)}/{len(block_numbers)} blocks across {len(rpc_urls)} endpoints in {elapsed:.2f}s")
+    return fetched
+
+
+# Fetch logs for consecutive block windows concurrently, optionally limited to contract address(es).
+# Returns ({block_number: [logs]}, [(from_block, to_block)] windows that failed).
+def fetch_logs(rpc_urls, from_block, to_block, window, topics, address=None):
+    windows = [(start, min(start + window - 1, to_block)) for start in range(from_block, to_block + 1, window)]
+    filters = [{"fromBlock": hex(start), "toBlock": hex(end), "topics": topics} for start, end in windows]
+    if address is not None:
+        for filter_params in filters:
+            filter_params["address"] = address
+    calls = [("eth_getLogs", [filter_params]) for filter_params in filters]
+    results, errors = run_calls(rpc_urls, calls)
+    logs_by_block = defaultdict(list)
+    failed_windows = []
+    for (start, end), result, error in zip(windows, results, errors):
+        if error or result is None:
+            failed_windows.append((start, end))
+            continue
+        for raw_log in result:
+            log = format_log(raw_log)
+            logs_by_block[log["blockNumber"]].append(log)
+    return logs_by_block, failed_windows
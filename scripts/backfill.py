@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Constants
+DEFAULT_SHARD_SIZE = 10000  # Blocks per shard (~5.5 hours of XDC blocks)
+DEFAULT_WORKERS = 3  # One process per shard; each process has its own RPC pool and rate limits
+PROGRESS_EVERY = 10  # Log shard progress every N batches
+
+
+# Split [from_block, to_block] into consecutive shards
+def make_shards(from_block, to_block, shard_size):
+    return [(start, min(start + shard_size - 1, to_block)) for start in range(from_block, to_block + 1, shard_size)]
+
+
+# Store a flushed chunk of a shard's detections from the worker itself, so no shard holds
+# or sends back more than one chunk of rows however wide it is. Shards never overlap, and the store
+# drops duplicate (tx_hash, log_index) rows within a chunk, so nothing needs merging afterwards.
+def store_chunk(source, rows, from_block, to_block):
+    import transfer_store
+
+    # The large scanner's detectors tag rows with their own source (e.g. USDC.e bridge flows)
+    transfer_store.append_detections(rows, from_block, to_block, [source], source, latest=False)
+
+
+def shard_sink(source, from_block):
+    import sink
+
+    return sink.StreamingSink(None, None, None, from_block, on_flush=lambda rows, start, end: store_chunk(source, rows, start, end))
+
+
+# Scan one shard with the large-transfer scanner. Runs in a worker process.
+def scan_large_shard(shard_id, from_block, to_block):
+    import track_large_token_movements as scanner
+    import price_service
+
+    rpc_pool = scanner.init_web3()
+    w3 = rpc_pool.best().w3
+    xdc_price = price_service.get_price("XDC")
+    output = shard_sink(scanner.CHECKPOINT_NAME, from_block)
+    failed_ranges = []
+    start_time = time.time()
+    batches = 0
+    current_start = from_block
+    while current_start <= to_block:
+        batch_end = min(current_start + scanner.BATCH_SIZE - 1, to_block)
+        batch_transactions, xdc_price, failed_blocks = scanner.scan_batch(rpc_pool, w3, current_start, batch_end, xdc_price)
+        # Stored chunks never claim blocks that failed, so what was stored for them earlier is kept
+        for segment_from, segment_to, rows, failed in scanner.batch_segments(batch_transactions, current_start, batch_end, failed_blocks):
+            if failed:
+                failed_ranges.append((segment_from, segment_to))
+                output.skip(segment_to)
+            else:
+                output.write(rows, segment_to)
+        batches += 1
+        if batches % PROGRESS_EVERY == 0:
+            log_progress(shard_id, from_block, to_block, batch_end, start_time)
+        current_start = batch_end + 1
+    output.close()
+    summary = shard_summary(shard_id, from_block, to_block, output.rows, start_time)
+    summary["failed_ranges"] = failed_ranges
+    return summary
+
+
+# Scan one shard with the bridged token (USDC.e) scanner. Runs in a worker process.
+def scan_usdc_shard(shard_id, from_block, to_block):
+    import track_usdc_bridge_transfers as scanner
+
+    prices = scanner.get_token_prices()
+    output = shard_sink(scanner.CHECKPOINT_NAME, from_block)
+    failed_ranges = []
+    start_time = time.time()
+    batches = 0
+    for block in range(from_block, to_block + 1, scanner.BATCH_SIZE):
+        batch_end = min(block + scanner.BATCH_SIZE - 1, to_block)
+        batch_transfers = scanner.fetch_bridge_transfers(block, batch_end)
+        if batch_transfers is None:
+            # Stored chunks never claim a failed range, so it still shows as a gap
+            failed_ranges.append((block, batch_end))
+            output.skip(batch_end)
+            continue
+        output.write(scanner.filter_transfers(batch_transfers, prices), batch_end)
+        batches += 1
+        if batches % PROGRESS_EVERY == 0:
+            log_progress(shard_id, from_block, to_block, batch_end, start_time)
+    output.close()
+    summary = shard_summary(shard_id, from_block, to_block, output.rows, start_time)
+    summary["failed_ranges"] = failed_ranges
+    return summary
+
+
+def log_progress(shard_id, from_block, to_block, done_block, start_time):
+    done = done_block - from_block + 1
+    total = to_block - from_block + 1
+    elapsed = time.time() - start_time
+    logging.info(f"Shard {shard_id}: {done}/{total} blocks ({done / total * 100:.0f}%), {done / elapsed:.1f} blocks/sec")
+
+
+def shard_summary(shard_id, from_block, to_block, detections, start_time):
+    elapsed = time.time() - start_time
+    blocks = to_block - from_block + 1
+    logging.info(f"Shard {shard_id} done: blocks {from_block} to {to_block} in {elapsed:.1f}s ({blocks / elapsed:.1f} blocks/sec), {detections} detections")
+    return {
+        "shard_id": shard_id,
+        "from_block": from_block,
+        "to_block": to_block,
+        "detections": detections,
+        "elapsed": elapsed,
+        "failed_ranges": [],
+    }
+
+
+SCANNERS = {
+    "large": ("large_transfers", scan_large_shard),
+    "usdc": ("usdc_bridge", scan_usdc_shard),
+}
+
+
+# Run a backfill over [from_block, to_block] for one scanner
+# Each shard stores its own detections chunk by chunk as it scans.
+# Returns (detections stored, sorted failed ranges).
+def backfill(scanner_name, from_block, to_block, shard_size=DEFAULT_SHARD_SIZE, workers=DEFAULT_WORKERS):
+    source, scan_shard = SCANNERS[scanner_name]
+    shards = make_shards(from_block, to_block, shard_size)
+    logging.info(f"Backfilling {source} blocks {from_block} to {to_block} in {len(shards)} shard(s) with {workers} worker(s)")
+    start_time = time.time()
+
+    outputs = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scan_shard, shard_id, start, end): shard_id for shard_id, (start, end) in enumerate(shards)}
+        for future in as_completed(futures):
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                start, end = shards[futures[future]]
+                logging.error(f"Shard {futures[future]} (blocks {start} to {end}) failed: {str(e)}")
+
+    completed = {(output["from_block"], output["to_block"]) for output in outputs}
+    failed_ranges = [shard for shard in shards if shard not in completed]
+    failed_ranges += [tuple(failed) for output in outputs for failed in output["failed_ranges"]]
+
+    detections = sum(output["detections"] for output in outputs)
+    elapsed = time.time() - start_time
+    blocks = to_block - from_block + 1
+    logging.info(f"Backfill done: {blocks} blocks in {elapsed:.1f}s ({blocks / elapsed:.1f} blocks/sec), {detections} detections")
+    for start, end in sorted(failed_ranges):
+        logging.warning(f"Blocks {start} to {end} failed and need another backfill pass")
+    return detections, sorted(failed_ranges)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild detections for an arbitrary block range")
+    parser.add_argument("--from-block", type=int, required=True)
+    parser.add_argument("--to-block", type=int, required=True)
+    parser.add_argument("--scanner", choices=sorted(SCANNERS), default="large")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+    if args.to_block < args.from_block:
+        parser.error("--to-block must not be below --from-block")
+
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+    backfill(args.scanner, args.from_block, args.to_block, args.shard_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+# Constants
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(os.path.expanduser("~"), "xdc-intel", "benchmarks")
+SCENARIOS = ("large", "usdc")
+DEFAULT_HEAD = 100000  # Synthetic chain head; scans cover the last --blocks blocks below it
+RESULT_MARKER = "BENCHMARK_RESULT "
+COMPARED_METRICS = ("blocks_per_sec", "rpc_calls_per_block", "wall_seconds", "startup_seconds", "peak_rss_mb", "cpu_seconds")
+SCENARIO_MODULES = {"large": "track_large_token_movements", "usdc": "track_usdc_bridge_transfers"}
+
+
+# Scan the last `blocks` blocks with track_large_token_movements.process_transactions(). Runs in the child process.
+def run_large(head, blocks):
+    with open(os.path.join(os.path.expanduser("~"), "xdc-intel", "last_block.txt"), "w") as f:
+        f.write(str(head - blocks))
+    import track_large_token_movements as scanner
+    scanner.setup_logging()
+    scanner.process_transactions()
+
+
+# Scan the last `blocks` blocks with the USDC.e tracker's main(). Runs in the child process.
+def run_usdc(head, blocks):
+    import track_usdc_bridge_transfers as scanner
+
+    # The tracker's paths and RPC list are fixed; point them at the benchmark's home and stub nodes
+    work_dir = Path(os.path.expanduser("~")) / "xdc-intel"
+    scanner.RPC_URLS = os.environ["XDC_RPC_URLS"].split(",")
+    scanner.LOG_FILE = work_dir / "usdc_bridge_transfers.log"
+    scanner.LAST_BLOCK_FILE = work_dir / "last_block_usdc.txt"
+    scanner.DATA_DIR = Path(os.path.expanduser("~")) / "xdc-intel-reports" / "data"
+    scanner.LAST_BLOCK_FILE.write_text(str(head - blocks + 1))  # The tracker scans from its last block inclusive
+    scanner.STANDALONE = True  # Benchmark the tracker's own scan even though the large scanner's detector covers it
+    scanner.main()
+
+
+SCENARIO_RUNNERS = {"large": run_large, "usdc": run_usdc}
+
+
+# Child process entry point: run one scenario and print its startup time, wall time, CPU time and peak RSS.
+# Startup runs from interpreter start until the scanner module is imported, as for a cron run of `xdc-intel`.
+def run_child(scenario, head, blocks):
+    import importlib
+    from xdc_intel import process_age
+
+    importlib.import_module(SCENARIO_MODULES[scenario])
+    startup_seconds = process_age()
+    start = time.perf_counter()
+    SCENARIO_RUNNERS[scenario](head, blocks)
+    wall_seconds = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    detections, fingerprint = detections_fingerprint()
+    print(RESULT_MARKER + json.dumps({
+        "detections": detections,
+        "detections_sha1": fingerprint,
+        "wall_seconds": wall_seconds,
+        "startup_seconds": startup_seconds,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+    }), flush=True)
+
+
+# Count and hash of every detection the scenario stored, so two code paths can be checked for identical output
+def detections_fingerprint():
+    import hashlib
+    import transfer_store
+
+    rows = transfer_store.read_transfers().to_dict("records")
+    rows.sort(key=lambda row: (row["source"], row["block_number"], row["log_index"], row["tx_hash"]))
+    return len(rows), hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Run one scenario in a fresh process against the stub nodes and combine its stats with the nodes' counters
+def run_scenario(scenario, args, rpc_urls, chains, extra_env=None):
+    home = tempfile.mkdtemp(prefix=f"xdc-intel-benchmark-{scenario}-")
+    os.makedirs(os.path.join(home, "xdc-intel"))
+    env = dict(
+        os.environ,
+        HOME=home,
+        XDC_RPC_URLS=",".join(rpc_urls),
+        CMC_API_URL=f"{rpc_urls[0]}/v1/cryptocurrency/quotes/latest",
+        CMC_HISTORY_URL=f"{rpc_urls[0]}/v2/cryptocurrency/quotes/historical",
+        CMC_API_KEY="benchmark",
+        **(extra_env or {}),
+    )
+    for chain in chains:
+        chain.reset_counters()
+
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", scenario, "--head", str(args.head), "--blocks", str(args.blocks)],
+            env=env, cwd=SCRIPT_DIR, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.PIPE, text=True,
+        )
+        result_lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+        if completed.returncode != 0 or not result_lines:
+            error_tail = (completed.stderr or "").strip().splitlines()[-5:]
+            raise RuntimeError(f"Scenario {scenario} failed (exit {completed.returncode}): {' | '.join(error_tail)}")
+        result = json.loads(result_lines[-1][len(RESULT_MARKER):])
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    calls_by_method = {}
+    http = {"requests": 0, "rate_limited": 0, "failed": 0}
+    for chain in chains:
+        for method, count in chain.calls.items():
+            calls_by_method[method] = calls_by_method.get(method, 0) + count
+        for key in http:
+            http[key] += chain.http[key]
+    rpc_calls = sum(calls_by_method.values())
+    result.update({
+        "blocks": args.blocks,
+        "blocks_per_sec": args.blocks / result["wall_seconds"],
+        "rpc_calls": rpc_calls,
+        "rpc_calls_per_block": rpc_calls / args.blocks,
+        "http_requests": http["requests"],
+        "http_requests_per_block": http["requests"] / args.blocks,
+        "rate_limited": http["rate_limited"],
+        "failed": http["failed"],
+        "calls_by_method": calls_by_method,
+    })
+    return result
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SCRIPT_DIR, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+# Latest earlier result recorded with the same configuration, if any
+def load_previous(results_dir, config):
+    for path in sorted(glob.glob(os.path.join(results_dir, "benchmark_*.json")), reverse=True):
+        try:
+            with open(path, "r") as f:
+                previous = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if previous.get("config") == config:
+            return previous
+    return None
+
+
+def print_report(report, previous):
+    print(f"Benchmark at {report['commit'] or 'unknown commit'}{' (dirty)' if report['dirty'] else ''}")
+    for scenario, result in report["results"].items():
+        print(f"  {scenario}:")
+        before = (previous or {}).get("results", {}).get(scenario, {})
+        for metric in COMPARED_METRICS:
+            if metric not in result:
+                continue
+            line = f"    {metric:<22} {result[metric]:>10.3f}"
+            if before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                line += f"   ({change:+.1f}% vs {previous['commit']})"
+            print(line)
+
+
+# Run the large scenario through web3's formatters and through the raw JSON path (RAW_RPC=1) and compare
+def compare_raw(args, rpc_urls, chains):
+    results = {path: run_scenario("large", args, rpc_urls, chains, {"RAW_RPC": flag}) for path, flag in (("web3", "0"), ("raw", "1"))}
+    web3_result, raw_result = results["web3"], results["raw"]
+    same = (web3_result["detections"], web3_result["detections_sha1"]) == (raw_result["detections"], raw_result["detections_sha1"])
+    print(f"Raw JSON path vs web3 over {args.blocks} blocks:")
+    print(f"  detections             {'identical' if same else 'DIFFER'} ({web3_result['detections']} web3, {raw_result['detections']} raw)")
+    for metric in ("wall_seconds", "cpu_seconds", "blocks_per_sec", "peak_rss_mb"):
+        change = (raw_result[metric] - web3_result[metric]) / web3_result[metric] * 100
+        print(f"  {metric:<22} {web3_result[metric]:>10.3f} -> {raw_result[metric]:>10.3f}   ({change:+.1f}%)")
+    return same
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scanners against local stub JSON-RPC nodes")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="Scenario(s) to run (default: all)")
+    parser.add_argument("--blocks", type=int, default=1800, help="Blocks each scenario scans")
+    parser.add_argument("--head", type=int, default=DEFAULT_HEAD)
+    parser.add_argument("--endpoints", type=int, default=2, help="Stub nodes behind the RPC pool")
+    parser.add_argument("--fixture", help="Replay a fixture recorded with stub_rpc_node.py --record")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to every RPC request")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0, help="Share of RPC requests answered with 429")
+    parser.add_argument("--failure-ratio", type=float, default=0, help="Share of RPC requests answered with 503")
+    parser.add_argument("--log-every", type=int, default=7, help="Synthetic Transfer log every N blocks (large N = quiet hours)")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--verbose", action="store_true", help="Show the scanners' log output")
+    parser.add_argument("--compare-raw", action="store_true", help="Compare the raw JSON-RPC path with web3's for the large scenario")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.head, args.blocks)
+        return
+
+    import stub_rpc_node
+
+    fixture = stub_rpc_node.load_fixture(args.fixture) if args.fixture else None
+    if fixture:
+        args.head = fixture["head"]
+        args.blocks = min(args.blocks, len(fixture["blocks"]))
+    config = {
+        "blocks": args.blocks,
+        "endpoints": args.endpoints,
+        "fixture": os.path.basename(args.fixture) if args.fixture else None,
+        "latency": args.latency,
+        "rate_limit_ratio": args.rate_limit_ratio,
+        "failure_ratio": args.failure_ratio,
+        "log_every": args.log_every,
+    }
+
+    servers = []
+    chains = []
+    for seed in range(args.endpoints):
+        server, chain = stub_rpc_node.serve(
+            head=args.head, fixture=fixture, latency=args.latency, rate_limit_ratio=args.rate_limit_ratio,
+            failure_ratio=args.failure_ratio, seed=seed, log_every=args.log_every,
+        )
+        servers.append(server)
+        chains.append(chain)
+    rpc_urls = [f"http://127.0.0.1:{server.server_port}" for server in servers]
+
+    try:
+        if args.compare_raw:
+            return 0 if compare_raw(args, rpc_urls, chains) else 1
+        results = {scenario: run_scenario(scenario, args, rpc_urls, chains) for scenario in args.scenario or SCENARIOS}
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    commit, dirty = git_revision()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "run_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": config,
+        "results": results,
+    }
+    previous = load_previous(args.results_dir, config)
+    os.makedirs(args.results_dir, exist_ok=True)
+    output_path = os.path.join(args.results_dir, f"benchmark_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{commit or 'unknown'}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=1)
+
+    print_report(report, previous)
+    print(f"Saved results to {output_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
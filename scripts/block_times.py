@@ -0,0 +1,138 @@
+import os
+import logging
+import sqlite3
+from bisect import bisect_left
+from collections import OrderedDict
+import metrics
+
+# Constants
+BLOCK_TIME_STORE_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "block_timestamps.db")
+USE_PERSISTENT_STORE = os.getenv("BLOCK_TIME_STORE", "1") == "1"
+LRU_SIZE = 100000  # Block timestamps kept in memory
+BLOCK_TIME_SECONDS = 2  # XDC block cadence, used when extrapolating past the last anchor
+ANCHOR_SPACING = 500  # Blocks between real headers fetched in interpolation mode
+SQLITE_TIMEOUT = 60  # Seconds to wait for another process (e.g. a backfill shard) holding the write lock
+
+_lru = OrderedDict()
+_connection = None
+stats = {"memory_hits": 0, "store_hits": 0, "fetched": 0, "interpolated": 0}
+metrics.register_stats("block_timestamps", stats)
+
+
+# Open the SQLite store and create the table on first use.
+# Backfill shards share the file: WAL lets them read while one writes, and writers wait for the lock
+# rather than failing after sqlite's default 5 seconds.
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(BLOCK_TIME_STORE_FILE), exist_ok=True)
+        _connection = sqlite3.connect(BLOCK_TIME_STORE_FILE, timeout=SQLITE_TIMEOUT)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("CREATE TABLE IF NOT EXISTS block_timestamps (block INTEGER PRIMARY KEY, timestamp INTEGER)")
+    return _connection
+
+
+def remember(block_number, timestamp):
+    _lru[block_number] = timestamp
+    _lru.move_to_end(block_number)
+    if len(_lru) > LRU_SIZE:
+        _lru.popitem(last=False)
+
+
+# Record real header timestamps in memory and, if enabled, on disk
+def store(timestamps):
+    for block_number, timestamp in timestamps.items():
+        remember(block_number, timestamp)
+    if USE_PERSISTENT_STORE and timestamps:
+        connection = get_connection()
+        connection.executemany("INSERT OR REPLACE INTO block_timestamps VALUES (?, ?)", timestamps.items())
+        connection.commit()
+
+
+# Look up timestamps already known locally. Returns {block_number: timestamp}.
+def lookup(block_numbers):
+    found = {}
+    missing = []
+    for block_number in block_numbers:
+        if block_number in _lru:
+            _lru.move_to_end(block_number)
+            found[block_number] = _lru[block_number]
+        else:
+            missing.append(block_number)
+    stats["memory_hits"] += len(found)
+
+    if USE_PERSISTENT_STORE and missing:
+        connection = get_connection()
+        for chunk_start in range(0, len(missing), 500):
+            chunk = missing[chunk_start:chunk_start + 500]
+            rows = connection.execute(
+                f"SELECT block, timestamp FROM block_timestamps WHERE block IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for block_number, timestamp in rows:
+                remember(block_number, timestamp)
+                found[block_number] = timestamp
+                stats["store_hits"] += 1
+    return found
+
+
+# Estimate a timestamp from the nearest known anchors on either side
+def interpolate(block_number, anchor_blocks, anchor_times):
+    i = bisect_left(anchor_blocks, block_number)
+    if i < len(anchor_blocks) and anchor_blocks[i] == block_number:
+        return anchor_times[i]
+    if i == 0:
+        return anchor_times[0] - (anchor_blocks[0] - block_number) * BLOCK_TIME_SECONDS
+    if i == len(anchor_blocks):
+        return anchor_times[-1] + (block_number - anchor_blocks[-1]) * BLOCK_TIME_SECONDS
+    low_block, high_block = anchor_blocks[i - 1], anchor_blocks[i]
+    low_time, high_time = anchor_times[i - 1], anchor_times[i]
+    return round(low_time + (high_time - low_time) * (block_number - low_block) / (high_block - low_block))
+
+
+# Resolve timestamps for a set of blocks.
+# fetch_headers(block_numbers) must return {block_number: timestamp} for the headers it could fetch.
+# With interpolate_missing=True only anchors every ANCHOR_SPACING blocks are fetched and the rest are estimated.
+def get_block_timestamps(block_numbers, fetch_headers, interpolate_missing=False):
+    block_numbers = sorted(set(block_numbers))
+    if not block_numbers:
+        return {}
+    timestamps = lookup(block_numbers)
+    missing = [block_number for block_number in block_numbers if block_number not in timestamps]
+    if not missing:
+        return timestamps
+
+    if not interpolate_missing:
+        fetched = fetch_headers(missing)
+        stats["fetched"] += len(fetched)
+        store(fetched)
+        timestamps.update(fetched)
+        if len(fetched) < len(missing):
+            logging.warning(f"Missing timestamps for {len(missing) - len(fetched)} blocks")
+        return timestamps
+
+    first = missing[0] - missing[0] % ANCHOR_SPACING
+    anchor_positions = list(range(first, missing[-1] + ANCHOR_SPACING, ANCHOR_SPACING))
+    anchors = lookup(anchor_positions)
+    to_fetch = [block_number for block_number in anchor_positions if block_number not in anchors]
+    fetched = fetch_headers(to_fetch) if to_fetch else {}
+    stats["fetched"] += len(fetched)
+    store(fetched)
+    anchors.update(fetched)
+    anchors.update(timestamps)
+    if not anchors:
+        logging.warning(f"No anchor headers available to interpolate {len(missing)} blocks")
+        return timestamps
+
+    anchor_blocks = sorted(anchors)
+    anchor_times = [anchors[block_number] for block_number in anchor_blocks]
+    for block_number in missing:
+        timestamps[block_number] = interpolate(block_number, anchor_blocks, anchor_times)
+    stats["interpolated"] += len(missing)
+    return timestamps
+
+
+def summary():
+    return (
+        f"Block timestamps: {stats['memory_hits']} memory hits, {stats['store_hits']} store hits, "
+        f"{stats['fetched']} headers fetched, {stats['interpolated']} interpolated"
+    )
@@ -0,0 +1,90 @@
+import logging
+from eth_utils import keccak
+import metrics
+from rpc_client import hex_str
+
+# Constants
+BLOOM_BITS = 2048  # logsBloom is 256 bytes; each address/topic sets 3 of its 2048 bits
+
+stats = {"checked": 0, "skipped": 0, "candidates": 0, "unchecked": 0, "false_positives": 0}
+
+
+# Bit mask a value (contract address or topic, hex string or bytes) sets in a logsBloom
+def bloom_mask(value):
+    digest = keccak(bytes.fromhex(hex_str(value)[2:]))
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) % BLOOM_BITS)
+    return mask
+
+
+# Masks for a query plan: a block can only hold a matching log if its bloom has
+# one of the topic masks and, when addresses are watched, one of the address masks
+def plan_masks(plan):
+    return {
+        "topics": [bloom_mask(topic) for topic in plan["topics"]],
+        "addresses": None if plan["addresses"] is None else [bloom_mask(address) for address in plan["addresses"]],
+    }
+
+
+def parse_bloom(logs_bloom):
+    if logs_bloom is None:
+        return None
+    return int(hex_str(logs_bloom), 16)
+
+
+# Whether a block's logsBloom may contain logs the plan asks for. No bloom means it may.
+def might_match(masks, logs_bloom):
+    bloom = parse_bloom(logs_bloom)
+    if bloom is None:
+        return True
+    if not any(bloom & mask == mask for mask in masks["topics"]):
+        return False
+    return masks["addresses"] is None or any(bloom & mask == mask for mask in masks["addresses"])
+
+
+# Split block numbers into (candidates, skipped) using the headers already fetched.
+# Blocks without a header are kept as candidates so their logs are still queried.
+def candidate_blocks(masks, block_numbers, blocks):
+    candidates = []
+    skipped = []
+    unchecked = 0
+    for block_number in block_numbers:
+        block = blocks.get(block_number)
+        if block is None:
+            unchecked += 1
+            candidates.append(block_number)
+        elif might_match(masks, block.get("logsBloom")):
+            candidates.append(block_number)
+        else:
+            skipped.append(block_number)
+    stats["checked"] += len(block_numbers) - unchecked
+    stats["unchecked"] += unchecked
+    stats["candidates"] += len(candidates) - unchecked
+    stats["skipped"] += len(skipped)
+    metrics.inc("bloom_blocks_total", len(skipped), result="skipped")
+    metrics.inc("bloom_blocks_total", len(candidates) - unchecked, result="candidate")
+    return candidates, skipped
+
+
+# Count candidate blocks whose bloom matched but whose log query came back empty
+def record_false_positives(candidates, blocks, logs_by_block):
+    false_positives = sum(1 for block_number in candidates if block_number in blocks and not logs_by_block.get(block_number))
+    stats["false_positives"] += false_positives
+    metrics.inc("bloom_blocks_total", false_positives, result="false_positive")
+    if false_positives:
+        logging.debug(f"Bloom filter: {false_positives}/{len(candidates)} candidate blocks had no matching logs")
+    return false_positives
+
+
+def summary():
+    checked = stats["checked"]
+    if not checked:
+        return "Bloom filter: no blocks checked"
+    candidates = stats["candidates"]
+    false_positive_rate = stats["false_positives"] / candidates * 100 if candidates else 0.0
+    return (
+        f"Bloom filter: skipped {stats['skipped']}/{checked} blocks ({stats['skipped'] / checked * 100:.1f}%), "
+        f"{stats['false_positives']}/{candidates} candidates had no matching logs ({false_positive_rate:.1f}% false positives), "
+        f"{stats['unchecked']} blocks without a header queried unchecked"
+    )
@@ -0,0 +1,37 @@
+import os
+import json
+import logging
+from eth_utils import to_checksum_address
+
+# Constants
+USDC_E_ADDRESS = "0x2A8E898b6242355c290E1f4Fc966b8788729A4D4"  # USDC.e token contract
+WATCHLIST_FILE = os.getenv("BRIDGE_WATCHLIST_FILE", "/root/xdc-intel/bridge_watchlist.json")
+
+# Bridged tokens watched when WATCHLIST_FILE does not exist. The file holds a JSON list of entries like this one:
+#   symbol / address / decimals: the token contract
+#   price_symbol: symbol quoted through the price cache; fallback_price is used when it has no quote
+#   bridges (optional): bridge addresses; when set, only transfers to or from them count
+DEFAULT_WATCHLIST = [
+    {"symbol": "USDC.e", "address": USDC_E_ADDRESS, "decimals": 6, "price_symbol": "USDC", "fallback_price": 1.0, "bridges": []},
+]
+
+
+# Load the watchlist. Returns {lowercase token address: entry}.
+# Shared by the bridge tracker and the bridge detector of the large scanner, so both watch the same tokens.
+def load_watchlist(path=WATCHLIST_FILE, log=logging.info):
+    entries = DEFAULT_WATCHLIST
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            entries = json.load(f)
+    watchlist = {}
+    for entry in entries:
+        watchlist[entry["address"].lower()] = {
+            "symbol": entry["symbol"],
+            "address": to_checksum_address(entry["address"]),
+            "decimals": int(entry.get("decimals", 18)),
+            "price_symbol": entry.get("price_symbol", entry["symbol"]),
+            "fallback_price": entry.get("fallback_price"),
+            "bridges": {address.lower() for address in entry.get("bridges", [])},
+        }
+    log(f"Watching {len(watchlist)} bridged token(s): {', '.join(token['symbol'] for token in watchlist.values())}")
+    return watchlist
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import logging
+
+# Constants
+CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), "xdc-intel", "checkpoints")
+
+
+def journal_path(name):
+    return os.path.join(CHECKPOINT_DIR, f"{name}.journal")
+
+
+def backlog_path(name):
+    return os.path.join(CHECKPOINT_DIR, f"{name}_backlog.json")
+
+
+# Append one JSON line and fsync it, so a committed batch survives a crash
+def append_line(path, record):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Load an unfinished run from the journal.
+# Returns {"start_block", "end_block", "committed_block", "flushed_block", "results"} or None.
+# results only holds detections of batches committed after the last flush (earlier ones are already written out).
+# A torn last line (crash mid-write) is ignored, so only fully written batches count.
+def load_journal(name):
+    try:
+        with open(journal_path(name), "r") as f:
+            lines = f.read().split("\n")
+    except FileNotFoundError:
+        return None
+
+    run = None
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("type") == "run":
+            run = {
+                "start_block": record["start_block"],
+                "end_block": record["end_block"],
+                "committed_block": record["committed_block"],
+                "flushed_block": record.get("flushed_block", record["start_block"] - 1),
+                "results": record.get("results", []),
+            }
+        elif record.get("type") == "batch" and run is not None:
+            run["committed_block"] = record["to_block"]
+            run["results"].extend(record["results"])
+        elif record.get("type") == "flush" and run is not None:
+            run["flushed_block"] = record["to_block"]
+            run["results"] = []
+    return run
+
+
+# Start (or restart) a run's journal, carrying over results committed but not yet flushed
+def begin_run(name, start_block, end_block, committed_block, results=None, flushed_block=None):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    temp_path = f"{journal_path(name)}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(json.dumps({
+            "type": "run",
+            "start_block": start_block,
+            "end_block": end_block,
+            "committed_block": committed_block,
+            "flushed_block": start_block - 1 if flushed_block is None else flushed_block,
+            "results": results or [],
+            "started_at": time.time(),
+        }) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, journal_path(name))
+
+
+# Record a completed batch and its detections
+def commit_batch(name, to_block, results):
+    append_line(journal_path(name), {"type": "batch", "to_block": to_block, "results": results})
+
+
+# Record that every detection up to to_block has been written out, so a resumed run does not carry them
+def mark_flushed(name, to_block):
+    append_line(journal_path(name), {"type": "flush", "to_block": to_block})
+
+
+# Drop the journal once the run's output and last block have been saved
+def finish_run(name):
+    try:
+        os.remove(journal_path(name))
+    except FileNotFoundError:
+        pass
+
+
+def load_backlog(name):
+    try:
+        with open(backlog_path(name), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def save_backlog(name, ranges):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    temp_path = f"{backlog_path(name)}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(ranges, f)
+    os.replace(temp_path, backlog_path(name))
+
+
+# Queue a block range that was skipped so a later run can scan it
+def queue_backlog(name, from_block, to_block):
+    if from_block > to_block:
+        return
+    ranges = load_backlog(name)
+    ranges.append([from_block, to_block])
+    save_backlog(name, ranges)
+    logging.info(f"Queued blocks {from_block} to {to_block} as backlog")
+
+
+# Group block numbers into sorted contiguous (from_block, to_block) ranges
+def block_ranges(block_numbers):
+    ranges = []
+    for block_number in sorted(block_numbers):
+        if ranges and block_number == ranges[-1][1] + 1:
+            ranges[-1][1] = block_number
+        else:
+            ranges.append([block_number, block_number])
+    return [tuple(block_range) for block_range in ranges]
+
+
+# Scan queued backlog ranges, oldest first, in chunks of chunk_size blocks until time_budget seconds are spent.
+# process_range(from_block, to_block) returns the detections for that chunk, or None if it failed.
+# Progress is saved after every chunk. Returns the list of (from_block, to_block, detection count) chunks scanned.
+def drain_backlog(name, process_range, time_budget, chunk_size):
+    ranges = load_backlog(name)
+    deadline = time.time() + time_budget
+    drained = []
+    while ranges and time.time() < deadline:
+        from_block, to_block = ranges[0]
+        chunk_end = min(from_block + chunk_size - 1, to_block)
+        results = process_range(from_block, chunk_end)
+        if results is None:
+            logging.warning(f"Backlog chunk {from_block} to {chunk_end} failed, will retry next run")
+            break
+        drained.append((from_block, chunk_end, len(results)))
+        if chunk_end >= to_block:
+            ranges.pop(0)
+        else:
+            ranges[0] = [chunk_end + 1, to_block]
+        save_backlog(name, ranges)
+    remaining = sum(to_block - from_block + 1 for from_block, to_block in ranges)
+    if remaining:
+        logging.info(f"Backlog has {remaining} blocks left in {len(ranges)} range(s)")
+    return drained
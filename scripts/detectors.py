@@ -0,0 +1,248 @@
+import logging
+from datetime import datetime
+import numpy as np
+from web3 import Web3
+from rpc_client import hex_str
+import bridge_watchlist
+from transfer_decode import decode_transfer_logs, usd_threshold_mask
+
+# Constants
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+DEFAULT_DETECTORS = "native,erc20,bridge_watchlist"  # Detectors the large scanner runs unless DETECTORS says otherwise
+BRIDGE_SOURCE = "usdc_bridge"  # Source the bridge detector stores under, shared with track_usdc_bridge_transfers.py
+
+
+def format_timestamp(timestamp):
+    return datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def topic_address(topic):
+    return Web3.to_checksum_address(f"0x{hex_str(topic)[-40:]}")
+
+
+# USD prices of a symbol at unix timestamps, as a list: from the batch's price_at (prices at block time)
+# when the scanner provides one, else the batch's current quote for every timestamp
+def prices_at(batch, symbol, timestamps):
+    price_at = batch.get("price_at")
+    if price_at is None:
+        return [batch["prices"].get(symbol, 0)] * len(timestamps)
+    return price_at(symbol, timestamps).tolist()
+
+
+# A detector looks at one ingested batch and returns detections tagged with its source.
+# It declares what it reads so the fetch layer can build one query plan for all detectors:
+#   topics / addresses: the logs it needs (addresses=None means logs from any contract)
+#   needs_transactions: whether it reads full block transactions
+#   needs_token_metadata: whether it needs symbol/decimals for the tokens in its logs
+#   price_symbols: symbols it needs quoted besides the tokens it sees
+class Detector:
+    name = None
+    source = None
+    topics = ()
+    addresses = None
+    needs_transactions = False
+    needs_token_metadata = False
+    price_symbols = ()
+
+    def __init__(self, min_usd):
+        self.min_usd = min_usd
+
+    # Whether a log is one this detector asked for
+    def wants(self, log):
+        if not log["topics"] or hex_str(log["topics"][0]).lower() not in self.topics:
+            return False
+        return self.addresses is None or hex_str(log["address"]).lower() in self.addresses
+
+    # batch: {"blocks": {block_number: block}, "logs": [...], "block_timestamps": {...},
+    #         "token_metadata": {address: (symbol, decimals)}, "prices": {symbol: current price},
+    #         "price_at": optional function (symbol, timestamps) -> price array, see prices_at}
+    def detect(self, batch):
+        raise NotImplementedError
+
+
+# Large native XDC value transfers
+class NativeTransferDetector(Detector):
+    name = "native"
+    source = "large_transfers"
+    needs_transactions = True
+    price_symbols = ("XDC",)
+
+    def detect(self, batch):
+        # One XDC price per block, at the block's time
+        block_prices = dict(zip(batch["blocks"], prices_at(batch, "XDC", [block["timestamp"] for block in batch["blocks"].values()])))
+        large_transactions = []
+        for block_number, block in batch["blocks"].items():
+            xdc_price = block_prices[block_number]
+            for tx in block["transactions"]:
+                if tx.get("value", 0) <= 0:
+                    continue
+                value_xdc = Web3.from_wei(tx["value"], "ether")
+                value_usd = float(value_xdc) * xdc_price
+                if value_usd < self.min_usd:
+                    continue
+                tx_hash = hex_str(tx["hash"])
+                large_transactions.append({
+                    "source": self.source,
+                    "tx_hash": tx_hash,
+                    "from": Web3.to_checksum_address(tx["from"]),
+                    "to": Web3.to_checksum_address(tx["to"]) if tx["to"] else tx["to"],
+                    "value_xdc": float(value_xdc),
+                    "value_usd": value_usd,
+                    "token_symbol": "XDC",
+                    "block_number": block_number,
+                    "log_index": -1,
+                    "timestamp": format_timestamp(block["timestamp"]),
+                })
+                logging.info(f"Found large XDC tx: {tx_hash} - ${value_usd:.2f}")
+        return large_transactions
+
+
+# Large ERC-20 Transfer events from any token contract.
+# Decoding and the USD threshold run column-wise; only surviving rows are formatted.
+class Erc20TransferDetector(Detector):
+    name = "erc20"
+    source = "large_transfers"
+    topics = (TRANSFER_TOPIC,)
+    needs_token_metadata = True
+
+    def detect(self, batch):
+        logs = [log for log in batch["logs"] if self.wants(log)]
+        columns = decode_transfer_logs(logs)
+        timestamps = np.array([batch["block_timestamps"][block] for block in columns["block"]], dtype=np.float64)
+
+        def price_at(symbol, rows):
+            return np.array(prices_at(batch, symbol, timestamps[rows]))
+
+        # A hair of slack so float rounding never drops a transfer the exact check below would keep
+        mask, _, row_prices = usd_threshold_mask(columns, batch["token_metadata"], price_at, self.min_usd * (1 - 1e-9))
+        metadata = {hex_str(address).lower(): value for address, value in batch["token_metadata"].items()}
+
+        large_transactions = []
+        for row in np.flatnonzero(mask):
+            log = columns["logs"][row]
+            try:
+                token_symbol, decimals = metadata[columns["token"][row]]
+                value = int(columns["data"][row], 16) / (10 ** decimals)
+                value_usd = value * float(row_prices[row])
+                if value_usd < self.min_usd:
+                    continue
+                tx_hash = hex_str(log["transactionHash"])
+                large_transactions.append({
+                    "source": self.source,
+                    "tx_hash": tx_hash,
+                    "from": topic_address(log["topics"][1]),
+                    "to": topic_address(log["topics"][2]),
+                    "value_xdc": value,
+                    "value_usd": value_usd,
+                    "token_symbol": token_symbol,
+                    "block_number": log["blockNumber"],
+                    "log_index": log.get("logIndex", -1),
+                    "timestamp": format_timestamp(batch["block_timestamps"][log["blockNumber"]]),
+                })
+                logging.info(f"Found large ERC-20 tx: {tx_hash} - ${value_usd:.2f}")
+            except Exception as e:
+                logging.warning(f"Failed to process ERC-20 log in block {log['blockNumber']} for token {log['address']}: {str(e)}")
+        return large_transactions
+
+
+# Bridged token flows: Transfer events of the tokens on the bridge watchlist (bridge_watchlist.json), each
+# with its own decimals and price symbol. Its rows are the "usdc_bridge" source the poster reads, so while
+# the large scanner runs it, track_usdc_bridge_transfers.py does not scan the same blocks again.
+class BridgeWatchlistDetector(Detector):
+    name = "bridge_watchlist"
+    source = BRIDGE_SOURCE
+    topics = (TRANSFER_TOPIC,)
+
+    def __init__(self, min_usd, watchlist=None):
+        super().__init__(min_usd)
+        self.watchlist = bridge_watchlist.load_watchlist() if watchlist is None else watchlist
+        self.addresses = tuple(sorted(self.watchlist))
+        self.price_symbols = tuple(sorted({token["price_symbol"] for token in self.watchlist.values()}))
+
+    def detect(self, batch):
+        logs = [log for log in batch["logs"] if self.wants(log) and len(log["topics"]) == 3]
+        tokens = [self.watchlist[hex_str(log["address"]).lower()] for log in logs]
+        timestamps = [batch["block_timestamps"][log["blockNumber"]] for log in logs]
+        prices = [0.0] * len(logs)
+        for price_symbol in {token["price_symbol"] for token in tokens}:
+            rows = [row for row, token in enumerate(tokens) if token["price_symbol"] == price_symbol]
+            for row, price in zip(rows, prices_at(batch, price_symbol, [timestamps[row] for row in rows])):
+                prices[row] = price
+        transfers = []
+        for log, token, timestamp, price in zip(logs, tokens, timestamps, prices):
+            from_address = topic_address(log["topics"][1])
+            to_address = topic_address(log["topics"][2])
+            if token["bridges"] and from_address.lower() not in token["bridges"] and to_address.lower() not in token["bridges"]:
+                continue
+            price = price or token["fallback_price"]
+            if not price:
+                continue
+            value = int(hex_str(log["data"]), 16) / (10 ** token["decimals"])
+            value_usd = value * price
+            if value_usd < self.min_usd:
+                continue
+            tx_hash = hex_str(log["transactionHash"])
+            transfers.append({
+                "source": self.source,
+                "tx_hash": tx_hash,
+                "from": from_address,
+                "to": to_address,
+                "value_usdc": value,  # Amount in the token's own units, named like the bridge tracker's rows
+                "value_usd": value_usd,
+                "token_symbol": token["symbol"],
+                "block_number": log["blockNumber"],
+                "log_index": log.get("logIndex", -1),
+                "timestamp": format_timestamp(timestamp),
+            })
+            logging.info(f"Found large {token['symbol']} bridge transfer: {tx_hash} - ${value_usd:.2f}")
+        return transfers
+
+
+DETECTORS = {detector.name: detector for detector in (NativeTransferDetector, Erc20TransferDetector, BridgeWatchlistDetector)}
+DETECTORS["usdc_bridge"] = BridgeWatchlistDetector  # Former name, still accepted in DETECTORS settings
+
+
+# Whether the detectors named in names include the bridge watchlist detector
+def runs_bridge_detector(names):
+    return any(DETECTORS.get(name) is BridgeWatchlistDetector for name in names)
+
+
+# Instantiate the detectors named in names (e.g. from a comma-separated env var)
+def load_detectors(names, min_usd):
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown detector(s): {', '.join(unknown)}; available: {', '.join(sorted(DETECTORS))}")
+    return [DETECTORS[name](min_usd) for name in names]
+
+
+# Combine the detectors' needs into one fetch plan:
+# {"transactions": bool, "topics": [topic0, ...], "addresses": [address, ...] or None for any contract}.
+# A detector watching a subset of what another already fetches adds nothing to the plan.
+def build_query_plan(detectors):
+    log_detectors = [detector for detector in detectors if detector.topics]
+    addresses = None
+    if log_detectors and all(detector.addresses is not None for detector in log_detectors):
+        addresses = sorted({address for detector in log_detectors for address in detector.addresses})
+    return {
+        "transactions": any(detector.needs_transactions for detector in detectors),
+        "topics": sorted({topic for detector in log_detectors for topic in detector.topics}),
+        "addresses": addresses,
+    }
+
+
+# Build the eth_getLogs filter for a block range from a query plan
+def log_filter(plan, from_block, to_block):
+    topics = plan["topics"]
+    filter_params = {"fromBlock": from_block, "toBlock": to_block, "topics": [topics[0] if len(topics) == 1 else topics]}
+    if plan["addresses"] is not None:
+        filter_params["address"] = [Web3.to_checksum_address(address) for address in plan["addresses"]]
+    return filter_params
+
+
+# Run every detector over one ingested batch
+def run_detectors(detectors, batch):
+    detections = []
+    for detector in detectors:
+        detections.extend(detector.detect(batch))
+    detections.sort(key=lambda row: (row["block_number"], row["log_index"]))
+    return detections
@@ -0,0 +1,288 @@
+import os
+import csv
+import json
+import mmap
+import time
+import heapq
+import struct
+import logging
+import metrics
+
+# Constants
+LABELS_DIR = os.getenv("LABELS_DIR", os.path.join(os.path.expanduser("~"), "xdc-intel", "labels"))  # Label lists, one CSV per list
+INDEX_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "labels.idx")
+SEGMENT_DIR = os.path.join(os.path.expanduser("~"), "xdc-intel", "labels.segments")  # One compiled index per label list
+SEGMENT_MANIFEST = os.path.join(SEGMENT_DIR, "manifest.json")
+MAGIC = b"XLBL"
+VERSION = 1
+
+# File layout: header, fan-out table, count sorted fixed-width records, then the label strings they point into.
+# fan-out[p] is the number of records whose address starts with a 2-byte prefix <= p, so a lookup only
+# binary searches the few records sharing its prefix. A record is a 20-byte address and the offset of its
+# label; a label is a u16 length and "name\x1fcategory".
+HEADER = struct.Struct("<4sIQQ")  # magic, version, record count, strings offset
+FANOUT = struct.Struct("<65536I")
+FANOUT_ENTRY = struct.Struct("<I")
+RECORDS_OFFSET = HEADER.size + FANOUT.size
+RECORD = struct.Struct("<20sI")
+LENGTH = struct.Struct("<H")
+SEPARATOR = b"\x1f"
+
+_index = None
+_index_stat = None
+stats = {"hits": 0, "misses": 0}
+metrics.register_stats("address_labels", stats)
+
+
+# 20-byte key of an address ("0x..." or XDC's "xdc..." form), or None if it is not an address
+def address_key(address):
+    address = str(address).strip().lower()
+    if address.startswith(("0x", "xdc")):
+        address = address[2:] if address.startswith("0x") else address[3:]
+    if len(address) != 40:
+        return None
+    try:
+        return bytes.fromhex(address)
+    except ValueError:
+        return None
+
+
+# Read-only view of a label index file. Opening maps the file without reading it;
+# lookups binary search the mapped records, so only the pages they touch are loaded.
+class LabelIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.strings_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} label index")
+        self.path = path
+
+    def label_at(self, offset):
+        (length,) = LENGTH.unpack_from(self.mm, self.strings_offset + offset)
+        start = self.strings_offset + offset + LENGTH.size
+        return self.mm[start:start + length]
+
+    # (name, category) of an address, or None when it is not labeled
+    def lookup(self, address):
+        key = address_key(address)
+        if key is None:
+            return None
+        mm = self.mm
+        prefix = (key[0] << 8) | key[1]
+        low = FANOUT_ENTRY.unpack_from(mm, HEADER.size + (prefix - 1) * FANOUT_ENTRY.size)[0] if prefix else 0
+        high = end = FANOUT_ENTRY.unpack_from(mm, HEADER.size + prefix * FANOUT_ENTRY.size)[0]
+        while low < high:
+            middle = (low + high) // 2
+            start = RECORDS_OFFSET + middle * RECORD.size
+            if mm[start:start + 20] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == end:
+            return None
+        probe, offset = RECORD.unpack_from(mm, RECORDS_OFFSET + low * RECORD.size)
+        if probe != key:
+            return None
+        name, _, category = self.label_at(offset).partition(SEPARATOR)
+        return name.decode("utf-8"), category.decode("utf-8")
+
+    # Every (address key, encoded label) in address order, for merging indexes
+    def items(self):
+        labels = {}
+        records = memoryview(self.mm)[RECORDS_OFFSET:RECORDS_OFFSET + self.count * RECORD.size]
+        for key, offset in RECORD.iter_unpack(records):
+            label = labels.get(offset)
+            if label is None:
+                label = labels[offset] = self.label_at(offset)
+            yield key, label
+        records.release()
+
+    def close(self):
+        self.mm.close()
+
+
+# Write (address key, encoded label) pairs, already sorted by address, as an index file.
+# Identical labels are stored once. The file is written to a temporary path and renamed into place.
+def write_index(path, items):
+    fanout = [0] * 65536
+    records = bytearray()
+    strings = bytearray()
+    offsets = {}
+    count = 0
+    for key, label in items:
+        fanout[(key[0] << 8) | key[1]] += 1
+        offset = offsets.get(label)
+        if offset is None:
+            offset = offsets[label] = len(strings)
+            strings += LENGTH.pack(len(label)) + label
+        records += RECORD.pack(key, offset)
+        count += 1
+    for prefix in range(1, len(fanout)):
+        fanout[prefix] += fanout[prefix - 1]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, RECORDS_OFFSET + len(records)))
+        f.write(FANOUT.pack(*fanout))
+        f.write(records)
+        f.write(strings)
+    os.replace(temp_path, path)
+    return count
+
+
+# Compile one label list into a segment. The CSV needs an address and a label column; category
+# defaults to the file name (exchanges.csv -> "exchanges"). A later row for the same address wins.
+def compile_list(source_path, segment_path):
+    default_category = os.path.splitext(os.path.basename(source_path))[0]
+    entries = {}
+    encoded = {}  # (name, category) -> label bytes; lists repeat a few labels over many addresses
+    invalid = 0
+    with open(source_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = [column.strip().lower() for column in next(reader, [])]
+        if "address" not in columns or "label" not in columns:
+            raise ValueError(f"{source_path} needs address and label columns")
+        address_column = columns.index("address")
+        label_column = columns.index("label")
+        category_column = columns.index("category") if "category" in columns else None
+        for row in reader:
+            key = address_key(row[address_column]) if len(row) > address_column else None
+            name = row[label_column].strip() if len(row) > label_column else ""
+            if key is None or not name:
+                invalid += 1
+                continue
+            category = row[category_column].strip() if category_column is not None and len(row) > category_column else ""
+            label = encoded.get((name, category))
+            if label is None:
+                label = encoded[(name, category)] = (
+                    name.encode("utf-8") + SEPARATOR + (category or default_category).encode("utf-8")
+                )[:65535]
+            entries[key] = label
+    if invalid:
+        logging.warning(f"Skipped {invalid} rows without a valid address and label in {source_path}")
+    return write_index(segment_path, sorted(entries.items()))
+
+
+def load_segment_manifest():
+    try:
+        with open(SEGMENT_MANIFEST, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_segment_manifest(manifest):
+    os.makedirs(SEGMENT_DIR, exist_ok=True)
+    temp_path = f"{SEGMENT_MANIFEST}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, SEGMENT_MANIFEST)
+
+
+# Build the index from every CSV in LABELS_DIR. Only lists whose size or mtime changed since the
+# last build are recompiled; the final index is a merge of the per-list segments. When two lists
+# label the same address, the list whose file name sorts last wins (e.g. 99-manual.csv overrides).
+# Returns the number of addresses in the index, or None when it was already up to date.
+def build_index(force=False):
+    start = time.perf_counter()
+    names = sorted(name for name in os.listdir(LABELS_DIR) if name.endswith(".csv")) if os.path.isdir(LABELS_DIR) else []
+    manifest = load_segment_manifest()
+    previous = dict(manifest)
+    compiled = 0
+    for name in names:
+        source_stat = os.stat(os.path.join(LABELS_DIR, name))
+        fingerprint = {"size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns}
+        segment_path = os.path.join(SEGMENT_DIR, f"{name[:-4]}.idx")
+        if not force and manifest.get(name) == fingerprint and os.path.exists(segment_path):
+            continue
+        count = compile_list(os.path.join(LABELS_DIR, name), segment_path)
+        manifest[name] = fingerprint
+        compiled += 1
+        logging.info(f"Compiled {count} labels from {name}")
+    for name in set(manifest) - set(names):
+        del manifest[name]
+        try:
+            os.remove(os.path.join(SEGMENT_DIR, f"{name[:-4]}.idx"))
+        except OSError:
+            pass
+    if not force and manifest == previous and os.path.exists(INDEX_FILE):
+        logging.info(f"Label index is up to date ({len(names)} lists)")
+        return None
+
+    segments = [LabelIndex(os.path.join(SEGMENT_DIR, f"{name[:-4]}.idx")) for name in names]
+    try:
+        # Merge by (address, list order) and keep the last entry of each address
+        def ranked(rank, segment):
+            for key, label in segment.items():
+                yield key, rank, label
+
+        merged = heapq.merge(*(ranked(rank, segment) for rank, segment in enumerate(segments)))
+
+        def latest():
+            previous_key = previous_label = None
+            for key, _, label in merged:
+                if key != previous_key and previous_key is not None:
+                    yield previous_key, previous_label
+                previous_key, previous_label = key, label
+            if previous_key is not None:
+                yield previous_key, previous_label
+
+        count = write_index(INDEX_FILE, latest())
+    finally:
+        for segment in segments:
+            segment.close()
+    save_segment_manifest(manifest)
+    logging.info(
+        f"Built label index of {count} addresses from {len(names)} lists ({compiled} recompiled) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return count
+
+
+# The mapped index, reopened when a rebuild has replaced the file. None when no index was built.
+def get_index():
+    global _index, _index_stat
+    try:
+        index_stat = os.stat(INDEX_FILE)
+    except OSError:
+        return None
+    identity = (index_stat.st_ino, index_stat.st_mtime_ns)
+    if _index is None or identity != _index_stat:
+        try:
+            index = LabelIndex(INDEX_FILE)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cannot open label index: {str(e)}")
+            return None
+        if _index is not None:
+            _index.close()
+        _index, _index_stat = index, identity
+    return _index
+
+
+# (name, category) of an address, or None
+def lookup(address):
+    index = get_index()
+    if index is None or not address:
+        return None
+    label = index.lookup(address)
+    stats["misses" if label is None else "hits"] += 1
+    return label
+
+
+# Add from_label/to_label (label name or None) to detections in place. Returns how many were labeled.
+def enrich(rows):
+    index = get_index()
+    if index is None:
+        return 0
+    labeled = 0
+    for row in rows:
+        found = False
+        for side in ("from", "to"):
+            label = index.lookup(row[side]) if row.get(side) else None
+            stats["misses" if label is None else "hits"] += 1
+            row[f"{side}_label"] = None if label is None else label[0]
+            found = found or label is not None
+        labeled += found
+    return labeled
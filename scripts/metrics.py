@@ -0,0 +1,284 @@
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ratelimit import RateLimitException
+
+# Constants
+ENABLED = os.getenv("METRICS", "1") != "0"  # METRICS=0 turns every hook below into a no-op
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(os.path.expanduser("~"), "xdc-intel", "metrics.prom"))
+PREFIX = "xdc_intel_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Seconds
+
+HELP = {
+    "rpc_calls_total": "JSON-RPC calls sent, counting each entry of a batch",
+    "rpc_errors_total": "JSON-RPC requests or batch entries that failed",
+    "rpc_request_seconds": "Latency of one HTTP request to an RPC endpoint (method=batch for JSON-RPC batches)",
+    "rpc_pool_wait_seconds_total": "Time spent waiting for an endpoint's pacing interval or cooldown",
+    "rate_limiter_blocked_seconds_total": "Time spent sleeping in sleep_and_retry rate limiters",
+    "rate_limiter_waits_total": "Calls that had to sleep in a sleep_and_retry rate limiter",
+    "cmc_request_seconds": "Latency of CoinMarketCap quote requests",
+    "stage_seconds": "Time spent in each scan stage per batch",
+    "blocks_processed_total": "Blocks handed to the detectors",
+    "logs_processed_total": "Logs handed to the detectors",
+    "detections_total": "Detections by source",
+    "cache_events_total": "Cache lookups by cache and result",
+    "bloom_blocks_total": "Blocks by logsBloom pre-filter result (skipped, candidate, false_positive)",
+    "contract_reads_total": "Contract eth_call reads (symbol/decimals/balanceOf) by result (ok, reverted, failed)",
+    "startup_seconds": "Time from process start until a command was ready to work",
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_stats_sources = {}  # cache name -> stats dict kept by that module
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+class Timer:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = NullTimer()
+
+
+# Time a block of code into a histogram: `with metrics.timer("stage_seconds", stage="fetch_logs"):`
+def timer(name, **labels):
+    return Timer(name, labels) if ENABLED else _null_timer
+
+
+# Export a module's existing stats dict (e.g. token_cache.stats) as cache_events_total{cache=...}.
+# The dict is read only when metrics are rendered, so the cache's hot path is untouched.
+def register_stats(cache, stats):
+    _stats_sources[cache] = stats
+
+
+# Drop-in for ratelimit.sleep_and_retry that records how long callers were blocked
+def sleep_and_retry(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except RateLimitException as exception:
+                inc("rate_limiter_waits_total", limiter=func.__name__)
+                inc("rate_limiter_blocked_seconds_total", exception.period_remaining, limiter=func.__name__)
+                time.sleep(exception.period_remaining)
+    return wrapper
+
+
+# Web3 middleware counting calls and timing requests per JSON-RPC method and endpoint
+def rpc_middleware(make_request, w3):
+    if not ENABLED:
+        return make_request
+    endpoint = getattr(w3.provider, "endpoint_uri", "unknown")
+
+    def middleware(method, params):
+        start = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            inc("rpc_errors_total", method=method, endpoint=endpoint)
+            raise
+        finally:
+            inc("rpc_calls_total", method=method, endpoint=endpoint)
+            observe("rpc_request_seconds", time.perf_counter() - start, method=method, endpoint=endpoint)
+        if isinstance(response, dict) and response.get("error") is not None:
+            inc("rpc_errors_total", method=method, endpoint=endpoint)
+        return response
+    return middleware
+
+
+# Record one JSON-RPC batch request sent outside web3 (calls is a list of (method, params))
+def record_batch(endpoint, calls, seconds, failed_calls=0):
+    if not ENABLED:
+        return
+    for method, _ in calls:
+        inc("rpc_calls_total", method=method, endpoint=endpoint)
+    if failed_calls:
+        inc("rpc_errors_total", failed_calls, method="batch", endpoint=endpoint)
+    observe("rpc_request_seconds", seconds, method="batch", endpoint=endpoint)
+
+
+# Record one JSON-RPC call sent outside web3
+def record_call(endpoint, method, seconds, failed=False):
+    if not ENABLED:
+        return
+    inc("rpc_calls_total", method=method, endpoint=endpoint)
+    if failed:
+        inc("rpc_errors_total", method=method, endpoint=endpoint)
+    observe("rpc_request_seconds", seconds, method=method, endpoint=endpoint)
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+    for cache, stats in _stats_sources.items():
+        for result, value in stats.items():
+            counters[("cache_events_total", label_key({"cache": cache, "result": result}))] = value
+    return counters, histograms
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+# Render every metric in the Prometheus text exposition format
+def render_prometheus():
+    counters, histograms = snapshot()
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{PREFIX}{name}{format_labels(labels)} {value}")
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+            lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# Write the Prometheus text to a file (e.g. for node_exporter's textfile collector), atomically
+def write_prometheus(path=METRICS_FILE):
+    if not ENABLED:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(temp_path, path)
+
+
+# Serve /metrics over HTTP from a background thread (daemon mode)
+def serve_prometheus(port):
+    if not ENABLED:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics on port {port}")
+    return server
+
+
+# Human-readable end-of-run summary, one line per area
+def summary():
+    if not ENABLED:
+        return "Metrics disabled"
+    counters, histograms = snapshot()
+
+    def total(name, **match):
+        return sum(value for (metric, labels), value in counters.items() if metric == name and match.items() <= dict(labels).items())
+
+    lines = ["Run metrics:"]
+    rpc = {}
+    for (metric, labels), histogram in histograms.items():
+        if metric == "rpc_request_seconds":
+            method = dict(labels)["method"]
+            count, seconds = rpc.get(method, (0, 0.0))
+            rpc[method] = (count + histogram[-1], seconds + histogram[-2])
+    if rpc:
+        lines.append("  RPC requests: " + ", ".join(
+            f"{method} {count}x avg {seconds / count * 1000:.0f}ms" for method, (count, seconds) in sorted(rpc.items())
+        ))
+        lines.append(f"  RPC calls: {total('rpc_calls_total'):.0f}, errors: {total('rpc_errors_total'):.0f}")
+    lines.append(
+        f"  Waiting: rate limiters {total('rate_limiter_blocked_seconds_total'):.1f}s "
+        f"({total('rate_limiter_waits_total'):.0f} waits), endpoint pacing/cooldown {total('rpc_pool_wait_seconds_total'):.1f}s"
+    )
+    stages = {}
+    for (metric, labels), histogram in histograms.items():
+        if metric in ("stage_seconds", "cmc_request_seconds"):
+            stage = dict(labels).get("stage", "cmc")
+            stages[stage] = stages.get(stage, 0.0) + histogram[-2]
+    if stages:
+        lines.append("  Stages: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in sorted(stages.items(), key=lambda item: -item[1])))
+    detections = {dict(labels)["source"]: value for (metric, labels), value in counters.items() if metric == "detections_total"}
+    lines.append(
+        f"  Processed: {total('blocks_processed_total'):.0f} blocks, {total('logs_processed_total'):.0f} logs, detections "
+        + (", ".join(f"{source} {count:.0f}" for source, count in sorted(detections.items())) or "0")
+    )
+    for cache, stats in sorted(_stats_sources.items()):
+        lookups = sum(stats.values())
+        if lookups:
+            hits = sum(value for result, value in stats.items() if result.endswith("hits"))
+            lines.append(f"  Cache {cache}: {hits / lookups * 100:.1f}% hit rate over {lookups} lookups")
+    return "\n".join(lines)
@@ -0,0 +1,133 @@
+import os
+import logging
+import metrics
+from rpc_client import batch_request, hex_str, request
+
+# Constants
+MULTICALL_ADDRESS = os.getenv("MULTICALL_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")  # Multicall3; empty disables it
+MULTICALL_CHUNK_SIZE = int(os.getenv("MULTICALL_CHUNK_SIZE", "200"))  # Reads per aggregate3 call, to stay under the node's eth_call gas cap
+AGGREGATE3_SELECTOR = "0x82ad56cb"  # aggregate3((address,bool,bytes)[])
+REVERT_MARKERS = ("revert", "invalid opcode", "out of gas")  # eth_call errors that are the contract's answer, not the node's
+
+# Read-only ERC-20 functions: name -> (selector, ABI type of the single return value)
+FUNCTIONS = {
+    "symbol": ("0x95d89b41", "string"),
+    "decimals": ("0x313ce567", "uint8"),
+    "balanceOf": ("0x70a08231", "uint256"),
+}
+
+_multicall_missing = set()  # RPC URLs whose chain has no contract at MULTICALL_ADDRESS
+stats = {"reads": 0, "multicall_requests": 0, "batched_requests": 0, "reverted": 0, "failed": 0}
+
+
+# Calldata of a read: (target, function name, args), e.g. (token, "balanceOf", (holder,))
+def encode_call(function_name, args=()):
+    selector = FUNCTIONS[function_name][0]
+    return selector + "".join(hex_str(arg)[2:].lower().rjust(64, "0") for arg in args)
+
+
+# Decode a read's return data, or None when it is empty or not of the declared type
+def decode_result(function_name, data):
+    from eth_abi import decode
+
+    data = bytes.fromhex(hex_str(data)[2:]) if not isinstance(data, (bytes, bytearray)) else bytes(data)
+    if not data:
+        return None
+    try:
+        return decode([FUNCTIONS[function_name][1]], data)[0]
+    except Exception:
+        return None
+
+
+def is_revert(error):
+    message = str(error.get("message", error) if isinstance(error, dict) else error).lower()
+    return any(marker in message for marker in REVERT_MARKERS)
+
+
+# Run reads as aggregate3 calls with allowFailure set, so one reverting token does not fail the rest.
+# Every chunk goes out in one JSON-RPC batch. Returns (results, errors) like batch_request, or None
+# when MULTICALL_ADDRESS holds no contract on this chain.
+def aggregate(rpc_url, calls, block):
+    from eth_abi import decode, encode
+
+    chunks = [calls[start:start + MULTICALL_CHUNK_SIZE] for start in range(0, len(calls), MULTICALL_CHUNK_SIZE)]
+    requests = []
+    for chunk in chunks:
+        encoded = encode(
+            ["(address,bool,bytes)[]"],
+            [[(target, True, bytes.fromhex(encode_call(function_name, args)[2:])) for target, function_name, args in chunk]],
+        )
+        requests.append(("eth_call", [{"to": MULTICALL_ADDRESS, "data": AGGREGATE3_SELECTOR + encoded.hex()}, block]))
+    if len(requests) == 1:
+        responses, response_errors = [request(rpc_url, *requests[0])], [None]
+    else:
+        responses, response_errors = batch_request(rpc_url, requests)
+    stats["multicall_requests"] += len(requests)
+
+    results = []
+    errors = []
+    for chunk, response, response_error in zip(chunks, responses, response_errors):
+        if response_error is not None:
+            results.extend([None] * len(chunk))
+            errors.extend([response_error] * len(chunk))
+            continue
+        if response in (None, "0x"):
+            # A call to an address without code succeeds with no return data
+            return None
+        for (target, function_name, args), (success, data) in zip(chunk, decode(["(bool,bytes)[]"], bytes.fromhex(response[2:]))[0]):
+            results.append(decode_result(function_name, data) if success else None)
+            errors.append(None)
+    return results, errors
+
+
+# Run reads as one JSON-RPC batch of plain eth_calls, for chains without the multicall contract
+def batch_calls(rpc_url, calls, block):
+    responses, response_errors = batch_request(
+        rpc_url, [("eth_call", [{"to": target, "data": encode_call(function_name, args)}, block]) for target, function_name, args in calls]
+    )
+    stats["batched_requests"] += 1
+    results = []
+    errors = []
+    for (target, function_name, args), response, error in zip(calls, responses, response_errors):
+        if error is not None and not is_revert(error):
+            results.append(None)
+            errors.append(error)
+            continue
+        results.append(None if error is not None or response is None else decode_result(function_name, response))
+        errors.append(None)
+    return results, errors
+
+
+# Run read-only calls [(target, function name, args)] in as few requests as the node allows.
+# Returns (results, errors), one entry per call: results[i] is the decoded value, or None when the
+# call reverted or returned nothing usable (the contract's answer); errors[i] is set only when the
+# read could not be made (a node error), so callers can try again rather than cache a wrong answer.
+# Raises when the request itself fails, so the RPC pool can fail over.
+def read(rpc_url, calls, block="latest"):
+    if not calls:
+        return [], []
+    response = None
+    if MULTICALL_ADDRESS and rpc_url not in _multicall_missing:
+        response = aggregate(rpc_url, calls, block)
+        if response is None:
+            logging.info(f"No multicall contract at {MULTICALL_ADDRESS} via {rpc_url}, batching eth_calls instead")
+            _multicall_missing.add(rpc_url)
+    if response is None:
+        response = batch_calls(rpc_url, calls, block)
+    results, errors = response
+    reverted = sum(1 for result, error in zip(results, errors) if result is None and error is None)
+    failed = sum(1 for error in errors if error is not None)
+    stats["reads"] += len(calls)
+    stats["reverted"] += reverted
+    stats["failed"] += failed
+    metrics.inc("contract_reads_total", len(calls) - reverted - failed, result="ok")
+    metrics.inc("contract_reads_total", reverted, result="reverted")
+    metrics.inc("contract_reads_total", failed, result="failed")
+    return results, errors
+
+
+def summary():
+    return (
+        f"Contract reads: {stats['reads']} in {stats['multicall_requests']} multicall and {stats['batched_requests']} batched "
+        f"request(s), {stats['reverted']} reverted, {stats['failed']} failed"
+    )
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+
+# Constants
+OUTBOX_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "outbox.db")
+MAX_ATTEMPTS = 5  # Failed posts are retried with a doubling delay, then dropped
+RETRY_BASE = 60  # Seconds before the first retry of a failed post
+MAX_PENDING_AGE = 24 * 60 * 60  # Transfers still unposted after a day are expired rather than posted late
+
+_connection = None
+
+
+# Open the SQLite outbox and create its tables on first use.
+# outbox holds transfers waiting to be posted; ledger records every key already posted, dropped or expired;
+# cursors holds the last stored block queued per source.
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(OUTBOX_FILE), exist_ok=True)
+        _connection = sqlite3.connect(OUTBOX_FILE)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "key TEXT PRIMARY KEY, source TEXT, payload TEXT, queued_at REAL, attempts INTEGER, next_attempt_at REAL, last_error TEXT)"
+        )
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS ledger (key TEXT PRIMARY KEY, status TEXT, post_id TEXT, recorded_at REAL)"
+        )
+        _connection.execute("CREATE TABLE IF NOT EXISTS cursors (source TEXT PRIMARY KEY, block INTEGER)")
+    return _connection
+
+
+# Key a detection by source, transaction hash and log index, so each transfer is posted once
+def transfer_key(row):
+    tx_hash = str(row["tx_hash"]).lower()
+    if not tx_hash.startswith("0x"):
+        tx_hash = "0x" + tx_hash
+    return f"{row['source']}:{tx_hash}:{int(row.get('log_index', -1))}"
+
+
+# Queue detections that are neither queued nor in the ledger. Returns the number added.
+def enqueue(rows):
+    connection = get_connection()
+    now = time.time()
+    added = 0
+    for row in rows:
+        key = transfer_key(row)
+        if connection.execute("SELECT 1 FROM ledger WHERE key = ?", (key,)).fetchone():
+            continue
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, 0, 0, NULL)", (key, row["source"], json.dumps(row), now)
+        )
+        added += cursor.rowcount
+    connection.commit()
+    return added
+
+
+# Last block of a source already queued, or None before its first run
+def get_cursor(source):
+    row = get_connection().execute("SELECT block FROM cursors WHERE source = ?", (source,)).fetchone()
+    return None if row is None else row[0]
+
+
+def set_cursor(source, block):
+    connection = get_connection()
+    connection.execute("INSERT OR REPLACE INTO cursors VALUES (?, ?)", (source, int(block)))
+    connection.commit()
+
+
+# Transfers due for posting, oldest first. Returns [(key, payload)].
+def pending(source=None):
+    query = "SELECT key, payload FROM outbox WHERE next_attempt_at <= ?"
+    params = [time.time()]
+    if source is not None:
+        query += " AND source = ?"
+        params.append(source)
+    rows = get_connection().execute(query + " ORDER BY queued_at, key", params).fetchall()
+    return [(key, json.loads(payload)) for key, payload in rows]
+
+
+def record(connection, keys, status, post_id=None):
+    now = time.time()
+    connection.executemany("INSERT OR REPLACE INTO ledger VALUES (?, ?, ?, ?)", [(key, status, post_id, now) for key in keys])
+    connection.executemany("DELETE FROM outbox WHERE key = ?", [(key,) for key in keys])
+    connection.commit()
+
+
+# Move posted transfers to the ledger
+def mark_posted(keys, post_id):
+    record(get_connection(), keys, "posted", None if post_id is None else str(post_id))
+
+
+# Schedule a retry for a failed post, or drop it after MAX_ATTEMPTS
+def mark_failed(key, error):
+    connection = get_connection()
+    row = connection.execute("SELECT attempts FROM outbox WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return
+    attempts = row[0] + 1
+    if attempts >= MAX_ATTEMPTS:
+        logging.warning(f"Dropping {key} after {attempts} failed posts: {error}")
+        record(connection, [key], "dropped")
+        return
+    connection.execute(
+        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE key = ?",
+        (attempts, time.time() + RETRY_BASE * 2 ** (attempts - 1), str(error), key),
+    )
+    connection.commit()
+
+
+# Expire transfers queued longer than max_age seconds ago. Returns the number expired.
+def expire(max_age=MAX_PENDING_AGE):
+    connection = get_connection()
+    keys = [key for (key,) in connection.execute("SELECT key FROM outbox WHERE queued_at < ?", (time.time() - max_age,))]
+    if keys:
+        record(connection, keys, "expired")
+    return len(keys)
+
+
+# Counts of queued transfers and ledger entries by status
+def counts():
+    connection = get_connection()
+    result = {"pending": connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]}
+    result.update(dict(connection.execute("SELECT status, COUNT(*) FROM ledger GROUP BY status").fetchall()))
+    return result
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import os
-import pandas as pd
+import time
 from datetime import datetime
 import pytz
 from pathlib import Path
-import tweepy
 from dotenv import load_dotenv
+import transfer_store
+import outbox
+import labels
 
 # Load environment variables
 load_dotenv('/root/xdc-intel/.env')
@@ -15,13 +17,98 @@ ACCESS_TOKEN = os.getenv('TWITTER_ACCESS_TOKEN')
 ACCESS_TOKEN_SECRET = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
 
 # Paths
-DATA_DIR = Path('/root/xdc-intel-reports/data')
 LOG_FILE = Path('/root/xdc-intel/scan.log')
+POST_COLUMNS = ['tx_hash', 'log_index', 'from', 'to', 'value', 'value_usd', 'token_symbol', 'block_number', 'timestamp', 'from_label', 'to_label']
+SOURCES = ['large_transfers', 'usdc_bridge']
 
-# Twitter setup
-auth = tweepy.OAuthHandler(API_KEY, API_SECRET)
-auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
-api = tweepy.API(auth)
+# Posting limits
+POSTS_PER_HOUR = float(os.getenv('POSTS_PER_HOUR', '50'))  # Sustained post rate (X allows 300 posts per 3 hours)
+POST_BURST = 5  # Posts that may go out back to back before the hourly rate applies
+POST_TIME_BUDGET = int(os.getenv('POST_TIME_BUDGET', '600'))  # Seconds a run may spend posting; the rest waits in the outbox
+DIGEST_MODE = os.getenv('DIGEST_MODE', 'auto')  # auto: digest bursts above DIGEST_THRESHOLD; always; never
+DIGEST_THRESHOLD = int(os.getenv('DIGEST_THRESHOLD', '5'))  # Pending transfers per source before they are folded into a digest
+DIGEST_MAX_REPLIES = 4  # Thread replies listing the largest transfers of a digest
+MAX_POST_LENGTH = 280
+MAX_LABEL_LENGTH = 24  # Longer address labels are cut so a labeled post still fits
+EASTERN = pytz.timezone('US/Eastern')
+
+_api = None
+
+# Twitter setup, done on the first post so runs with nothing to send never load tweepy
+def get_api():
+    global _api
+    if _api is None:
+        import tweepy
+
+        auth = tweepy.OAuthHandler(API_KEY, API_SECRET)
+        auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
+        _api = tweepy.API(auth)
+    return _api
+
+# Raised when the rate limit or time budget stops posting; unposted transfers stay in the outbox
+class PostingPaused(Exception):
+    pass
+
+# Token-bucket sender that honours X's rate-limit headers and stops at the run's time budget
+class PostSender:
+    def __init__(self, get_api, posts_per_hour=POSTS_PER_HOUR, burst=POST_BURST, time_budget=POST_TIME_BUDGET):
+        self.get_api = get_api
+        self.rate = posts_per_hour / 3600
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.deadline = self.updated + time_budget
+        self.sent = 0
+
+    def sleep_until(self, ready_at, reason):
+        if ready_at > self.deadline:
+            raise PostingPaused(f"{reason}; next post possible in {ready_at - time.monotonic():.0f}s")
+        time.sleep(max(ready_at - time.monotonic(), 0))
+
+    def acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            self.sleep_until(now + (1 - self.tokens) / self.rate, "Post rate limit reached")
+            self.tokens = 1
+            self.updated = time.monotonic()
+        self.tokens -= 1
+
+    # Post text (optionally as a reply) and return the new status id
+    def send(self, text, in_reply_to=None):
+        import tweepy
+
+        api = self.get_api()
+        while True:
+            self.acquire()
+            try:
+                if in_reply_to is None:
+                    status = api.update_status(text)
+                else:
+                    status = api.update_status(text, in_reply_to_status_id=in_reply_to, auto_populate_reply_metadata=True)
+                self.sent += 1
+                return status.id
+            except tweepy.TooManyRequests as e:
+                self.sleep_until(time.monotonic() + get_retry_after(e), "X API rate limited")
+
+# Seconds X asks us to wait after a 429 (Retry-After, else the x-rate-limit-reset epoch)
+def get_retry_after(error):
+    headers = getattr(error.response, 'headers', None) or {}
+    try:
+        return float(headers['retry-after'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        return max(float(headers['x-rate-limit-reset']) - time.time(), 1)
+    except (KeyError, TypeError, ValueError):
+        return 15 * 60
+
+# X rejects an identical status as a duplicate (code 187); that transfer is already out
+def is_duplicate_post(error):
+    import tweepy
+
+    return isinstance(error, tweepy.Forbidden) and 187 in getattr(error, 'api_codes', [])
 
 # Logging function
 def log_message(message):
@@ -29,103 +116,173 @@ def log_message(message):
     with open(LOG_FILE, 'a') as f:
         f.write(f"[{timestamp}] {message}\n")
 
-# Get the latest CSV file
-def get_latest_csv(prefix):
-    csv_files = list(DATA_DIR.glob(f"{prefix}_*.csv"))
-    csv_files = [f for f in csv_files if not f.name.endswith('.tmp')]
-    if not csv_files:
-        return None
-    return max(csv_files, key=lambda x: x.stat().st_mtime)
-
 # Shorten address for display
 def shorten_address(address):
     return f"{address[:6]}...{address[-4:]}"
 
+# Address for display: its label from the label index when it has one, else the short address
+def describe_address(address, label=None, with_address=True):
+    if not label:
+        return shorten_address(address)
+    if len(label) > MAX_LABEL_LENGTH:
+        label = label[:MAX_LABEL_LENGTH - 1] + "…"
+    return f"{label} ({shorten_address(address)})" if with_address else label
+
 # Shorten transaction hash for display
 def shorten_tx_hash(tx_hash):
     return f"{tx_hash[:6]}..."
 
+# Build the single-transfer post, in the same format as before for both sources
+def format_transfer_post(transfer):
+    tx_hash = transfer['tx_hash']
+    value = transfer['value']
+    value_usd = transfer['value_usd']
+    token_symbol = transfer['token_symbol']
+    # Convert timestamp to UTC and EST
+    utc_time = datetime.strptime(transfer['timestamp'], "%Y-%m-%d %H:%M:%S").replace(tzinfo=pytz.UTC)
+    est_time = utc_time.astimezone(EASTERN)
+    utc_str = utc_time.strftime("%d %b %Y, %H:%M UTC")
+    est_str = est_time.strftime("%I:%M %p EST")
+    headline = "1 large transfer" if transfer['source'] == 'large_transfers' else f"1 large {token_symbol} transfer"
+    return (
+        f"Big moves on #XDCNetwork! 🚀\n"
+        f"{utc_str} ({est_str})\n"
+        f"{headline} (${value_usd:,.2f}) detected! 📈\n"
+        f"{value:,.2f} {token_symbol} (${value_usd:,.2f}) transferred\n"
+        f"From: {describe_address(transfer['from'], transfer.get('from_label'))}\n"
+        f"To: {describe_address(transfer['to'], transfer.get('to_label'))}\n"
+        f"{est_time.strftime('%d %b %Y, %I:%M %p EST')}\n"
+        f"Tx: {shorten_tx_hash(tx_hash)} View on XDCScan: xdcscan.io/tx/{tx_hash}\n"
+        f"#XDC #blockchain 🎉"
+    )
+
+# Build a digest thread for a burst of transfers: one summary post, then replies listing the largest
+def format_digest(transfers):
+    total_usd = sum(transfer['value_usd'] for transfer in transfers)
+    by_token = {}
+    for transfer in transfers:
+        by_token[transfer['token_symbol']] = by_token.get(transfer['token_symbol'], 0) + transfer['value_usd']
+    top_tokens = sorted(by_token.items(), key=lambda item: -item[1])[:3]
+    timestamps = sorted(transfer['timestamp'] for transfer in transfers)
+    start = datetime.strptime(timestamps[0], "%Y-%m-%d %H:%M:%S").strftime("%d %b %H:%M")
+    end = datetime.strptime(timestamps[-1], "%Y-%m-%d %H:%M:%S").strftime("%d %b %H:%M UTC")
+    summary = (
+        f"Big moves on #XDCNetwork! 🚀\n"
+        f"{len(transfers)} large transfers detected ({start} - {end}) 📈\n"
+        f"Total: ${total_usd:,.2f}\n"
+        f"Top tokens: {', '.join(f'{symbol} (${value:,.0f})' for symbol, value in top_tokens)}\n"
+        f"Largest below 🧵\n"
+        f"#XDC #blockchain 🎉"
+    )
+
+    replies = []
+    current = ""
+    for transfer in sorted(transfers, key=lambda transfer: -transfer['value_usd']):
+        line = (
+            f"{transfer['value']:,.0f} {transfer['token_symbol']} (${transfer['value_usd']:,.0f}) "
+            f"{describe_address(transfer['from'], transfer.get('from_label'), False)} → "
+            f"{describe_address(transfer['to'], transfer.get('to_label'), False)} xdcscan.io/tx/{transfer['tx_hash']}\n"
+        )
+        if current and len(current) + len(line) > MAX_POST_LENGTH:
+            replies.append(current.rstrip())
+            current = ""
+            if len(replies) == DIGEST_MAX_REPLIES:
+                break
+        current += line
+    if current and len(replies) < DIGEST_MAX_REPLIES:
+        replies.append(current.rstrip())
+    return summary, replies
+
+def use_digest(pending_count):
+    if DIGEST_MODE == 'always':
+        return pending_count > 1
+    if DIGEST_MODE == 'never':
+        return False
+    return pending_count > DIGEST_THRESHOLD
+
+# Post each pending transfer on its own, recording each one in the ledger as it goes out
+def post_individually(sender, pending):
+    for key, transfer in pending:
+        try:
+            post_id = sender.send(format_transfer_post(transfer))
+        except PostingPaused:
+            raise
+        except Exception as e:
+            if is_duplicate_post(e):
+                outbox.mark_posted([key], None)
+                continue
+            log_message(f"Failed to post {key}: {str(e)}")
+            outbox.mark_failed(key, e)
+            continue
+        outbox.mark_posted([key], post_id)
+        log_message(f"Posted {transfer['source']} transfer: {transfer['tx_hash']}")
+
+# Post a burst as one digest thread; the summary post covers every transfer in it
+def post_digest(sender, source, pending):
+    summary, replies = format_digest([transfer for _, transfer in pending])
+    keys = [key for key, _ in pending]
+    try:
+        thread_id = sender.send(summary)
+    except PostingPaused:
+        raise
+    except Exception as e:
+        log_message(f"Failed to post {source} digest of {len(keys)} transfers: {str(e)}")
+        for key in keys:
+            outbox.mark_failed(key, e)
+        return
+    outbox.mark_posted(keys, thread_id)
+    log_message(f"Posted {source} digest of {len(keys)} transfers")
+    for reply in replies:
+        try:
+            thread_id = sender.send(reply, in_reply_to=thread_id)
+        except Exception as e:
+            # The transfers are already covered by the summary; a missing detail reply is not retried
+            log_message(f"Stopped {source} digest thread early: {str(e)}")
+            break
+
+# Queue every transfer each source stored above the last block queued for it (on the first run, its
+# latest scan). Transfers already queued or in the ledger are skipped, so reading a block twice is harmless.
+# Labels travel with the queued payload: the scanner's stored ones, or a lookup for rows stored without any.
+def queue_new_transfers():
+    for source in SOURCES:
+        after_block = outbox.get_cursor(source)
+        if after_block is None:
+            transfers = transfer_store.read_latest_records(source, columns=POST_COLUMNS)
+        else:
+            transfers = transfer_store.read_records_after(source, after_block, columns=POST_COLUMNS)
+        rows = [dict(transfer, source=source) for transfer in transfers]
+        labels.enrich([row for row in rows if row.get('from_label') is None and row.get('to_label') is None])
+        added = outbox.enqueue(rows)
+        if rows:
+            outbox.set_cursor(source, max(row['block_number'] for row in rows))
+        log_message(f"Loaded {len(rows)} {source} transfers stored after block {after_block}, {added} new")
+
 # Post to Twitter
 def post_to_twitter():
     log_message("Starting post_to_x.py...")
 
-    # Handle large XDC transfers (hourly)
-    latest_xdc_csv = get_latest_csv("large_transfers")
-    xdc_transfers = pd.DataFrame()
-    if latest_xdc_csv:
-        xdc_transfers = pd.read_csv(latest_xdc_csv)
-        log_message(f"Found XDC transfers CSV: {latest_xdc_csv}")
-
-    # Handle USDC.e transfers (daily)
-    latest_usdc_csv = get_latest_csv("usdc_bridge_transfers")
-    usdc_transfers = pd.DataFrame()
-    if latest_usdc_csv:
-        usdc_transfers = pd.read_csv(latest_usdc_csv)
-        log_message(f"Found USDC.e transfers CSV: {latest_usdc_csv}")
+    queue_new_transfers()
+    expired = outbox.expire()
+    if expired:
+        log_message(f"Expired {expired} transfers that waited too long to be posted")
 
+    sender = PostSender(get_api)
     try:
-        # Post XDC transfers (keep existing format for now)
-        if not xdc_transfers.empty:
-            for _, transfer in xdc_transfers.iterrows():
-                tx_hash = transfer['tx_hash']
-                value_xdc = transfer['value_xdc']
-                value_usd = transfer['value_usd']
-                token_symbol = transfer['token_symbol']
-                timestamp = transfer['timestamp']
-                # Convert timestamp to UTC and EST
-                utc_time = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=pytz.UTC)
-                est_time = utc_time.astimezone(pytz.timezone('US/Eastern'))
-                utc_str = utc_time.strftime("%d %b %Y, %H:%M UTC")
-                est_str = est_time.strftime("%I:%M %p EST")
-                short_tx = shorten_tx_hash(tx_hash)
-                tweet = (
-                    f"Big moves on #XDCNetwork! 🚀\n"
-                    f"{utc_str} ({est_str})\n"
-                    f"1 large transfer (${value_usd:,.2f}) detected! 📈\n"
-                    f"{value_xdc:,.2f} {token_symbol} (${value_usd:,.2f}) transferred\n"
-                    f"From: {shorten_address(transfer['from'])}\n"
-                    f"To: {shorten_address(transfer['to'])}\n"
-                    f"{est_time.strftime('%d %b %Y, %I:%M %p EST')}\n"
-                    f"Tx: {short_tx} View on XDCScan: xdcscan.io/tx/{tx_hash}\n"
-                    f"#XDC #blockchain 🎉"
-                )
-                api.update_status(tweet)
-                log_message(f"Posted XDC transfer: {tx_hash}")
-
-        # Post USDC.e transfers in the same style
-        if not usdc_transfers.empty:
-            for _, transfer in usdc_transfers.iterrows():
-                tx_hash = transfer['tx_hash']
-                value_usdc = transfer['value_usdc']
-                value_usd = transfer['value_usd']
-                token_symbol = transfer['token_symbol']
-                timestamp = transfer['timestamp']
-                # Convert timestamp to UTC and EST
-                utc_time = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=pytz.UTC)
-                est_time = utc_time.astimezone(pytz.timezone('US/Eastern'))
-                utc_str = utc_time.strftime("%d %b %Y, %H:%M UTC")
-                est_str = est_time.strftime("%I:%M %p EST")
-                short_tx = shorten_tx_hash(tx_hash)
-                tweet = (
-                    f"Big moves on #XDCNetwork! 🚀\n"
-                    f"{utc_str} ({est_str})\n"
-                    f"1 large {token_symbol} transfer (${value_usd:,.2f}) detected! 📈\n"
-                    f"{value_usdc:,.2f} {token_symbol} (${value_usd:,.2f}) transferred\n"
-                    f"From: {shorten_address(transfer['from'])}\n"
-                    f"To: {shorten_address(transfer['to'])}\n"
-                    f"{est_time.strftime('%d %b %Y, %I:%M %p EST')}\n"
-                    f"Tx: {short_tx} View on XDCScan: xdcscan.io/tx/{tx_hash}\n"
-                    f"#XDC #blockchain 🎉"
-                )
-                api.update_status(tweet)
-                log_message(f"Posted USDC.e transfer: {tx_hash}")
-
-        if xdc_transfers.empty and usdc_transfers.empty:
-            log_message("No transfers to report. Skipping X post.")
+        for source in SOURCES:
+            pending = outbox.pending(source)
+            if not pending:
+                continue
+            if use_digest(len(pending)):
+                post_digest(sender, source, pending)
+            else:
+                post_individually(sender, pending)
+    except PostingPaused as e:
+        log_message(f"Posting paused: {str(e)}")
 
-    except Exception as e:
-        log_message(f"Error posting to Twitter: {str(e)}")
-        raise
+    counts = outbox.counts()
+    if sender.sent == 0 and counts['pending'] == 0:
+        log_message("No transfers to report. Skipping X post.")
+    log_message(f"Sent {sender.sent} posts; outbox: {counts}")
 
 if __name__ == "__main__":
     try:
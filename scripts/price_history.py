@@ -0,0 +1,226 @@
+import os
+import time
+import fcntl
+import logging
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+import requests
+from ratelimit import limits
+import metrics
+from metrics import sleep_and_retry
+import price_service
+
+# Constants
+CMC_HISTORY_URL = os.getenv("CMC_HISTORY_URL", "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical")
+PRICE_HISTORY = os.getenv("PRICE_HISTORY", "1") == "1"  # Value transfers at their block time; 0 values them at the current quote
+PRICE_HISTORY_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "price_history.db")
+PRICE_HISTORY_INTERVAL = os.getenv("PRICE_HISTORY_INTERVAL", "1h")  # Series granularity, as a CMC interval
+INTERVAL_SECONDS = {"5m": 300, "10m": 600, "15m": 900, "30m": 1800, "1h": 3600, "hourly": 3600}
+MAX_POINTS_PER_REQUEST = 10000  # CMC's limit on quotes per symbol per request (~13 months of hourly prices)
+MAX_SYMBOLS_PER_REQUEST = 100
+RETRY_AFTER_FAILURE = 15 * 60  # Seconds before fetching again after a failed request; transfers meanwhile use the current quote
+RETRY_AFTER_DENIED = 24 * 60 * 60  # ...or after CMC refused the request (the API plan has no historical quotes)
+
+_connection = None
+_coverage = {}  # symbol -> sorted [[start, end], ...] of time ranges already fetched
+_series = {}  # symbol -> (timestamps, prices) arrays
+_retry_after = 0
+stats = {"hits": 0, "misses": 0}  # Timestamps valued from a series / at the current quote
+fetch_stats = {"requests": 0, "points": 0}
+metrics.register_stats("price_history", stats)
+
+
+# Open the price series database and create its tables on first use.
+# prices holds one row per symbol and quote time; coverage holds the time ranges already fetched per
+# symbol, so a range CMC has no quotes for (an unknown symbol, a gap) is not fetched again.
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(PRICE_HISTORY_FILE), exist_ok=True)
+        _connection = sqlite3.connect(PRICE_HISTORY_FILE, timeout=30)
+        _connection.executescript(
+            "CREATE TABLE IF NOT EXISTS prices (symbol TEXT, timestamp INTEGER, price REAL, PRIMARY KEY (symbol, timestamp)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS coverage (symbol TEXT, start INTEGER, end INTEGER, PRIMARY KEY (symbol, start)) WITHOUT ROWID;"
+        )
+    return _connection
+
+
+# Serialize fills across processes (e.g. backfill shards), so a range is fetched once and the
+# other processes find it covered
+@contextmanager
+def fill_lock():
+    os.makedirs(os.path.dirname(PRICE_HISTORY_FILE), exist_ok=True)
+    with open(f"{PRICE_HISTORY_FILE}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_coverage(symbol):
+    _coverage[symbol] = [
+        [start, end] for start, end in get_connection().execute(
+            "SELECT start, end FROM coverage WHERE symbol = ? ORDER BY start", (symbol,)
+        )
+    ]
+    return _coverage[symbol]
+
+
+# Parts of [start, end] not covered by the sorted ranges
+def missing_ranges(ranges, start, end):
+    missing = []
+    for covered_start, covered_end in ranges:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+
+# Gaps of [start, end] worth a request. A gap starting within the last step before now is left to the
+# current quote: CMC has no quote for it yet, and fetching it would cost every batch at the chain head
+# a request for the few seconds since the previous one.
+def fetch_gaps(ranges, start, end, now, step):
+    return [(gap_start, gap_end) for gap_start, gap_end in missing_ranges(ranges, start, end) if gap_start < now - step]
+
+
+# Record [start, end] as fetched for a symbol, merging it with the ranges it touches
+def add_coverage(connection, symbol, start, end):
+    merged = []
+    for range_start, range_end in sorted(load_coverage(symbol) + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    connection.execute("DELETE FROM coverage WHERE symbol = ?", (symbol,))
+    connection.executemany("INSERT INTO coverage VALUES (?, ?, ?)", [(symbol, start, end) for start, end in merged])
+    _coverage[symbol] = merged
+
+
+# Fetch USD quotes of several symbols over [start, end] in one CMC request.
+# Returns {symbol: [(timestamp, price), ...]}; symbols CMC does not know are left out.
+@sleep_and_retry
+@limits(calls=price_service.CMC_RATE_LIMIT, period=60)
+def fetch_history(symbols, start, end, interval):
+    headers = {"X-CMC_PRO_API_KEY": price_service.get_api_key(), "Accept": "application/json"}
+    params = {
+        "symbol": ",".join(symbols), "time_start": start, "time_end": end, "interval": interval,
+        "count": MAX_POINTS_PER_REQUEST, "convert": "USD", "skip_invalid": "true",
+    }
+    with metrics.timer("cmc_request_seconds"):
+        response = requests.get(CMC_HISTORY_URL, headers=headers, params=params, timeout=60)
+    response.raise_for_status()
+    data = response.json().get("data", {})
+    fetch_stats["requests"] += 1
+    series = {}
+    for symbol in symbols:
+        entry = price_service.pick_coin(symbol, data.get(symbol))
+        if entry is None and len(symbols) == 1 and "quotes" in data:  # v1 responses hold the one coin directly
+            entry = data
+        points = []
+        for quote in (entry or {}).get("quotes") or []:
+            try:
+                price = quote["quote"]["USD"]["price"]
+                timestamp = np.datetime64(quote["timestamp"][:19], "s").astype(np.int64)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if price is not None:
+                points.append((int(timestamp), float(price)))
+        series[symbol] = points
+        fetch_stats["points"] += len(points)
+    return series
+
+
+# Make sure the cached series of every symbol covers [start, end] (unix seconds), fetching only what
+# is missing. A gap reaching the end of the range is fetched up to now, so the batches after it (and
+# every earlier-starting shard of a backfill) find it covered: a scan run or a month-long backfill
+# costs one request per symbol group rather than one per batch; following the chain head costs one per step.
+# Returns the number of requests made.
+def ensure(symbols, start, end):
+    global _retry_after
+    now = int(time.time())
+    if not PRICE_HISTORY or now < _retry_after:
+        return 0
+    step = INTERVAL_SECONDS.get(PRICE_HISTORY_INTERVAL, 3600)
+    # Pad by one step on both sides so every timestamp has a quote before and after it to interpolate between
+    start = int(start) // step * step - step
+    end = min(-(-int(end) // step) * step + step, now)
+    symbols = sorted(symbol for symbol in set(symbols) if symbol)
+    if start >= end or not any(fetch_gaps(_coverage.get(symbol) or load_coverage(symbol), start, end, now, step) for symbol in symbols):
+        return 0
+
+    requests_made = 0
+    with fill_lock():
+        # Another process may have filled the range while this one waited for the lock
+        gaps = {}
+        for symbol in symbols:
+            for gap_start, gap_end in fetch_gaps(load_coverage(symbol), start, end, now, step):
+                gaps.setdefault((gap_start, now if gap_end == end else gap_end), []).append(symbol)
+        connection = get_connection()
+        for (gap_start, gap_end), gap_symbols in sorted(gaps.items()):
+            for window_start in range(gap_start, gap_end, step * MAX_POINTS_PER_REQUEST):
+                window_end = min(window_start + step * MAX_POINTS_PER_REQUEST, gap_end)
+                for chunk_start in range(0, len(gap_symbols), MAX_SYMBOLS_PER_REQUEST):
+                    chunk = gap_symbols[chunk_start:chunk_start + MAX_SYMBOLS_PER_REQUEST]
+                    try:
+                        series = fetch_history(chunk, window_start, window_end, PRICE_HISTORY_INTERVAL)
+                    except Exception as e:
+                        status = getattr(getattr(e, "response", None), "status_code", None)
+                        _retry_after = time.time() + (RETRY_AFTER_DENIED if status in (401, 402, 403) else RETRY_AFTER_FAILURE)
+                        logging.error(f"Failed to fetch price history for {','.join(chunk)}, valuing at current quotes: {str(e)}")
+                        return requests_made
+                    requests_made += 1
+                    with connection:
+                        for symbol in chunk:
+                            connection.executemany(
+                                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+                                [(symbol, timestamp, price) for timestamp, price in series.get(symbol, [])],
+                            )
+                            add_coverage(connection, symbol, window_start, window_end)
+                            _series.pop(symbol, None)
+                    logging.info(
+                        f"Fetched {sum(len(points) for points in series.values())} {PRICE_HISTORY_INTERVAL} prices "
+                        f"for {len(chunk)} symbol(s) in one request"
+                    )
+    return requests_made
+
+
+# The cached series of a symbol as (timestamps, prices) arrays, oldest first
+def load_series(symbol):
+    series = _series.get(symbol)
+    if series is None:
+        rows = get_connection().execute("SELECT timestamp, price FROM prices WHERE symbol = ? ORDER BY timestamp", (symbol,)).fetchall()
+        points = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        series = _series[symbol] = (points[:, 0], points[:, 1])
+    return series
+
+
+# USD prices of a symbol at unix timestamps, as a float array: interpolated linearly between the cached
+# quotes around each timestamp, all in one vectorized lookup. current (the latest quote) anchors the series
+# at the present, and is what every timestamp gets when there is no history for the symbol.
+def prices_at(symbol, timestamps, current=None):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    current = float(current or 0)
+    times, prices = load_series(symbol) if PRICE_HISTORY else (np.zeros(0), np.zeros(0))
+    if current and (not len(times) or times[-1] < time.time()):
+        times = np.append(times, time.time())
+        prices = np.append(prices, current)
+    if not len(times) or (len(times) == 1 and current):
+        stats["misses"] += len(timestamps)
+        return np.full(len(timestamps), current)
+    stats["hits"] += len(timestamps)
+    return np.interp(timestamps, times, prices)
+
+
+def summary():
+    return (
+        f"Price history: {stats['hits']} timestamps valued from the series, {stats['misses']} at the current quote, "
+        f"{fetch_stats['points']} prices fetched in {fetch_stats['requests']} request(s)"
+    )
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import requests
+from ratelimit import limits
+import metrics
+from metrics import sleep_and_retry
+
+# Constants
+CMC_API_URL = os.getenv("CMC_API_URL", "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest")
+CMC_RATE_LIMIT = 30  # Requests per minute
+PRICE_CACHE_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "price_cache.json")
+PRICE_CACHE_DURATION = 600  # Quotes younger than 10 minutes are served without a refresh
+STALE_PRICE_LIMIT = 24 * 60 * 60  # Quotes older than a day count as missing: lookups that wait fetch them first
+NEGATIVE_CACHE_DURATION = 6 * 60 * 60  # Symbols CMC does not know are retried after 6 hours
+FAILED_FETCH_RETRY = float(os.getenv("PRICE_FAILED_FETCH_RETRY", "60"))  # Seconds before symbols whose fetch failed are fetched again
+MAX_SYMBOLS_PER_REQUEST = 100
+# CoinMarketCap ids of symbols several coins share, as "SYMBOL:id,..."; other symbols use the highest ranked coin
+CMC_IDS = {"XDC": 2634, "USDC": 3408}
+CMC_IDS.update({
+    symbol.strip(): int(coin_id) for symbol, _, coin_id in
+    (item.partition(":") for item in os.getenv("CMC_IDS", "").split(",") if item.strip())
+})
+
+_lock = threading.Lock()
+_cache = None  # symbol -> {"price": float or None, "timestamp": float}
+_refreshing = set()
+_failed = {}  # symbol -> time its last fetch failed (kept in memory only, so the last known quote stays cached)
+stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "failed_hits": 0}
+metrics.register_stats("prices", stats)
+
+
+def get_api_key():
+    return os.getenv("CMC_API_KEY") or os.getenv("COINMARKETCAP_API_KEY")
+
+
+# Load the shared cache from disk once per process
+def load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(PRICE_CACHE_FILE, "r") as f:
+                _cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _cache = {}
+    return _cache
+
+
+# Write the cache atomically, keeping newer quotes another scanner may have saved meanwhile.
+# The lock keeps a background refresh and an inline one from saving at the same time; the temporary
+# file is unique either way, so concurrent processes never rename each other's file away.
+def save_cache():
+    os.makedirs(os.path.dirname(PRICE_CACHE_FILE), exist_ok=True)
+    with _lock:
+        try:
+            with open(PRICE_CACHE_FILE, "r") as f:
+                on_disk = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            on_disk = {}
+        snapshot = dict(on_disk)
+        for symbol, entry in _cache.items():
+            if symbol not in snapshot or snapshot[symbol]["timestamp"] <= entry["timestamp"]:
+                snapshot[symbol] = entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(PRICE_CACHE_FILE), prefix="price_cache.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, PRICE_CACHE_FILE)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+# The coin a symbol's response entry stands for. v2 responses list every coin sharing the symbol:
+# pick the one with the id in CMC_IDS, else the highest ranked one. None when the listed id is missing.
+def pick_coin(symbol, entry):
+    if not isinstance(entry, list):
+        return entry
+    if symbol in CMC_IDS:
+        return next((coin for coin in entry if coin.get("id") == CMC_IDS[symbol]), None)
+    ranked = [coin for coin in entry if coin.get("cmc_rank")]
+    return min(ranked, key=lambda coin: coin["cmc_rank"]) if ranked else (entry[0] if entry else None)
+
+
+# Fetch USD quotes for several symbols in one comma-separated CMC request
+@sleep_and_retry
+@limits(calls=CMC_RATE_LIMIT, period=60)
+def fetch_quotes(symbols):
+    headers = {"X-CMC_PRO_API_KEY": get_api_key(), "Accept": "application/json"}
+    params = {"symbol": ",".join(symbols), "convert": "USD", "skip_invalid": "true"}
+    with metrics.timer("cmc_request_seconds"):
+        response = requests.get(CMC_API_URL, headers=headers, params=params, timeout=30)
+    response.raise_for_status()
+    data = response.json().get("data", {})
+    quotes = {}
+    for symbol in symbols:
+        entry = pick_coin(symbol, data.get(symbol))
+        try:
+            quotes[symbol] = entry["quote"]["USD"]["price"]
+        except (KeyError, TypeError):
+            continue
+    return quotes
+
+
+# Fetch and cache quotes; symbols missing from the response are negative-cached, and symbols whose
+# fetch failed are not fetched again for FAILED_FETCH_RETRY seconds
+def refresh(symbols):
+    cache = load_cache()
+    now = time.time()
+    for chunk_start in range(0, len(symbols), MAX_SYMBOLS_PER_REQUEST):
+        chunk = symbols[chunk_start:chunk_start + MAX_SYMBOLS_PER_REQUEST]
+        try:
+            quotes = fetch_quotes(chunk)
+        except Exception as e:
+            logging.error(f"Failed to fetch prices for {','.join(chunk)}: {str(e)}")
+            with _lock:
+                _failed.update((symbol, time.time()) for symbol in chunk)
+            continue
+        with _lock:
+            for symbol in chunk:
+                _failed.pop(symbol, None)
+                if symbol in quotes and quotes[symbol] is not None:
+                    cache[symbol] = {"price": quotes[symbol], "timestamp": now}
+                else:
+                    cache[symbol] = {"price": None, "timestamp": now}
+        logging.info(f"Fetched prices for {len(quotes)}/{len(chunk)} symbols in one request")
+    save_cache()
+
+
+def refresh_in_background(symbols):
+    with _lock:
+        symbols = [symbol for symbol in symbols if symbol not in _refreshing]
+        _refreshing.update(symbols)
+    if not symbols:
+        return
+
+    def run():
+        try:
+            refresh(symbols)
+        finally:
+            with _lock:
+                _refreshing.difference_update(symbols)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+# Return {symbol: price} for the requested symbols without waiting on CMC.
+# Fresh quotes are served from cache; stale, expired and never seen symbols are served their last known
+# quote (or 0) while one background request refreshes them. wait=True instead fetches the symbols without
+# a usable quote before returning, for lookups made before any block is scanned.
+# Symbols CMC does not know map to 0, as do symbols whose fetch failed less than FAILED_FETCH_RETRY ago.
+def get_prices(symbols, wait=False):
+    cache = load_cache()
+    now = time.time()
+    prices = {}
+    stale = []
+    unknown = []
+    for symbol in set(symbols):
+        entry = cache.get(symbol)
+        age = now - entry["timestamp"] if entry else None
+        if entry is not None and entry["price"] is None:
+            stats["negative_hits"] += 1
+            prices[symbol] = 0
+            if age >= NEGATIVE_CACHE_DURATION:
+                stale.append(symbol)
+            continue
+        if entry is not None and age < PRICE_CACHE_DURATION:
+            stats["hits"] += 1
+            prices[symbol] = entry["price"]
+            continue
+        # Falls back to the last known quote while the refresh runs
+        prices[symbol] = entry["price"] if entry else 0
+        if now - _failed.get(symbol, 0) < FAILED_FETCH_RETRY:
+            stats["failed_hits"] += 1
+        elif entry is not None and age < STALE_PRICE_LIMIT:
+            stats["stale_hits"] += 1
+            stale.append(symbol)
+        else:
+            stats["misses"] += 1
+            unknown.append(symbol)
+
+    if unknown and wait:
+        refresh(sorted(unknown))
+        for symbol in unknown:
+            prices[symbol] = (cache.get(symbol) or {}).get("price") or prices[symbol]
+    elif unknown:
+        stale.extend(unknown)
+    if stale:
+        refresh_in_background(sorted(stale))
+    return prices
+
+
+# Quote one symbol, fetching it before returning if the cache has no usable quote (run startup lookups)
+def get_price(symbol, default=0):
+    return get_prices([symbol], wait=True).get(symbol) or default
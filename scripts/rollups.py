@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+# Constants
+ROLLUP_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "rollups.db")
+PERIODS = {"hour": 13, "day": 10}  # Bucket = leading characters of the "YYYY-MM-DD HH:MM:SS" timestamp
+ALL_SOURCES = "*"  # Rollup rows over every source, counting a transfer stored under several sources once
+
+_connection = None
+
+
+# Open the rollup database and create its tables on first use.
+# flows holds one row per detection (the ledger rollups are rebuilt from, so rescans can replace a range);
+# token_rollups and address_rollups hold count/sum/max per hour and per day and are what queries read.
+# Databases rolled up before the ALL_SOURCES rows existed get them on open.
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(ROLLUP_FILE), exist_ok=True)
+        _connection = sqlite3.connect(ROLLUP_FILE, timeout=30)
+        _connection.executescript(
+            "CREATE TABLE IF NOT EXISTS flows ("
+            " source TEXT, tx_hash TEXT, log_index INTEGER, token TEXT, from_address TEXT, to_address TEXT,"
+            " value REAL, value_usd REAL, block_number INTEGER, hour TEXT, PRIMARY KEY (source, tx_hash, log_index));"
+            "CREATE INDEX IF NOT EXISTS flows_block ON flows (source, block_number);"
+            "CREATE INDEX IF NOT EXISTS flows_hour ON flows (hour);"
+            "CREATE TABLE IF NOT EXISTS token_rollups ("
+            " period TEXT, bucket TEXT, source TEXT, token TEXT, count INTEGER, value REAL, value_usd REAL, max_usd REAL,"
+            " PRIMARY KEY (period, bucket, source, token));"
+            "CREATE TABLE IF NOT EXISTS address_rollups ("
+            " period TEXT, bucket TEXT, address TEXT, direction TEXT, source TEXT, token TEXT,"
+            " count INTEGER, value REAL, value_usd REAL, max_usd REAL,"
+            " PRIMARY KEY (period, bucket, address, direction, source, token));"
+            "CREATE INDEX IF NOT EXISTS address_rollups_token ON address_rollups (token, direction, period, bucket);"
+        )
+        if _connection.execute("SELECT 1 FROM token_rollups WHERE source = ? LIMIT 1", (ALL_SOURCES,)).fetchone() is None:
+            with _connection:
+                rebuild_buckets(_connection, {hour for (hour,) in _connection.execute("SELECT DISTINCT hour FROM flows")})
+    return _connection
+
+
+# Recompute the rollup rows of the given hours (and the days containing them) from the flows ledger:
+# per source, and once more as ALL_SOURCES over one flow per (tx_hash, log_index)
+def rebuild_buckets(connection, hours):
+    for period, length in PERIODS.items():
+        for bucket in sorted({hour[:length] for hour in hours}):
+            first_hour, last_hour = (bucket, bucket) if period == "hour" else (f"{bucket} 00", f"{bucket} 23")
+            connection.execute("DELETE FROM token_rollups WHERE period = ? AND bucket = ?", (period, bucket))
+            connection.execute("DELETE FROM address_rollups WHERE period = ? AND bucket = ?", (period, bucket))
+            unique = "rowid IN (SELECT MIN(rowid) FROM flows WHERE hour BETWEEN ? AND ? GROUP BY tx_hash, log_index)"
+            for source, group, condition in (("source", "source, ", "hour BETWEEN ? AND ?"), (f"'{ALL_SOURCES}'", "", unique)):
+                connection.execute(
+                    f"INSERT INTO token_rollups SELECT ?, ?, {source}, token, COUNT(*), SUM(value), SUM(value_usd), MAX(value_usd)"
+                    f" FROM flows WHERE {condition} GROUP BY {group}token",
+                    (period, bucket, first_hour, last_hour),
+                )
+                for direction, column in (("out", "from_address"), ("in", "to_address")):
+                    connection.execute(
+                        f"INSERT INTO address_rollups SELECT ?, ?, {column}, ?, {source}, token, COUNT(*), SUM(value), SUM(value_usd), MAX(value_usd)"
+                        f" FROM flows WHERE {condition} AND {column} IS NOT NULL GROUP BY {column}, {group}token",
+                        (period, bucket, direction, first_hour, last_hour),
+                    )
+
+
+# Add detections (transfer_store's normalized schema) to the flows ledger. Returns the hours they fall in.
+def insert_flows(connection, source, records):
+    rows = [
+        (
+            source, record["tx_hash"], record["log_index"], record["token_symbol"],
+            record["from"].lower() if record["from"] else None, record["to"].lower() if record["to"] else None,
+            record["value"], record["value_usd"], record["block_number"], record["timestamp"][:PERIODS["hour"]],
+        )
+        for record in records
+    ]
+    connection.executemany("INSERT OR REPLACE INTO flows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return {row[-1] for row in rows}
+
+
+# Merge one scanned block range of a source into the rollups. Detections the source stored earlier for
+# the same range are replaced, so rescanning (or backfilling) a range never double counts.
+# records use transfer_store's normalized schema. Only the hours and days touched are recomputed.
+def merge(source, records, from_block, to_block):
+    start = time.perf_counter()
+    connection = get_connection()
+    with connection:
+        touched = {hour for (hour,) in connection.execute(
+            "SELECT DISTINCT hour FROM flows WHERE source = ? AND block_number BETWEEN ? AND ?", (source, from_block, to_block)
+        )}
+        connection.execute("DELETE FROM flows WHERE source = ? AND block_number BETWEEN ? AND ?", (source, from_block, to_block))
+        touched.update(insert_flows(connection, source, records))
+        rebuild_buckets(connection, touched)
+    logging.info(f"Rolled up {len(records)} {source} detections into {len(touched)} hour bucket(s) in {time.perf_counter() - start:.2f}s")
+    return len(touched)
+
+
+# Rebuild every rollup from the transfer store, one stored file at a time. A rescan replaces the
+# blocks it covers in the store itself, so every stored row is current and the files can be replayed in any order.
+# Returns the number of files read.
+def rebuild_from_store():
+    import pyarrow.parquet as pq
+    import transfer_store
+
+    manifest = transfer_store.load_manifest()
+    connection = get_connection()
+    touched = set()
+    files = 0
+    with connection:
+        for table in ("flows", "token_rollups", "address_rollups"):
+            connection.execute(f"DELETE FROM {table}")
+        for key, partition in sorted(manifest["partitions"].items()):
+            for file_name in partition["files"]:
+                match = re.match(r"part-(.+)-(\d+)-(\d+)\.parquet$", file_name)
+                if not match:
+                    continue
+                records = pq.read_table(os.path.join(transfer_store.STORE_DIR, key, file_name)).to_pylist()
+                touched.update(insert_flows(connection, match.group(1), records))
+                files += 1
+        rebuild_buckets(connection, touched)
+    return files
+
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S" if len(value) > 10 else "%Y-%m-%d")
+
+
+# SQL condition selecting the fewest buckets that cover [start, end) to the hour: whole days from the
+# daily rollups and the partial days at either edge from the hourly ones
+def span_condition(start, end):
+    start = to_datetime(start).replace(minute=0, second=0, microsecond=0)
+    end = to_datetime(end)
+    if end.minute or end.second or end.microsecond:
+        end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    first_day = start if start.hour == 0 else (start + timedelta(days=1)).replace(hour=0)
+    last_day = end.replace(hour=0)
+    if first_day >= last_day:
+        return "(period = 'hour' AND bucket >= ? AND bucket < ?)", [start.strftime("%Y-%m-%d %H"), end.strftime("%Y-%m-%d %H")]
+    return (
+        "((period = 'day' AND bucket >= ? AND bucket < ?)"
+        " OR (period = 'hour' AND ((bucket >= ? AND bucket < ?) OR (bucket >= ? AND bucket < ?))))",
+        [
+            first_day.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d"),
+            start.strftime("%Y-%m-%d %H"), first_day.strftime("%Y-%m-%d %H"),
+            last_day.strftime("%Y-%m-%d %H"), end.strftime("%Y-%m-%d %H"),
+        ],
+    )
+
+
+# Query conditions for one source, or for the ALL_SOURCES rows when source is None
+def filters(conditions, params, source=None, token=None):
+    conditions.append("source = ?")
+    params.append(ALL_SOURCES if source is None else source)
+    if token is not None:
+        conditions.append("token = ?")
+        params.append(token)
+    return " AND ".join(conditions), params
+
+
+# Count, summed value/USD and largest transfer of a token in [start, end), e.g. "total USDC.e volume this week"
+def token_volume(token, start, end, source=None):
+    span, params = span_condition(start, end)
+    where, params = filters([span], params, source, token)
+    count, value, value_usd, max_usd = get_connection().execute(
+        f"SELECT SUM(count), SUM(value), SUM(value_usd), MAX(max_usd) FROM token_rollups WHERE {where}", params
+    ).fetchone()
+    return {"count": count or 0, "value": value or 0.0, "value_usd": value_usd or 0.0, "max_usd": max_usd or 0.0}
+
+
+# Per-bucket series of a token's volume. Returns [(bucket, count, value, value_usd, max_usd)].
+def token_series(token, start, end, period="day", source=None):
+    start = to_datetime(start)
+    end = to_datetime(end)
+    length = PERIODS[period]
+    where, params = filters(
+        ["period = ?", "bucket >= ?", "bucket < ?"],
+        [period, start.strftime("%Y-%m-%d %H")[:length], end.strftime("%Y-%m-%d %H")[:length]], source, token,
+    )
+    return get_connection().execute(
+        f"SELECT bucket, SUM(count), SUM(value), SUM(value_usd), MAX(max_usd) FROM token_rollups WHERE {where}"
+        " GROUP BY bucket ORDER BY bucket",
+        params,
+    ).fetchall()
+
+
+# Largest senders (direction="out") or receivers ("in") in [start, end), e.g. "top 20 senders of XDC in the last 30 days".
+# Returns [(address, count, value, value_usd)] ordered by USD.
+def top_addresses(start, end, direction="out", token=None, limit=20, source=None):
+    span, params = span_condition(start, end)
+    where, params = filters([span, "direction = ?"], params + [direction], source, token)
+    return get_connection().execute(
+        f"SELECT address, SUM(count), SUM(value), SUM(value_usd) FROM address_rollups WHERE {where}"
+        " GROUP BY address ORDER BY SUM(value_usd) DESC LIMIT ?",
+        params + [limit],
+    ).fetchall()
+
+
+# Net flow into an address in [start, end), per token: {token: {"in_usd", "out_usd", "net_usd", "net_value"}}
+def net_flow(address, start, end, token=None, source=None):
+    span, params = span_condition(start, end)
+    where, params = filters([span, "address = ?"], params + [address.lower()], source, token)
+    flows = {}
+    for token_symbol, direction, value, value_usd in get_connection().execute(
+        f"SELECT token, direction, SUM(value), SUM(value_usd) FROM address_rollups WHERE {where} GROUP BY token, direction", params
+    ):
+        flow = flows.setdefault(token_symbol, {"in_usd": 0.0, "out_usd": 0.0, "net_usd": 0.0, "net_value": 0.0})
+        sign = 1 if direction == "in" else -1
+        flow[f"{direction}_usd"] += value_usd
+        flow["net_usd"] += sign * value_usd
+        flow["net_value"] += sign * value
+    return flows
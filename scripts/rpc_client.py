@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import itertools
+import logging
+import requests
+import metrics
+
+try:
+    import orjson  # Optional: parses large block and log responses several times faster than json
+except ImportError:
+    orjson = None
+
+# Constants
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", "100"))  # Requests per JSON-RPC batch (0 disables batching)
+RPC_TIMEOUT = 30  # Seconds to wait for a batch response
+JSON_HEADERS = {"Content-Type": "application/json"}
+RETRY_ATTEMPTS = 3  # Tries per single call on connection errors and 5xx (as web3's HTTPProvider does); 429s go back to the pool
+RETRY_BACKOFF = 0.3  # Seconds before the first retry, doubling after each
+
+# One pooled HTTP session per process so batches reuse keep-alive connections
+_session = requests.Session()
+_request_ids = itertools.count(1)
+
+
+class RPCError(Exception):
+    pass
+
+
+def dumps(payload):
+    return orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode()
+
+
+def loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+# Convert a JSON-RPC hex quantity ("0x1a") to int
+def hex_to_int(value):
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+# Return a 0x-prefixed hex string for HexBytes/bytes/str values
+def hex_str(value):
+    if isinstance(value, (bytes, bytearray)):
+        value = value.hex()
+    if not value.startswith("0x"):
+        value = "0x" + value
+    return value
+
+
+# Send (method, params) calls as JSON-RPC batches and map responses back by position.
+# Returns (results, errors): one entry per call, with errors[i] set when call i failed.
+def batch_request(rpc_url, calls, batch_size=RPC_BATCH_SIZE):
+    batch_size = max(batch_size, 1)
+    results = [None] * len(calls)
+    errors = [None] * len(calls)
+    for chunk_start in range(0, len(calls), batch_size):
+        chunk = calls[chunk_start:chunk_start + batch_size]
+        payload = []
+        positions = {}
+        for offset, (method, params) in enumerate(chunk):
+            request_id = next(_request_ids)
+            positions[request_id] = chunk_start + offset
+            payload.append({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+
+        start = time.perf_counter()
+        try:
+            response = _session.post(rpc_url, data=dumps(payload), headers=JSON_HEADERS, timeout=RPC_TIMEOUT)
+            response.raise_for_status()
+            body = loads(response.content)
+            if not isinstance(body, list):
+                # Some nodes answer a rejected batch with a single error object
+                raise RPCError(f"Batch rejected by {rpc_url}: {body.get('error', body) if isinstance(body, dict) else body}")
+        except Exception:
+            metrics.record_batch(rpc_url, chunk, time.perf_counter() - start, failed_calls=len(chunk))
+            raise
+
+        for item in body:
+            position = positions.pop(item.get("id"), None)
+            if position is None:
+                continue
+            if item.get("error") is not None:
+                errors[position] = item["error"]
+            else:
+                results[position] = item.get("result")
+        for position in positions.values():
+            errors[position] = {"message": "missing response in batch"}
+        failed_calls = sum(1 for error in errors[chunk_start:chunk_start + len(chunk)] if error is not None)
+        metrics.record_batch(rpc_url, chunk, time.perf_counter() - start, failed_calls)
+    logging.debug(f"Sent {len(calls)} RPC calls to {rpc_url} in batches of {batch_size}")
+    return results, errors
+
+
+# Normalize a raw eth_getBlockByNumber result into the fields the scanners read
+def format_block(raw_block):
+    return {
+        "number": hex_to_int(raw_block["number"]),
+        "timestamp": hex_to_int(raw_block["timestamp"]),
+        "logsBloom": raw_block.get("logsBloom"),
+        "transactions": [
+            {
+                "hash": tx["hash"],
+                "from": tx["from"],
+                "to": tx.get("to"),
+                "value": hex_to_int(tx.get("value")),
+            }
+            for tx in raw_block.get("transactions", [])
+            if isinstance(tx, dict)
+        ],
+    }
+
+
+# Normalize a raw eth_getLogs entry
+def format_log(raw_log):
+    return {
+        "address": raw_log["address"],
+        "topics": raw_log.get("topics", []),
+        "data": raw_log.get("data", "0x"),
+        "blockNumber": hex_to_int(raw_log["blockNumber"]),
+        "transactionHash": raw_log["transactionHash"],
+        "logIndex": hex_to_int(raw_log.get("logIndex")),
+    }
+
+
+def post_call(rpc_url, method, params):
+    start = time.perf_counter()
+    failed = True
+    try:
+        response = _session.post(
+            rpc_url, data=dumps({"jsonrpc": "2.0", "id": next(_request_ids), "method": method, "params": params}),
+            headers=JSON_HEADERS, timeout=RPC_TIMEOUT,
+        )
+        response.raise_for_status()
+        body = loads(response.content)
+        if not isinstance(body, dict):
+            raise RPCError(f"Unexpected {method} response from {rpc_url}: {body}")
+        if body.get("error") is not None:
+            error = body["error"]
+            raise RPCError(f"{method} failed on {rpc_url}: {error.get('message', error) if isinstance(error, dict) else error}")
+        failed = False
+        return body.get("result")
+    finally:
+        metrics.record_call(rpc_url, method, time.perf_counter() - start, failed)
+
+
+def is_transient(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and response is not None and response.status_code >= 500
+
+
+# Send a single JSON-RPC call over the pooled session and return its raw result.
+# HTTP errors propagate (so 429s keep their Retry-After); JSON-RPC errors raise RPCError with the node's message.
+def request(rpc_url, method, params):
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return post_call(rpc_url, method, params)
+        except Exception as e:
+            if attempt + 1 == RETRY_ATTEMPTS or not is_transient(e):
+                raise
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+# Raw counterpart of w3.eth.get_block: one block as format_block() output, or None if the node has no such block
+def get_block_raw(rpc_url, block_number, full_transactions=True):
+    result = request(rpc_url, "eth_getBlockByNumber", [hex(block_number), full_transactions])
+    return format_block(result) if result else None
+
+
+# Raw counterpart of w3.eth.get_logs. Logs keep the node's hex strings; nothing is checksummed or wrapped
+# in HexBytes, so that cost is only paid by the detectors for the few rows they keep.
+def get_logs_raw(rpc_url, filter_params):
+    params = dict(filter_params)
+    for key in ("fromBlock", "toBlock"):
+        if isinstance(params.get(key), int):
+            params[key] = hex(params[key])
+    return [format_log(raw_log) for raw_log in request(rpc_url, "eth_getLogs", [params]) or []]
@@ -0,0 +1,140 @@
+import time
+import logging
+import metrics
+
+# Constants
+LATENCY_ALPHA = 0.2  # Weight of the newest sample in the moving latency average
+ERROR_ALPHA = 0.2  # Weight of the newest outcome in the moving error rate
+FAILURES_BEFORE_COOLDOWN = 3  # Consecutive failures that open an endpoint's circuit breaker
+COOLDOWN_BASE = 15  # Seconds an endpoint sits out after its breaker opens
+COOLDOWN_MAX = 300  # Upper bound for the doubling cooldown
+RATE_LIMIT_COOLDOWN = 5  # Seconds an endpoint sits out after a 429 without Retry-After
+MIN_RATE = 0.2  # Slowest per-endpoint request rate AIMD will back off to (requests/second)
+RATE_INCREASE = 0.1  # Additive rate increase after each success
+RATE_LIMIT_MARKERS = ("429", "too many requests", "rate limit", "exceeded the limit")
+
+
+# Check whether an exception looks like a rate-limit response
+def is_rate_limit_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+# Read a Retry-After header from an HTTP error, if there is one
+def get_retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+# Health and pacing state for one RPC endpoint
+class Endpoint:
+    def __init__(self, url, w3, max_rate):
+        self.url = url
+        self.w3 = w3
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.cooldowns = 0
+        self.cooldown_until = 0.0
+        self.next_request_at = 0.0
+
+    # Lower is better: expected latency inflated by the recent error rate
+    def score(self):
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + 4 * self.error_rate) + self.error_rate
+
+    def available(self, now):
+        return now >= self.cooldown_until
+
+
+# Routes each call to the healthiest endpoint, with circuit-breaker cooldowns and AIMD pacing
+class EndpointPool:
+    def __init__(self, endpoints, log=logging.warning):
+        self.endpoints = endpoints
+        self.log = log
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    # Endpoints ordered best first; cooling endpoints go last, soonest-available first.
+    # Time until an endpoint's pacing allows the next request counts against it, so load spreads out.
+    def ranked(self):
+        now = time.monotonic()
+        available = sorted(
+            (e for e in self.endpoints if e.available(now)),
+            key=lambda e: e.score() + max(e.next_request_at - now, 0)
+        )
+        cooling = sorted((e for e in self.endpoints if not e.available(now)), key=lambda e: e.cooldown_until)
+        return available + cooling
+
+    def best(self):
+        return self.ranked()[0]
+
+    # Wait until the endpoint's cooldown and pacing interval allow another request
+    def wait_for(self, endpoint):
+        now = time.monotonic()
+        ready_at = max(endpoint.cooldown_until, endpoint.next_request_at)
+        if ready_at > now:
+            metrics.inc("rpc_pool_wait_seconds_total", ready_at - now, endpoint=endpoint.url)
+            time.sleep(ready_at - now)
+        endpoint.next_request_at = time.monotonic() + 1 / endpoint.rate
+
+    def record_success(self, endpoint, elapsed):
+        if endpoint.latency is None:
+            endpoint.latency = elapsed
+        else:
+            endpoint.latency = LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * endpoint.latency
+        endpoint.error_rate *= 1 - ERROR_ALPHA
+        endpoint.consecutive_failures = 0
+        endpoint.cooldowns = 0
+        endpoint.rate = min(endpoint.rate + RATE_INCREASE, endpoint.max_rate)
+
+    def record_failure(self, endpoint, error):
+        now = time.monotonic()
+        endpoint.error_rate = ERROR_ALPHA + (1 - ERROR_ALPHA) * endpoint.error_rate
+        endpoint.consecutive_failures += 1
+        if is_rate_limit_error(error):
+            # Multiplicative decrease, and honour Retry-After when the node sends one
+            endpoint.rate = max(endpoint.rate / 2, MIN_RATE)
+            endpoint.cooldown_until = now + (get_retry_after(error) or RATE_LIMIT_COOLDOWN)
+            self.log(f"RPC {endpoint.url} rate limited, slowing to {endpoint.rate:.2f} req/s")
+        elif endpoint.consecutive_failures >= FAILURES_BEFORE_COOLDOWN:
+            cooldown = min(COOLDOWN_BASE * 2 ** endpoint.cooldowns, COOLDOWN_MAX)
+            endpoint.cooldowns += 1
+            endpoint.consecutive_failures = 0
+            endpoint.cooldown_until = now + cooldown
+            self.log(f"RPC {endpoint.url} failing, cooling down for {cooldown}s")
+
+    # Call func(w3, *args) on the best endpoint, moving to the next best on failure.
+    # Returns None after `attempts` failed calls.
+    def call(self, func, *args, attempts=None):
+        attempts = attempts or 3 * len(self.endpoints)
+        for attempt in range(attempts):
+            endpoint = self.best()
+            self.wait_for(endpoint)
+            start = time.monotonic()
+            try:
+                result = func(endpoint.w3, *args)
+            except Exception as e:
+                self.record_failure(endpoint, e)
+                self.log(f"RPC attempt {attempt+1}/{attempts} via {endpoint.url} failed: {str(e)}")
+                continue
+            self.record_success(endpoint, time.monotonic() - start)
+            return result
+        self.log(f"Failed to execute {getattr(func, '__name__', 'call')} after {attempts} attempts")
+        return None
+
+    # One-line health summary per endpoint, for the end-of-run log
+    def summary(self):
+        return "; ".join(
+            f"{e.url}: latency={e.latency or 0:.3f}s errors={e.error_rate:.2f} rate={e.rate:.2f}/s"
+            for e in self.endpoints
+        )
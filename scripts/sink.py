@@ -0,0 +1,144 @@
+import os
+import csv
+import glob
+import logging
+from datetime import datetime
+
+# Constants
+SINK_CHUNK_ROWS = int(os.getenv("SINK_CHUNK_ROWS", "1000"))  # Rows buffered before a chunk is flushed
+SINK_MAX_FILE_BYTES = int(os.getenv("SINK_MAX_FILE_BYTES", str(64 * 1024 * 1024)))  # Export files rotate at this size
+SINK_MAX_FILE_BLOCKS = int(os.getenv("SINK_MAX_FILE_BLOCKS", "43200"))  # ...or after this many blocks (~1 day of XDC blocks)
+
+
+# Publish export files a crashed run left behind. Each holds whole flushed chunks except perhaps a torn
+# last line, which is cut off. Files of a process that is still running are left alone.
+def recover_partials(directory, prefix, log=logging.info):
+    for temp_path in glob.glob(os.path.join(directory, f"{prefix}_*.csv.*.tmp")):
+        try:
+            pid = int(temp_path.rsplit(".", 2)[1])
+            os.kill(pid, 0)
+            continue
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+        with open(temp_path, "rb+") as f:
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+        final_path = temp_path.rsplit(".", 2)[0]
+        os.replace(temp_path, final_path)
+        log(f"Recovered export {final_path} from an interrupted run")
+
+
+# Streams detections of a long scan to CSV exports (and any other store via on_flush) in chunks,
+# so memory holds at most one chunk however wide the scanned range is.
+# write(rows, to_block) is called once per scanned batch, in block order. A chunk is flushed once it
+# holds chunk_rows rows or the current export file spans max_file_blocks blocks: its exported rows are
+# appended to a temporary file, then on_flush(rows, from_block, to_block) gets the whole chunk and the
+# contiguous block range it covers. Export files are renamed into place ({prefix}_{timestamp}.csv) when
+# they reach max_file_bytes or max_file_blocks, and at close(); readers never see a partial file.
+# export(row) picks the rows that go to the CSV (default: all); directory=None writes no export at all.
+class StreamingSink:
+    def __init__(self, directory, prefix, fieldnames, from_block, on_flush=None, export=None,
+                 chunk_rows=SINK_CHUNK_ROWS, max_file_bytes=SINK_MAX_FILE_BYTES, max_file_blocks=SINK_MAX_FILE_BLOCKS, log=logging.info):
+        self.directory = directory
+        self.prefix = prefix
+        self.fieldnames = fieldnames
+        self.on_flush = on_flush
+        self.export = export
+        self.chunk_rows = chunk_rows
+        self.max_file_bytes = max_file_bytes
+        self.max_file_blocks = max_file_blocks
+        self.log = log
+        self.chunk_from = from_block  # First block of the unflushed chunk
+        self.to_block = from_block - 1  # Last block written
+        self.buffer = []
+        self.file = None
+        self.writer = None
+        self.file_from = None
+        self.file_rows = 0
+        self.temp_path = None
+        self.final_path = None
+        self.files = []  # Export files published so far
+        self.rows = 0
+        self.exported = 0
+        self.chunks = 0
+        self.peak_buffer = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            recover_partials(directory, prefix, log)
+
+    def write(self, rows, to_block):
+        self.buffer.extend(rows)
+        self.rows += len(rows)
+        self.to_block = to_block
+        self.peak_buffer = max(self.peak_buffer, len(self.buffer))
+        file_from = self.file_from if self.file is not None else self.chunk_from
+        if len(self.buffer) >= self.chunk_rows or to_block - file_from + 1 >= self.max_file_blocks:
+            self.flush()
+
+    def open_file(self):
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        final_path = os.path.join(self.directory, f"{self.prefix}_{timestamp}.csv")
+        part = 1
+        while os.path.exists(final_path) or final_path in self.files:
+            part += 1
+            final_path = os.path.join(self.directory, f"{self.prefix}_{timestamp}_{part}.csv")
+        self.final_path = final_path
+        self.temp_path = f"{final_path}.{os.getpid()}.tmp"
+        self.file = open(self.temp_path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction="ignore")
+        self.writer.writeheader()
+        self.file_from = self.chunk_from
+        self.file_rows = 0
+
+    def finish_file(self):
+        self.file.close()
+        os.replace(self.temp_path, self.final_path)
+        self.files.append(self.final_path)
+        self.log(f"Saved {self.file_rows} rows for blocks {self.file_from} to {self.to_block} to {self.final_path}")
+        self.file = self.writer = None
+
+    # Write out the buffered chunk, then rotate the export file if it is full
+    def flush(self):
+        rows = self.buffer
+        exported = [] if self.directory is None else [row for row in rows if self.export is None or self.export(row)]
+        if exported:
+            if self.file is None:
+                self.open_file()
+            self.writer.writerows(exported)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file_rows += len(exported)
+            self.exported += len(exported)
+        if self.on_flush is not None and self.to_block >= self.chunk_from:
+            self.on_flush(rows, self.chunk_from, self.to_block)
+        self.chunks += 1
+        self.buffer = []
+        self.chunk_from = self.to_block + 1
+        if self.file is not None and (
+            self.file.tell() >= self.max_file_bytes or self.to_block - self.file_from + 1 >= self.max_file_blocks
+        ):
+            self.finish_file()
+
+    # Leave the blocks up to to_block out of every chunk, e.g. a range that failed and will be scanned again
+    def skip(self, to_block):
+        if self.buffer or self.to_block >= self.chunk_from:
+            self.flush()
+        self.to_block = to_block
+        self.chunk_from = to_block + 1
+
+    # Flush what is left and publish the open export file. Returns the export files written.
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.finish_file()
+        return self.files
+
+    def summary(self):
+        return (
+            f"Streamed {self.rows} rows in {self.chunks} chunk(s) (at most {self.peak_buffer} buffered), "
+            f"{self.exported} exported to {len(self.files)} file(s)"
+        )
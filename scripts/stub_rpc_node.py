@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Constants
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+STUB_TOKEN = "0x" + "aa" * 20  # Synthetic ERC-20 token (symbol "USDC", 6 decimals)
+REVERTING_CONTRACT = "0x" + "bb" * 20  # Every eth_call to it reverts (an aggregate3 entry fails instead)
+USDC_E_ADDRESS = "0x2A8E898b6242355c290E1f4Fc966b8788729A4D4"  # Logs echo the queried contract; blooms cover this one and STUB_TOKEN
+EMPTY_BLOOM = "0x" + "00" * 256
+GENESIS_TIMESTAMP = 1700000000
+ZERO_HASH = "0x" + "00" * 32
+
+# ABI selectors the scanners call
+SYMBOL_SELECTOR = "0x95d89b41"
+DECIMALS_SELECTOR = "0x313ce567"
+BALANCE_OF_SELECTOR = "0x70a08231"
+AGGREGATE3_SELECTOR = "0x82ad56cb"  # Multicall3, answered at any address unless multicall=False
+
+STUB_PRICES = {"XDC": 0.05, "USDC": 1.0, "USDC.e": 1.0}  # USD quotes served on the CMC quotes route
+STUB_COIN_IDS = {"XDC": 2634, "USDC": 3408, "USDC.e": 100000}  # CMC ids the quotes are listed under
+STUB_INTERVALS = {"5m": 300, "15m": 900, "1h": 3600, "hourly": 3600}  # Historical quote intervals, in seconds
+RECORD_LOG_WINDOW = 50  # Blocks per eth_getLogs call when recording a fixture
+
+
+def to_int(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+
+def pad_address(address):
+    return "0x" + "00" * 12 + address[2:]
+
+
+# logsBloom of a synthetic Transfer block, so bloom pre-filtering sees the same blocks get_logs returns
+def log_bloom():
+    from bloom import bloom_mask
+
+    bloom = 0
+    for value in (TRANSFER_TOPIC, pad_address("0x" + "33" * 20), pad_address("0x" + "44" * 20), STUB_TOKEN, USDC_E_ADDRESS):
+        bloom |= bloom_mask(value)
+    return f"0x{bloom:0512x}"
+
+
+class Reverted(Exception):
+    pass
+
+
+def encode_string(text):
+    data = text.encode()
+    return "0x" + f"{32:064x}" + f"{len(data):064x}" + data.hex().ljust(64, "0")
+
+
+# Synthetic chain: every 10th block carries a 1M XDC transfer and every log_every-th block a 10,000 token Transfer log.
+# The head advances by one block every block_time seconds (block_time=0 keeps it fixed).
+# A fixture (see record_fixture) replays recorded blocks, logs and eth_call results instead.
+# Faults: every HTTP request waits latency seconds, then is answered with a 429 (rate_limit_ratio)
+# or a 503 (failure_ratio) at the given probabilities.
+class StubChain:
+    def __init__(self, head=1000, block_time=0, fixture=None, latency=0, rate_limit_ratio=0, failure_ratio=0, retry_after=1, seed=0, log_every=7, multicall=True):
+        self.fixture = fixture
+        self.log_every = log_every
+        self.multicall = multicall
+        self.log_bloom = None
+        self.start_head = fixture["head"] if fixture else head
+        self.block_time = 0 if fixture else block_time
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.failure_ratio = failure_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.started = time.time()
+        self.calls = {}
+        self.http = {"requests": 0, "rate_limited": 0, "failed": 0}
+        self.filters = {}
+        self.lock = threading.Lock()
+
+    def head(self):
+        if not self.block_time:
+            return self.start_head
+        return self.start_head + int((time.time() - self.started) / self.block_time)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = {}
+            self.http = {"requests": 0, "rate_limited": 0, "failed": 0}
+
+    # Decide how to answer one HTTP request: None to serve it, or an error status code
+    def inject_fault(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.http["requests"] += 1
+            roll = self.random.random()
+            if roll < self.rate_limit_ratio:
+                self.http["rate_limited"] += 1
+                return 429
+            if roll < self.rate_limit_ratio + self.failure_ratio:
+                self.http["failed"] += 1
+                return 503
+        return None
+
+    def block(self, number, full_transactions):
+        if self.fixture:
+            block = self.fixture["blocks"].get(str(number))
+            if block is None or full_transactions:
+                return block
+            return dict(block, transactions=[tx["hash"] if isinstance(tx, dict) else tx for tx in block["transactions"]])
+        transactions = []
+        if number % 10 == 0:
+            transactions.append({
+                "hash": f"0x{number:064x}", "from": "0x" + "11" * 20, "to": "0x" + "22" * 20,
+                "value": hex(10 ** 24), "blockNumber": hex(number), "blockHash": f"0x{number + 7:064x}",
+                "gas": "0x5208", "gasPrice": "0x1", "input": "0x", "nonce": "0x0", "transactionIndex": "0x0",
+                "v": "0x1", "r": "0x1", "s": "0x1", "type": "0x0",
+            })
+        if number % self.log_every == 0 and self.log_bloom is None:
+            self.log_bloom = log_bloom()
+        return {
+            "number": hex(number), "hash": f"0x{number + 7:064x}", "parentHash": f"0x{number + 6:064x}",
+            "timestamp": hex(GENESIS_TIMESTAMP + 2 * number),
+            "logsBloom": self.log_bloom if number % self.log_every == 0 else EMPTY_BLOOM,
+            "extraData": "0x" + "00" * 97, "miner": "0x" + "00" * 20, "gasLimit": "0x1", "gasUsed": "0x0",
+            "difficulty": "0x1", "totalDifficulty": "0x1", "nonce": "0x0000000000000000", "sha3Uncles": ZERO_HASH,
+            "size": "0x1", "stateRoot": ZERO_HASH, "transactionsRoot": ZERO_HASH, "receiptsRoot": ZERO_HASH,
+            "mixHash": ZERO_HASH, "uncles": [],
+            "transactions": transactions if full_transactions else [tx["hash"] for tx in transactions],
+        }
+
+    def logs(self, from_block, to_block, address=None, topics=None):
+        if self.fixture:
+            addresses = {address.lower()} if isinstance(address, str) else {a.lower() for a in address} if address else None
+            topic0 = (topics or [None])[0]
+            topic0 = {topic0} if isinstance(topic0, str) else set(topic0) if topic0 else None
+            return [
+                log for log in self.fixture["logs"]
+                if from_block <= int(log["blockNumber"], 16) <= to_block
+                and (addresses is None or log["address"].lower() in addresses)
+                and (topic0 is None or (log["topics"] and log["topics"][0] in topic0))
+            ]
+        logs = []
+        for number in range(from_block, min(to_block, self.head()) + 1):
+            if number % self.log_every == 0:
+                logs.append({
+                    # Logs rotate through the queried contracts, so a multi-address query sees all of them
+                    "address": address if isinstance(address, str) else address[number // self.log_every % len(address)] if address else STUB_TOKEN,
+                    "topics": [TRANSFER_TOPIC, pad_address("0x" + "33" * 20), pad_address("0x" + "44" * 20)],
+                    "data": f"0x{10000 * 10 ** 6:064x}", "blockNumber": hex(number),
+                    "transactionHash": f"0x{number + 100000:064x}", "logIndex": "0x0",
+                    "blockHash": f"0x{number + 7:064x}", "transactionIndex": "0x0", "removed": False,
+                })
+        return logs
+
+    def call(self, params):
+        data = params[0].get("data") or params[0].get("input")
+        if params[0].get("to", "").lower() == REVERTING_CONTRACT:
+            raise Reverted()
+        if data.startswith(AGGREGATE3_SELECTOR):
+            return self.aggregate3(data, params[1:]) if self.multicall else "0x"
+        if self.fixture:
+            recorded = self.fixture["calls"].get(f"{params[0].get('to', '').lower()}:{data}")
+            if recorded is not None:
+                return recorded
+        if data.startswith(SYMBOL_SELECTOR):
+            return encode_string("USDC")
+        if data.startswith(DECIMALS_SELECTOR):
+            return f"0x{6:064x}"
+        if data.startswith(BALANCE_OF_SELECTOR):
+            return f"0x{10 ** 12:064x}"
+        return "0x"
+
+    # Multicall3 aggregate3: answer each inner call as its own eth_call would be answered
+    def aggregate3(self, data, block):
+        from eth_abi import decode, encode
+
+        (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[10:]))
+        results = []
+        for target, _, call_data in calls:
+            try:
+                result = self.call([{"to": target, "data": "0x" + call_data.hex()}] + list(block))
+            except Reverted:
+                results.append((False, b""))
+                continue
+            results.append((True, bytes.fromhex(result[2:])))
+        return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+
+    def get_filter_logs(self, filter_params):
+        return self.logs(
+            to_int(filter_params["fromBlock"]), to_int(filter_params["toBlock"]), filter_params.get("address"), filter_params.get("topics")
+        )
+
+    # Answer one JSON-RPC request object
+    def handle(self, request):
+        method, params = request["method"], request.get("params", [])
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "eth_blockNumber":
+            result = hex(self.head())
+        elif method == "eth_chainId":
+            result = "0x32"
+        elif method in ("net_version", "web3_clientVersion"):
+            result = "50" if method == "net_version" else "stub-rpc-node/1.0"
+        elif method == "eth_getBlockByNumber":
+            number = self.head() if params[0] == "latest" else to_int(params[0])
+            result = self.block(number, params[1]) if number <= self.head() else None
+        elif method == "eth_getLogs":
+            result = self.get_filter_logs(params[0])
+        elif method == "eth_newFilter":
+            with self.lock:
+                filter_id = hex(len(self.filters) + 1)
+                self.filters[filter_id] = params[0]
+            result = filter_id
+        elif method == "eth_getFilterLogs":
+            result = self.get_filter_logs(self.filters[params[0]])
+        elif method == "eth_call":
+            try:
+                result = self.call(params)
+            except Reverted:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": 3, "message": "execution reverted"}}
+        else:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"Method {method} not supported"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+
+def make_handler(chain):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            status = chain.inject_fault()
+            if status == 429:
+                self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": str(chain.retry_after)})
+                return
+            if status is not None:
+                self.send_json(status, {"error": "Service Unavailable"})
+                return
+            response = [chain.handle(item) for item in body] if isinstance(body, list) else chain.handle(body)
+            self.send_json(200, response)
+
+        # CoinMarketCap-style quotes, so price_service can point CMC_API_URL here (and price_history CMC_HISTORY_URL).
+        # Historical quotes are flat series at the same prices.
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            symbols = query.get("symbol", [""])[0].split(",")
+            if url.path.endswith("/quotes/latest"):
+                data = {
+                    symbol: [{"id": STUB_COIN_IDS[symbol], "symbol": symbol, "quote": {"USD": {"price": STUB_PRICES[symbol]}}}]
+                    for symbol in symbols if symbol in STUB_PRICES
+                }
+            elif url.path.endswith("/quotes/historical"):
+                start, end = int(query["time_start"][0]), int(query["time_end"][0])
+                step = STUB_INTERVALS.get(query.get("interval", ["1h"])[0], 3600)
+                times = range(-(-start // step) * step, end + 1, step)
+                data = {
+                    symbol: [{"id": STUB_COIN_IDS[symbol], "symbol": symbol, "quotes": [
+                        {"timestamp": datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                         "quote": {"USD": {"price": STUB_PRICES[symbol]}}}
+                        for timestamp in times
+                    ]}]
+                    for symbol in symbols if symbol in STUB_PRICES
+                }
+            else:
+                self.send_json(404, {"error": "Not Found"})
+                return
+            self.send_json(200, {"data": data})
+
+        def send_json(self, status, response, headers=None):
+            data = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+# Start a stub node in a background thread. Returns (server, chain); call server.shutdown() to stop.
+# Keyword arguments are passed to StubChain (fixture, latency, rate_limit_ratio, failure_ratio, ...).
+def serve(port=0, head=1000, block_time=0, **options):
+    chain = StubChain(head, block_time, **options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(chain))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, chain
+
+
+def load_fixture(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# Record blocks, Transfer logs and token symbol()/decimals() results from a real node into a fixture file
+def record_fixture(rpc_url, from_block, to_block, path):
+    from rpc_client import batch_request
+
+    block_numbers = list(range(from_block, to_block + 1))
+    results, errors = batch_request(rpc_url, [("eth_getBlockByNumber", [hex(number), True]) for number in block_numbers])
+    blocks = {str(number): block for number, block, error in zip(block_numbers, results, errors) if block and not error}
+
+    windows = [(start, min(start + RECORD_LOG_WINDOW - 1, to_block)) for start in range(from_block, to_block + 1, RECORD_LOG_WINDOW)]
+    results, errors = batch_request(
+        rpc_url, [("eth_getLogs", [{"fromBlock": hex(start), "toBlock": hex(end), "topics": [TRANSFER_TOPIC]}]) for start, end in windows]
+    )
+    logs = [log for result in results if result for log in result]
+
+    tokens = sorted({log["address"].lower() for log in logs})
+    call_keys = [(token, selector) for token in tokens for selector in (SYMBOL_SELECTOR, DECIMALS_SELECTOR)]
+    results, errors = batch_request(rpc_url, [("eth_call", [{"to": token, "data": selector}, "latest"]) for token, selector in call_keys])
+    calls = {f"{token}:{selector}": result for (token, selector), result, error in zip(call_keys, results, errors) if result and not error}
+
+    with open(path, "w") as f:
+        json.dump({"head": to_block, "blocks": blocks, "logs": logs, "calls": calls}, f)
+    print(f"Recorded {len(blocks)} blocks, {len(logs)} logs and {len(calls)} calls to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub XDC JSON-RPC node with a synthetic or recorded chain")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--head", type=int, default=1000)
+    parser.add_argument("--block-time", type=float, default=2)
+    parser.add_argument("--fixture", help="Replay a fixture written by --record")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to every request")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0, help="Share of requests answered with 429")
+    parser.add_argument("--failure-ratio", type=float, default=0, help="Share of requests answered with 503")
+    parser.add_argument("--log-every", type=int, default=7, help="Synthetic Transfer log every N blocks (large N = quiet chain)")
+    parser.add_argument("--no-multicall", action="store_true", help="Answer aggregate3 calls as if no multicall contract were deployed")
+    parser.add_argument("--record", metavar="RPC_URL", help="Record --from-block..--to-block from RPC_URL into --fixture and exit")
+    parser.add_argument("--from-block", type=int)
+    parser.add_argument("--to-block", type=int)
+    args = parser.parse_args()
+    if args.record:
+        if not (args.fixture and args.from_block is not None and args.to_block is not None):
+            parser.error("--record needs --fixture, --from-block and --to-block")
+        record_fixture(args.record, args.from_block, args.to_block, args.fixture)
+        raise SystemExit(0)
+    server, chain = serve(
+        args.port, args.head, args.block_time,
+        fixture=load_fixture(args.fixture) if args.fixture else None,
+        latency=args.latency, rate_limit_ratio=args.rate_limit_ratio, failure_ratio=args.failure_ratio, log_every=args.log_every,
+        multicall=not args.no_multicall,
+    )
+    print(f"Stub RPC node listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
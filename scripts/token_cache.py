@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+import sqlite3
+import metrics
+
+# Constants
+TOKEN_CACHE_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "token_metadata.db")
+SQLITE_TIMEOUT = 60  # Seconds to wait for another process (e.g. a backfill shard) holding the write lock
+NEGATIVE_CACHE_TTL = 24 * 60 * 60  # Retry non-ERC-20/reverting contracts after a day
+POSITIVE_CACHE_TTL = 30 * 24 * 60 * 60  # Refresh symbol/decimals monthly
+
+# Sentinel stored for contracts that do not answer symbol()/decimals()
+NOT_ERC20 = "not_erc20"
+
+_connection = None
+_memory = {}  # address -> (symbol, decimals) or NOT_ERC20, for lookups within a run
+stats = {"hits": 0, "misses": 0, "negative_hits": 0}
+metrics.register_stats("token_metadata", stats)
+
+
+# Open the SQLite store and create the table on first use.
+# Every backfill shard resolves tokens through this file, so it runs in WAL mode (lookups are not
+# blocked by another shard's store) with a long busy timeout.
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_FILE), exist_ok=True)
+        _connection = sqlite3.connect(TOKEN_CACHE_FILE, timeout=SQLITE_TIMEOUT)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS token_metadata ("
+            "address TEXT PRIMARY KEY, symbol TEXT, decimals INTEGER, is_erc20 INTEGER, checked_at REAL)"
+        )
+    return _connection
+
+
+# Look up cached metadata for a token address.
+# Returns (symbol, decimals), NOT_ERC20, or None when the token must be resolved on-chain.
+def lookup(address):
+    address = address.lower()
+    if address in _memory:
+        entry = _memory[address]
+        stats["negative_hits" if entry == NOT_ERC20 else "hits"] += 1
+        return entry
+
+    row = get_connection().execute(
+        "SELECT symbol, decimals, is_erc20, checked_at FROM token_metadata WHERE address = ?", (address,)
+    ).fetchone()
+    if row is not None:
+        symbol, decimals, is_erc20, checked_at = row
+        ttl = POSITIVE_CACHE_TTL if is_erc20 else NEGATIVE_CACHE_TTL
+        if time.time() - checked_at < ttl:
+            entry = (symbol, decimals) if is_erc20 else NOT_ERC20
+            _memory[address] = entry
+            stats["negative_hits" if entry == NOT_ERC20 else "hits"] += 1
+            return entry
+
+    stats["misses"] += 1
+    return None
+
+
+# Store resolved metadata for a token
+def store(address, symbol, decimals):
+    address = address.lower()
+    _memory[address] = (symbol, decimals)
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR REPLACE INTO token_metadata VALUES (?, ?, ?, 1, ?)", (address, symbol, decimals, time.time())
+    )
+    connection.commit()
+
+
+# Remember that a contract is not a usable ERC-20 token
+def store_failure(address):
+    address = address.lower()
+    _memory[address] = NOT_ERC20
+    connection = get_connection()
+    connection.execute(
+        "INSERT OR REPLACE INTO token_metadata VALUES (?, NULL, NULL, 0, ?)", (address, time.time())
+    )
+    connection.commit()
+
+
+# Log cache hit/miss counters
+def log_stats():
+    lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+    hit_rate = (stats["hits"] + stats["negative_hits"]) / lookups * 100 if lookups else 0
+    logging.info(
+        f"Token metadata cache: {stats['hits']} hits, {stats['negative_hits']} negative hits, "
+        f"{stats['misses']} misses ({hit_rate:.1f}% hit rate)"
+    )
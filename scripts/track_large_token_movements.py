@@ -1,128 +1,141 @@
 import os
+import sys
+import json
 import time
 import logging
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
-import requests
-from datetime import datetime, timedelta
-import csv
-from ratelimit import limits, sleep_and_retry
+from collections import defaultdict
+from ratelimit import limits
 from dotenv import load_dotenv
+import metrics
+import token_cache
+import block_times
+import detectors
+import bloom
+import labels
+import multicall
+import sink
+import checkpoint
+import transfer_store
+import price_service
+import price_history
+from metrics import sleep_and_retry
+from rpc_pool import Endpoint, EndpointPool, is_rate_limit_error
+from rpc_client import RPC_BATCH_SIZE, batch_request, format_block, get_block_raw, get_logs_raw
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.expanduser("~"), "xdc-intel", ".env"))
 
-# Configure logging to ~/xdc-intel/large_transfers.log
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(levelname)s] %(asctime)s %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(os.path.expanduser("~"), "xdc-intel", "large_transfers.log")),
-        logging.StreamHandler()
-    ]
-)
-
 # Constants
-CMC_API_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
 CMC_API_KEY = os.getenv("CMC_API_KEY")
 XDC_RPC_URLS = os.getenv("XDC_RPC_URLS", "https://rpc.ankr.com/xdc,https://rpc.xinfin.network,https://rpc.xdcrpc.com").split(",")
 MIN_USD_VALUE = 5000  # Match post_to_x.py threshold
 RPC_RATE_LIMIT = 3  # Lowered to be safer
-CMC_RATE_LIMIT = 30
-TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
 LAST_BLOCK_FILE = os.path.join(os.path.expanduser("~"), "xdc-intel", "last_block.txt")
 BLOCKS_PER_HOUR = 1800  # XDC block time is ~2 seconds, so ~1800 blocks per hour
 BATCH_SIZE = 50  # Process 50 blocks at a time to avoid RPC overload
-PRICE_CACHE_DURATION = timedelta(minutes=10)  # Cache XDC price for 10 minutes
-
-# ERC-20 ABI for symbol and decimals
-ERC20_ABI = [
-    {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
-    {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "type": "function"}
-]
+MAX_LOG_WINDOW = BATCH_SIZE  # Largest block range for one Transfer get_logs query
+LOG_WINDOW_GROW_RESULTS = 1000  # Grow the log window again after queries returning fewer logs than this
+CHECKPOINT_NAME = "large_transfers"
+BACKLOG_TIME_BUDGET = int(os.getenv("BACKLOG_TIME_BUDGET", "600"))  # Seconds per run spent draining skipped ranges
+BACKLOG_CHUNK_SIZE = BLOCKS_PER_HOUR  # Backlog blocks scanned between progress saves
+ASYNC_SCAN = os.getenv("ASYNC_SCAN", "0") == "1"  # Spread block/log fetches across all RPCs concurrently
+BLOOM_FILTER = os.getenv("BLOOM_FILTER", "1") == "1"  # Query logs only for blocks whose header logsBloom may match
+RAW_RPC = os.getenv("RAW_RPC", "0") == "1"  # Fetch logs and fallback blocks as raw JSON, skipping web3's result formatters
+LOG_RANGE_ERROR_MARKERS = (  # get_logs errors where the node refused the block range or result size
+    "block range", "query returned more than", "too many results", "response size exceeded", "limit exceeded",
+)
+TIMEOUT_MARKERS = ("timeout", "timed out")
+XDC_WS_URL = os.getenv("XDC_WS_URL")  # Optional websocket RPC for newHeads in follow mode
+CONFIRMATIONS = int(os.getenv("CONFIRMATIONS", "3"))  # Follow mode stays this many blocks behind the head
+FOLLOW_POLL_INTERVAL = float(os.getenv("FOLLOW_POLL_INTERVAL", "2"))  # Seconds between eth_blockNumber polls (~1 XDC block)
+FOLLOW_FILE_BLOCKS = int(os.getenv("FOLLOW_FILE_BLOCKS", str(BLOCKS_PER_HOUR)))  # Follow mode publishes one CSV export per ~hour of blocks
+FOLLOW_BACKLOG_BUDGET = float(os.getenv("FOLLOW_BACKLOG_BUDGET", "10"))  # Seconds per poll follow mode spends on the backlog once caught up
+FOLLOW_BACKLOG_CHUNK_SIZE = BATCH_SIZE * 4  # Backlog blocks per chunk in follow mode, so the head is never left waiting long
+DETECTOR_NAMES = os.getenv("DETECTORS", detectors.DEFAULT_DETECTORS).split(",")  # Detectors fed by each scanned batch
+CSV_FIELDS = ['tx_hash', 'from', 'to', 'value_xdc', 'value_usd', 'token_symbol', 'block_number', 'timestamp', 'from_label', 'to_label']
+BRIDGE_CSV_FIELDS = ['tx_hash', 'from', 'to', 'value_usdc', 'block_number', 'timestamp', 'value_usd', 'token_symbol', 'from_label', 'to_label']  # As track_usdc_bridge_transfers.py exports them
+OUTPUT_DIR = os.path.join(os.path.expanduser("~"), "xdc-intel-reports", "data")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Follow mode serves Prometheus metrics here (0 writes METRICS_FILE instead)
+
+# Registered detectors and the single block/log query plan that feeds them all
+active_detectors = detectors.load_detectors(DETECTOR_NAMES, MIN_USD_VALUE)
+query_plan = detectors.build_query_plan(active_detectors)
+DETECTION_SOURCES = sorted({detector.source for detector in active_detectors})
+bloom_masks = bloom.plan_masks(query_plan) if BLOOM_FILTER and query_plan["topics"] else None
+
+# Current log query window, adapted as nodes accept or reject ranges
+log_window = MAX_LOG_WINDOW
+
+# Configure logging to ~/xdc-intel/large_transfers.log (called by the entry points, not on import)
+def setup_logging():
+    log_dir = os.path.join(os.path.expanduser("~"), "xdc-intel")
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] %(asctime)s %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(log_dir, "large_transfers.log")),
+            logging.StreamHandler()
+        ]
+    )
 
 # Validate API keys
-if not CMC_API_KEY:
-    logging.error("CMC_API_KEY not found in .env")
-    exit(1)
-if not XDC_RPC_URLS:
-    logging.error("XDC_RPC_URLS not found in .env")
-    exit(1)
-
-# Initialize Web3 with failover
+def check_config():
+    if not CMC_API_KEY:
+        logging.error("CMC_API_KEY not found in .env")
+        return False
+    if not [rpc_url for rpc_url in XDC_RPC_URLS if rpc_url.strip()]:
+        logging.error("XDC_RPC_URLS not found in .env")
+        return False
+    return True
+
+# Initialize Web3 endpoints behind a health-aware pool.
+# Endpoints are not probed up front: a dead RPC fails its first real call and the pool cools it down.
 def init_web3():
-    web3_instances = []
-    for rpc_url in XDC_RPC_URLS:
-        try:
-            w3 = Web3(Web3.HTTPProvider(rpc_url.strip()))
-            w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-            if w3.is_connected():
-                logging.info(f"Connected to RPC: {rpc_url}")
-                web3_instances.append(w3)
-            else:
-                logging.warning(f"Failed to connect to RPC: {rpc_url}")
-        except Exception as e:
-            logging.warning(f"Error connecting to RPC {rpc_url}: {str(e)}")
-    if not web3_instances:
-        logging.error("All RPCs failed")
-        exit(1)
-    return web3_instances
+    from web3 import Web3
+    from web3.middleware import geth_poa_middleware
 
-# Execute a function with RPC failover
-def with_rpc_failover(web3_instances, func, *args, retries=3, delay=2):
-    for attempt in range(retries):
-        for w3 in web3_instances:
-            try:
-                return func(w3, *args)
-            except Exception as e:
-                logging.warning(f"RPC attempt {attempt+1}/{retries} failed: {str(e)}")
-                time.sleep(delay)
-        time.sleep(delay)
-    logging.error(f"Failed to execute {func.__name__} after {retries} attempts")
-    return None
+    endpoints = []
+    for rpc_url in XDC_RPC_URLS:
+        if not rpc_url.strip():
+            continue
+        w3 = Web3(Web3.HTTPProvider(rpc_url.strip()))
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        w3.middleware_onion.add(metrics.rpc_middleware)
+        endpoints.append(Endpoint(rpc_url.strip(), w3, RPC_RATE_LIMIT))
+    logging.info(f"Using {len(endpoints)} RPC endpoints: {', '.join(endpoint.url for endpoint in endpoints)}")
+    return EndpointPool(endpoints)
+
+# Execute a function on the best available RPC, failing over to the others
+def with_rpc_failover(rpc_pool, func, *args, retries=3):
+    return rpc_pool.call(func, *args, attempts=retries * len(rpc_pool))
 
 # Rate-limited RPC calls
 @sleep_and_retry
 @limits(calls=RPC_RATE_LIMIT, period=1)
 def get_block_transactions(w3, block_number):
+    if RAW_RPC:
+        return get_block_raw(w3.provider.endpoint_uri, block_number)
     return w3.eth.get_block(block_number, full_transactions=True)
 
 @sleep_and_retry
 @limits(calls=RPC_RATE_LIMIT, period=1)
 def get_logs(w3, filter_params):
+    if RAW_RPC:
+        return get_logs_raw(w3.provider.endpoint_uri, filter_params)
     return w3.eth.get_logs(filter_params)
 
+# One JSON-RPC batch counts as a single call against the rate limit
 @sleep_and_retry
 @limits(calls=RPC_RATE_LIMIT, period=1)
-def call_contract(w3, contract, function_name):
-    return getattr(contract.functions, function_name)().call()
+def post_rpc_batch(w3, calls):
+    return batch_request(w3.provider.endpoint_uri, calls)
 
-# Rate-limited function for CoinMarketCap API with caching
+# All of a batch's contract reads count as a single call against the rate limit
 @sleep_and_retry
-@limits(calls=CMC_RATE_LIMIT, period=60)
-def get_token_price(symbol, cached_prices):
-    # Check if price is cached and still valid
-    if symbol in cached_prices:
-        price, timestamp = cached_prices[symbol]
-        if datetime.now() - timestamp < PRICE_CACHE_DURATION:
-            logging.info(f"Using cached {symbol} price: ${price}")
-            return price
-        else:
-            logging.info(f"Cached {symbol} price expired, fetching new price")
-
-    headers = {"X-CMC_PRO_API_KEY": CMC_API_KEY, "Accept": "application/json"}
-    params = {"symbol": symbol, "convert": "USD"}
-    try:
-        response = requests.get(CMC_API_URL, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        price = data["data"][symbol]["quote"]["USD"]["price"]
-        cached_prices[symbol] = (price, datetime.now())  # Store price and timestamp
-        logging.info(f"Fetched {symbol} price: ${price}")
-        return price
-    except Exception as e:
-        logging.error(f"Failed to fetch {symbol} price: {str(e)}")
-        return cached_prices.get(symbol, (0, datetime.now()))[0]  # Return last known price or 0
+@limits(calls=RPC_RATE_LIMIT, period=1)
+def read_contracts(w3, calls):
+    return multicall.read(w3.provider.endpoint_uri, calls)
 
 # Get last processed block from file
 def get_last_block():
@@ -144,166 +157,595 @@ def save_last_block(block_number):
     except Exception as e:
         logging.error(f"Error saving last block: {e}")
 
+# Fetch blocks with JSON-RPC batches.
+# Returns {block_number: block} for the blocks whose batch entry succeeded.
+def fetch_blocks_batched(rpc_pool, block_numbers):
+    # Headers alone carry the timestamps when no detector reads transactions
+    calls = [("eth_getBlockByNumber", [hex(block_number), query_plan["transactions"]]) for block_number in block_numbers]
+
+    response = with_rpc_failover(rpc_pool, post_rpc_batch, calls)
+    if response is None:
+        logging.warning(f"Batch fetch failed for blocks {block_numbers[0]} to {block_numbers[-1]}")
+        return {}
+    results, errors = response
+
+    fetched = {}
+    for block_number, result, error in zip(block_numbers, results, errors):
+        if error or result is None:
+            logging.warning(f"Batch entry failed for block {block_number}: {error}")
+            continue
+        fetched[block_number] = format_block(result)
+    logging.info(f"Batch fetched {len(fetched)}/{len(block_numbers)} blocks in {(len(calls) + RPC_BATCH_SIZE - 1) // RPC_BATCH_SIZE} request(s)")
+    return fetched
+
+# Check whether a get_logs error means the block range was too heavy for the node
+def is_log_range_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in LOG_RANGE_ERROR_MARKERS)
+
+# Check whether an RPC error was a timeout; the failover path handles those like any other failure
+def is_timeout_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in TIMEOUT_MARKERS)
+
+# Query the detectors' logs for one block range, trying each RPC in turn.
+# Returns (logs, range_too_large); logs is None when every RPC failed. A node refusing the range is
+# healthy, just limited, so the next one is tried without a failure on record; the range only counts
+# as too large once every RPC failed and one refused it (or all of them timed out on it).
+def query_transfer_logs(rpc_pool, from_block, to_block):
+    filter_params = detectors.log_filter(query_plan, from_block, to_block)
+    endpoints = rpc_pool.ranked()
+    range_errors = 0
+    timeouts = 0
+    for endpoint in endpoints:
+        rpc_pool.wait_for(endpoint)
+        start = time.monotonic()
+        try:
+            logs = get_logs(endpoint.w3, filter_params)
+        except Exception as e:
+            if is_log_range_error(e) and not is_rate_limit_error(e):
+                range_errors += 1
+                logging.info(f"get_logs via {endpoint.url} refused blocks {from_block} to {to_block}: {str(e)}")
+                continue
+            rpc_pool.record_failure(endpoint, e)
+            timeouts += is_timeout_error(e)
+            logging.warning(f"get_logs via {endpoint.url} failed for blocks {from_block} to {to_block}: {str(e)}")
+            continue
+        rpc_pool.record_success(endpoint, time.monotonic() - start)
+        return logs, False
+    return None, to_block > from_block and (range_errors > 0 or 0 < timeouts == len(endpoints))
+
+# Fetch the detectors' logs for a block range using an adaptive window.
+# The window halves when a node rejects the range and doubles again after cheap queries.
+# Returns ({block_number: [logs]}, set of block numbers whose logs could not be fetched).
+def fetch_transfer_logs(rpc_pool, from_block, to_block):
+    global log_window
+    logs_by_block = defaultdict(list)
+    failed_blocks = set()
+    window_start = from_block
+    while window_start <= to_block:
+        window_end = min(window_start + log_window - 1, to_block)
+        logs, range_too_large = query_transfer_logs(rpc_pool, window_start, window_end)
+        if range_too_large:
+            log_window = max(log_window // 2, 1)
+            logging.info(f"Log range {window_start}-{window_end} too large, shrinking window to {log_window} blocks")
+            continue
+        if logs is None:
+            failed_blocks.update(range(window_start, window_end + 1))
+        else:
+            for log in logs:
+                logs_by_block[log["blockNumber"]].append(log)
+            if len(logs) < LOG_WINDOW_GROW_RESULTS and log_window < MAX_LOG_WINDOW:
+                log_window = min(log_window * 2, MAX_LOG_WINDOW)
+        window_start = window_end + 1
+    return logs_by_block, failed_blocks
+
+# Fetch the detectors' logs for a batch whose headers are already fetched.
+# Headers whose logsBloom rules out every watched topic/address are skipped, and the log query
+# only spans the first to the last remaining block (no query at all when none remain).
+def fetch_candidate_logs(rpc_pool, block_numbers, fetched):
+    if not query_plan["topics"]:
+        return {}, set()
+    if bloom_masks is None:
+        return fetch_transfer_logs(rpc_pool, block_numbers[0], block_numbers[-1])
+    candidates, skipped = bloom.candidate_blocks(bloom_masks, block_numbers, fetched)
+    if not candidates:
+        logging.info(f"Bloom filter: no block in {block_numbers[0]}-{block_numbers[-1]} can hold a watched log, skipping get_logs")
+        return {}, set()
+    logs_by_block, failed_log_blocks = fetch_transfer_logs(rpc_pool, candidates[0], candidates[-1])
+    bloom.record_false_positives([block_number for block_number in candidates if block_number not in failed_log_blocks], fetched, logs_by_block)
+    return logs_by_block, failed_log_blocks
+
+# Fetch a batch's blocks and Transfer logs concurrently across all connected RPCs.
+# Log windows that fail in async mode are retried with the adaptive sync path.
+def fetch_batch_async(rpc_pool, from_block, to_block):
+    import async_scanner
+
+    rpc_urls = rpc_pool.urls()
+    block_numbers = list(range(from_block, to_block + 1))
+    fetched = async_scanner.fetch_blocks(rpc_urls, block_numbers, query_plan["transactions"])
+    if not query_plan["topics"]:
+        return fetched, {}, set()
+    filter_params = detectors.log_filter(query_plan, from_block, to_block)
+    logs_by_block, failed_windows = async_scanner.fetch_logs(
+        rpc_urls, from_block, to_block, log_window, filter_params["topics"], filter_params.get("address")
+    )
+    failed_log_blocks = set()
+    for window_start, window_end in failed_windows:
+        retry_logs, retry_failed = fetch_transfer_logs(rpc_pool, window_start, window_end)
+        logs_by_block.update(retry_logs)
+        failed_log_blocks.update(retry_failed)
+    return fetched, logs_by_block, failed_log_blocks
+
+# Resolve metadata for every token seen in a batch of logs, using the persistent metadata cache.
+# The symbol() and decimals() reads of all uncached tokens go out together (one multicall where the
+# chain has it). Contracts whose symbol() reverts are cached as non-ERC-20; tokens whose reads could
+# not be made are left out of this batch and retried with the next one.
+# Returns {token_address: (symbol, decimals)}.
+def resolve_batch_tokens(rpc_pool, logs):
+    token_metadata = {}
+    unresolved = []
+    for token_address in sorted({log["address"] for log in logs}):
+        cached = token_cache.lookup(token_address)
+        if cached is None:
+            unresolved.append(token_address)
+        elif cached != token_cache.NOT_ERC20:
+            token_metadata[token_address] = cached
+    if not unresolved:
+        return token_metadata
+
+    calls = [(token_address, function_name, ()) for token_address in unresolved for function_name in ("symbol", "decimals")]
+    response = with_rpc_failover(rpc_pool, read_contracts, calls)
+    if response is None:
+        logging.warning(f"Could not read metadata of {len(unresolved)} tokens; their transfers are skipped this batch")
+        return token_metadata
+    results, errors = response
+    for position, token_address in enumerate(unresolved):
+        token_symbol, decimals = results[2 * position], results[2 * position + 1]
+        error = errors[2 * position] or errors[2 * position + 1]
+        if error is not None:
+            logging.warning(f"Could not read metadata of {token_address}: {error}")
+            continue
+        if not token_symbol:
+            logging.info(f"Token {token_address} has no symbol(), caching as non-ERC-20")
+            token_cache.store_failure(token_address)
+            continue
+        if decimals is None:
+            decimals = 18  # Fallback to 18 decimals
+        token_cache.store(token_address, token_symbol, decimals)
+        token_metadata[token_address] = (token_symbol, decimals)
+    logging.info(f"Resolved metadata of {len(unresolved)} new tokens with {len(calls)} contract reads")
+    return token_metadata
+
+# Fetch one batch of blocks and logs in a single pass and run every registered detector over it.
+# Returns (detections tagged with their "source", latest XDC price, sorted block numbers that could not be
+# scanned). A failed block (no block data, or its logs could not be fetched) yields no detections.
+def scan_batch(rpc_pool, w3, from_block, to_block, xdc_price):
+    block_numbers = list(range(from_block, to_block + 1))
+    if ASYNC_SCAN:
+        with metrics.timer("stage_seconds", stage="fetch_async"):
+            fetched, logs_by_block, failed_log_blocks = fetch_batch_async(rpc_pool, from_block, to_block)
+    else:
+        with metrics.timer("stage_seconds", stage="fetch_blocks"):
+            fetched = fetch_blocks_batched(rpc_pool, block_numbers) if RPC_BATCH_SIZE > 0 else {}
+        with metrics.timer("stage_seconds", stage="fetch_logs"):
+            logs_by_block, failed_log_blocks = fetch_candidate_logs(rpc_pool, block_numbers, fetched)
+
+    # Resolve token metadata and quote every symbol in the batch with one price lookup
+    token_metadata = {}
+    if any(detector.needs_token_metadata for detector in active_detectors):
+        metadata_logs = [
+            log for logs in logs_by_block.values() for log in logs
+            if len(log["topics"]) == 3 and any(detector.needs_token_metadata and detector.wants(log) for detector in active_detectors)
+        ]
+        with metrics.timer("stage_seconds", stage="token_metadata"):
+            token_metadata = resolve_batch_tokens(rpc_pool, metadata_logs)
+    price_symbols = {symbol for detector in active_detectors for symbol in detector.price_symbols}
+    with metrics.timer("stage_seconds", stage="prices"):
+        prices = price_service.get_prices({symbol for symbol, _ in token_metadata.values()} | price_symbols | {"XDC"})
+    xdc_price = prices.get("XDC") or xdc_price
+    prices["XDC"] = xdc_price
+
+    blocks = {}
+    block_timestamps = {}
+    failed_blocks = []
+    for block_number in block_numbers:
+        block = fetched.get(block_number)
+        if block is None:
+            # Fall back to a per-block call for blocks missing from the batch
+            block = with_rpc_failover(rpc_pool, get_block_transactions, block_number)
+        if not block or "transactions" not in block:
+            logging.warning(f"Skipping block {block_number}: no data")
+            failed_blocks.append(block_number)
+            continue
+
+        logging.info(f"Fetched block {block_number} with {len(block['transactions'])} transactions")
+        blocks[block_number] = block
+        if block_number in failed_log_blocks:
+            logging.warning(f"Skipping block {block_number}: failed to fetch its logs")
+            failed_blocks.append(block_number)
+        else:
+            block_timestamps[block_number] = block["timestamp"]
+
+    # Share the header timestamps with other scanners through the block time cache
+    block_times.store({block_number: block["timestamp"] for block_number, block in blocks.items()})
+
+    batch = {
+        "blocks": blocks,
+        "logs": [log for block_number in block_timestamps for log in logs_by_block.get(block_number, [])],
+        "block_timestamps": block_timestamps,
+        "token_metadata": token_metadata,
+        "prices": prices,
+    }
+    if price_history.PRICE_HISTORY and blocks:
+        # Value transfers at their block time rather than at the current quote
+        with metrics.timer("stage_seconds", stage="price_history"):
+            block_range = [block["timestamp"] for block in blocks.values()]
+            price_history.ensure(prices, min(block_range), max(block_range))
+        batch["price_at"] = lambda symbol, timestamps: price_history.prices_at(symbol, timestamps, prices.get(symbol))
+    with metrics.timer("stage_seconds", stage="detect"):
+        detections = detectors.run_detectors(active_detectors, batch)
+    if failed_blocks:
+        # The whole block is scanned again later, so none of its detections (e.g. native ones) are kept now
+        failed = set(failed_blocks)
+        detections = [detection for detection in detections if detection["block_number"] not in failed]
+    labeled = labels.enrich(detections)
+    if labeled:
+        logging.info(f"Labeled {labeled}/{len(detections)} detections from the address label index")
+    metrics.inc("blocks_processed_total", len(blocks))
+    metrics.inc("logs_processed_total", len(batch["logs"]))
+    for detection in detections:
+        metrics.inc("detections_total", source=detection["source"])
+    return detections, xdc_price, failed_blocks
+
+# Scan a block range batch by batch, returning all detections, or None if any block could not be scanned
+def scan_range(rpc_pool, w3, from_block, to_block, xdc_price):
+    large_transactions = []
+    current_start = from_block
+    while current_start <= to_block:
+        batch_end = min(current_start + BATCH_SIZE - 1, to_block)
+        logging.info(f"Processing batch: blocks {current_start} to {batch_end}...")
+        batch_transactions, xdc_price, failed_blocks = scan_batch(rpc_pool, w3, current_start, batch_end, xdc_price)
+        if failed_blocks:
+            return None
+        large_transactions.extend(batch_transactions)
+        current_start = batch_end + 1
+    return large_transactions
+
+# Split a scanned batch around its failed blocks.
+# Returns [(from_block, to_block, detections, failed)] covering the batch in block order.
+def batch_segments(rows, from_block, to_block, failed_blocks):
+    segments = []
+    start = from_block
+    for failed_from, failed_to in checkpoint.block_ranges(failed_blocks):
+        if failed_from > start:
+            segments.append((start, failed_from - 1, [row for row in rows if start <= row["block_number"] < failed_from], False))
+        segments.append((failed_from, failed_to, [], True))
+        start = failed_to + 1
+    if start <= to_block:
+        segments.append((start, to_block, [row for row in rows if row["block_number"] >= start], False))
+    return segments
+
+# Write a scanned batch to the sink, committing each part to the journal when journal is set.
+# Blocks that could not be scanned are queued as backlog and skipped by the sink, so moving past them
+# loses nothing and no stored chunk claims (and so replaces) blocks it did not scan.
+def write_batch(output, rows, from_block, to_block, failed_blocks, journal=False):
+    for segment_from, segment_to, segment_rows, failed in batch_segments(rows, from_block, to_block, failed_blocks):
+        if failed:
+            logging.warning(f"Queueing blocks {segment_from} to {segment_to} as backlog: they could not be scanned")
+            checkpoint.queue_backlog(CHECKPOINT_NAME, segment_from, segment_to)
+            output.skip(segment_to)
+            if journal:
+                checkpoint.mark_flushed(CHECKPOINT_NAME, segment_to)
+        if journal:
+            checkpoint.commit_batch(CHECKPOINT_NAME, segment_to, segment_rows)
+        if not failed:
+            output.write(segment_rows, segment_to)
+
+# Scan a queued backlog chunk and store its detections before the backlog is advanced.
+# exports are StreamingSinks the chunk's detections are also exported through (each picks its own rows).
+# Returns None when the chunk could not be fully scanned, so it stays queued and nothing partial is stored.
+def scan_backlog_chunk(rpc_pool, w3, from_block, to_block, xdc_price, exports=()):
+    logging.info(f"Draining backlog: blocks {from_block} to {to_block}...")
+    try:
+        backlog_transactions = scan_range(rpc_pool, w3, from_block, to_block, xdc_price)
+    except Exception as e:
+        logging.error(f"Failed to scan backlog blocks {from_block} to {to_block}: {str(e)}")
+        return None
+    if backlog_transactions is None:
+        return None
+    transfer_store.append_detections(backlog_transactions, from_block, to_block, DETECTION_SOURCES, CHECKPOINT_NAME, latest=False)
+    for export in exports:
+        export.write(backlog_transactions, to_block)
+    return backlog_transactions
+
+# Only the large scanner's own detections go to its CSV export; the bridge detector's have their own
+def is_exported(tx):
+    return tx.get("source", CHECKPOINT_NAME) == CHECKPOINT_NAME
+
+def is_bridge_exported(tx):
+    return tx.get("source") == detectors.BRIDGE_SOURCE
+
+# Export sinks for a stretch of blocks scanned outside the main sink (the backlog): the large transfers export
+# and the bridge detector's usdc_bridge_transfers export
+def open_exports(from_block):
+    return (
+        sink.StreamingSink(OUTPUT_DIR, "large_transfers", CSV_FIELDS, from_block, export=is_exported),
+        sink.StreamingSink(OUTPUT_DIR, "usdc_bridge_transfers", BRIDGE_CSV_FIELDS, from_block, export=is_bridge_exported),
+    )
+
 def process_transactions():
-    web3_instances = init_web3()
-    w3 = web3_instances[0]
+    rpc_pool = init_web3()
+    w3 = rpc_pool.best().w3
 
     # Get current block
-    current_block = with_rpc_failover(web3_instances, lambda w3: w3.eth.block_number)
+    current_block = with_rpc_failover(rpc_pool, lambda w3: w3.eth.block_number)
     if current_block is None:
         logging.error("Cannot proceed without current block number")
         return
 
-    # Get last processed block
-    last_processed_block = get_last_block()
-
-    # Calculate the block range for the last hour
-    if last_processed_block is None:
-        # If no last block, start from (current_block - BLOCKS_PER_HOUR)
-        start_block = max(current_block - BLOCKS_PER_HOUR, 0)
-    else:
-        # Start from the last processed block
-        start_block = last_processed_block + 1
-
     # End at the current block
     end_block = current_block
 
-    if start_block >= end_block:
-        logging.info("No new blocks to process")
-        return
-
-    # Adjust start_block to cover approximately the last hour if needed
-    if end_block - start_block > BLOCKS_PER_HOUR:
-        start_block = end_block - BLOCKS_PER_HOUR
-
-    logging.info(f"Scanning blocks {start_block} to {end_block}...")
+    journal = checkpoint.load_journal(CHECKPOINT_NAME)
+    if journal is not None:
+        # Resume an interrupted run from its last committed batch
+        start_block = journal["start_block"]
+        resume_block = journal["committed_block"] + 1
+        flushed_block = journal["flushed_block"]
+        pending_transactions = journal["results"]
+        pending_block = resume_block - 1
+        logging.info(f"Resuming interrupted run at block {resume_block} with {len(pending_transactions)} committed detections not yet written out")
+    else:
+        # Get last processed block
+        last_processed_block = get_last_block()
 
-    # Cache for token prices
-    cached_prices = {}
-    xdc_price = get_token_price("XDC", cached_prices)
+        # Calculate the block range for the last hour
+        if last_processed_block is None:
+            # If no last block, start from (current_block - BLOCKS_PER_HOUR)
+            start_block = max(current_block - BLOCKS_PER_HOUR, 0)
+        else:
+            # Start from the last processed block
+            start_block = last_processed_block + 1
+        resume_block = start_block
+        flushed_block = start_block - 1
+        pending_transactions = []
+        pending_block = flushed_block
+
+        if start_block >= end_block:
+            logging.info("No new blocks to process")
+            return
+
+    # Cover approximately the last hour now and queue anything older as backlog
+    if end_block - resume_block > BLOCKS_PER_HOUR:
+        checkpoint.queue_backlog(CHECKPOINT_NAME, resume_block, end_block - BLOCKS_PER_HOUR - 1)
+        resume_block = end_block - BLOCKS_PER_HOUR
+        if journal is None:
+            start_block = resume_block
+            flushed_block = pending_block = start_block - 1
+
+    logging.info(f"Scanning blocks {resume_block} to {end_block}...")
+
+    xdc_price = price_service.get_price("XDC")
     if xdc_price == 0:
         logging.error("Cannot proceed without XDC price")
         return
-    cached_prices["XDC"] = (xdc_price, datetime.now())  # Store with timestamp
 
-    large_transactions = []
-    # Process blocks in batches to avoid RPC overload
-    current_start = start_block
+    checkpoint.begin_run(CHECKPOINT_NAME, start_block, end_block, resume_block - 1, pending_transactions, flushed_block)
+
+    # Detections stream out chunk by chunk: each flushed chunk goes to the CSV exports and the transfer store,
+    # then the journal records it, so memory stays flat however many blocks the run covers
+    bridge_output = sink.StreamingSink(OUTPUT_DIR, "usdc_bridge_transfers", BRIDGE_CSV_FIELDS, flushed_block + 1, export=is_bridge_exported)
+
+    def store_chunk(rows, from_block, to_block):
+        try:
+            transfer_store.append_detections(rows, from_block, to_block, DETECTION_SOURCES, CHECKPOINT_NAME, latest=False)
+        except Exception as e:
+            logging.error(f"Failed to append to transfer store: {str(e)}")
+        bridge_output.write([row for row in rows if is_bridge_exported(row)], to_block)
+        checkpoint.mark_flushed(CHECKPOINT_NAME, to_block)
+
+    output = sink.StreamingSink(OUTPUT_DIR, "large_transfers", CSV_FIELDS, flushed_block + 1, on_flush=store_chunk, export=is_exported)
+    # A resumed run's pending detections end at its last scanned block; the blocks queued as backlog
+    # after it are left out of the chunks, so no chunk claims blocks it did not scan
+    output.write(pending_transactions, pending_block)
+    del pending_transactions
+    if resume_block - 1 > pending_block:
+        output.skip(resume_block - 1)
+        checkpoint.mark_flushed(CHECKPOINT_NAME, resume_block - 1)
+
+    # Process blocks in batches to avoid RPC overload, committing each batch to the journal.
+    # Blocks a batch could not scan go to the backlog, which this run drains below.
+    current_start = resume_block
     while current_start <= end_block:
         batch_end = min(current_start + BATCH_SIZE - 1, end_block)
         logging.info(f"Processing batch: blocks {current_start} to {batch_end}...")
-        
-        for block_number in range(current_start, batch_end + 1):
-            block = with_rpc_failover(web3_instances, get_block_transactions, block_number)
-            if not block or "transactions" not in block:
-                logging.warning(f"Skipping block {block_number}: no data")
-                continue
-
-            logging.info(f"Fetched block {block_number} with {len(block['transactions'])} transactions")
-
-            # Process native XDC transactions
-            for tx in block["transactions"]:
-                if tx.get("value", 0) > 0:
-                    value_xdc = w3.from_wei(tx["value"], "ether")
-                    value_usd = float(value_xdc) * xdc_price
-                    if value_usd >= MIN_USD_VALUE:
-                        tx_hash = tx["hash"].hex()
-                        tx_data = {
-                            "tx_hash": tx_hash,
-                            "from": tx["from"],
-                            "to": tx["to"],
-                            "value_xdc": float(value_xdc),
-                            "value_usd": value_usd,
-                            "token_symbol": "XDC",
-                            "block_number": block_number,
-                            "timestamp": datetime.utcfromtimestamp(block["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
-                        }
-                        large_transactions.append(tx_data)
-                        logging.info(f"Found large XDC tx: {tx_hash} - ${value_usd:.2f}")
-
-            # Process ERC-20 token transfers
-            filter_params = {
-                "fromBlock": block_number,
-                "toBlock": block_number,
-                "topics": [TRANSFER_TOPIC]
-            }
-            logs = with_rpc_failover(web3_instances, get_logs, filter_params)
-            if logs is None:
-                logging.warning(f"Skipping ERC-20 logs for block {block_number}: failed to fetch")
-                continue
-
-            for log in logs:
-                token_address = log["address"]
-                if len(log["topics"]) != 3:
-                    continue
-                try:
-                    # Get token details
-                    contract = w3.eth.contract(address=token_address, abi=ERC20_ABI)
-                    token_symbol = with_rpc_failover(web3_instances, call_contract, contract, "symbol")
-                    if not token_symbol:
-                        token_symbol = "UNKNOWN"
-                    decimals = with_rpc_failover(web3_instances, call_contract, contract, "decimals")
-                    if not decimals:
-                        decimals = 18  # Fallback to 18 decimals
-
-                    # Process transfer
-                    data_hex = log["data"].hex()[2:] if isinstance(log["data"], bytes) else log["data"][2:]
-                    if not data_hex or not all(c in '0123456789abcdefABCDEF' for c in data_hex):
-                        logging.warning(f"Invalid ERC-20 log data in block {block_number}: {data_hex}")
-                        continue
-                    value = int(data_hex, 16) / (10 ** decimals)
-                    token_price = get_token_price(token_symbol, cached_prices)
-                    value_usd = value * token_price
-                    if value_usd >= MIN_USD_VALUE:
-                        from_address = w3.to_checksum_address(f"0x{log['topics'][1][-40:]}")
-                        to_address = w3.to_checksum_address(f"0x{log['topics'][2][-40:]}")
-                        tx_hash = log["transactionHash"].hex()
-                        tx_data = {
-                            "tx_hash": tx_hash,
-                            "from": from_address,
-                            "to": to_address,
-                            "value_xdc": value,
-                            "value_usd": value_usd,
-                            "token_symbol": token_symbol,
-                            "block_number": block_number,
-                            "timestamp": datetime.utcfromtimestamp(block["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
-                        }
-                        large_transactions.append(tx_data)
-                        logging.info(f"Found large ERC-20 tx: {tx_data['tx_hash']} - ${value_usd:.2f}")
-                except Exception as e:
-                    logging.warning(f"Failed to process ERC-20 log in block {block_number} for token {token_address}: {str(e)}")
-                    continue
+        batch_transactions, xdc_price, failed_blocks = scan_batch(rpc_pool, w3, current_start, batch_end, xdc_price)
+        write_batch(output, batch_transactions, current_start, batch_end, failed_blocks, journal=True)
 
         # Update the current start for the next batch
         current_start = batch_end + 1
-
-    # Save results to CSV with temporary file
-    if large_transactions:
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        output_dir = os.path.join(os.path.expanduser("~"), "xdc-intel-reports", "data")
-        temp_path = os.path.join(output_dir, f"large_transfers_{timestamp}.csv.tmp")  # Temporary file
-        output_path = os.path.join(output_dir, f"large_transfers_{timestamp}.csv")   # Final file
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Write to temporary file
-        with open(temp_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=['tx_hash', 'from', 'to', 'value_xdc', 'value_usd', 'token_symbol', 'block_number', 'timestamp'])
-            writer.writeheader()
-            for tx in large_transactions:
-                writer.writerow(tx)
-        
-        # Rename temporary file to final file
-        os.rename(temp_path, output_path)
-        logging.info(f"Saved {len(large_transactions)} large transactions to {output_path}")
-    else:
+    output.close()
+    bridge_output.close()
+    if not output.exported:
         logging.info("No large transactions found")
+    logging.info(output.summary())
+
+    # Spend what is left of the time budget on skipped ranges from earlier runs; their detections are
+    # stored per chunk and exported to their own files
+    backlog = checkpoint.load_backlog(CHECKPOINT_NAME)
+    backlog_exports = open_exports(backlog[0][0] if backlog else end_block + 1)
+    checkpoint.drain_backlog(
+        CHECKPOINT_NAME,
+        lambda from_block, to_block: scan_backlog_chunk(rpc_pool, w3, from_block, to_block, xdc_price, backlog_exports),
+        BACKLOG_TIME_BUDGET,
+        BACKLOG_CHUNK_SIZE
+    )
+    for export in backlog_exports:
+        export.close()
+
+    token_cache.log_stats()
+    logging.info(f"RPC endpoint health: {rpc_pool.summary()}")
+    logging.info(bloom.summary())
+    logging.info(multicall.summary())
+    logging.info(price_history.summary())
+    logging.info(metrics.summary())
+
+    # Make the chunks stored above each source's latest run (where the poster starts before it has a cursor)
+    try:
+        for source in DETECTION_SOURCES:
+            transfer_store.record_run(source, start_block, end_block)
+    except Exception as e:
+        logging.error(f"Failed to record the run in the transfer store: {str(e)}")
 
-    # Save the last processed block
+    # Save the last processed block and close the journal
     save_last_block(end_block)
+    checkpoint.finish_run(CHECKPOINT_NAME)
+
+# Yield the chain head every poll_interval seconds via eth_blockNumber (None when every RPC failed)
+def poll_heads(rpc_pool, poll_interval):
+    while True:
+        yield with_rpc_failover(rpc_pool, lambda w3: w3.eth.block_number)
+        time.sleep(poll_interval)
+
+# Yield the chain head from a websocket newHeads subscription as blocks arrive.
+# Also yields (the last head seen) when no block arrived within a few poll intervals, so the caller keeps control.
+def subscribe_heads(ws_url, poll_interval):
+    from websockets.sync.client import connect
+
+    with connect(ws_url) as ws:
+        ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+        response = json.loads(ws.recv(timeout=30))
+        if "error" in response:
+            raise RuntimeError(f"eth_subscribe failed: {response['error']}")
+        logging.info(f"Subscribed to newHeads on {ws_url}")
+        head = None
+        while True:
+            try:
+                message = json.loads(ws.recv(timeout=poll_interval * 5))
+                head = int(message["params"]["result"]["number"], 16)
+            except TimeoutError:
+                pass
+            yield head
+
+# Yield chain heads, preferring the websocket subscription and falling back to polling if it drops
+def watch_heads(rpc_pool, poll_interval):
+    if XDC_WS_URL:
+        try:
+            yield from subscribe_heads(XDC_WS_URL, poll_interval)
+        except Exception as e:
+            logging.warning(f"newHeads subscription on {XDC_WS_URL} failed, polling eth_blockNumber instead: {str(e)}")
+    yield from poll_heads(rpc_pool, poll_interval)
+
+# Long-running mode: scan new blocks as they are produced, CONFIRMATIONS blocks behind the head.
+# The RPC pool, token metadata, block and price caches stay warm between blocks. Detections are stored
+# as soon as their batch is scanned and stream to one CSV export published per FOLLOW_FILE_BLOCKS blocks.
+# Once caught up with the head, each poll spends up to FOLLOW_BACKLOG_BUDGET seconds on the backlog.
+# max_runtime (seconds) stops the loop, e.g. for runs against a local stub node.
+def follow_chain(confirmations=CONFIRMATIONS, poll_interval=FOLLOW_POLL_INTERVAL, max_runtime=None):
+    rpc_pool = init_web3()
+    w3 = rpc_pool.best().w3
+
+    xdc_price = price_service.get_price("XDC")
+    if xdc_price == 0:
+        logging.error("Cannot proceed without XDC price")
+        return
+
+    # Finish an interrupted cron run first, so its journal does not resume over blocks this mode scans
+    if checkpoint.load_journal(CHECKPOINT_NAME) is not None:
+        logging.info("Finishing interrupted run before following the chain")
+        process_transactions()
+
+    if METRICS_PORT:
+        metrics.serve_prometheus(METRICS_PORT)
+
+    # Each batch is stored as it is scanned, without replacing the latest run: the poster reads every
+    # stored block past its cursor. Export rollovers without detections store nothing.
+    def store_chunk(rows, from_block, to_block):
+        bridge_output.write([row for row in rows if is_bridge_exported(row)], to_block)
+        if not rows:
+            return
+        try:
+            transfer_store.append_detections(rows, from_block, to_block, DETECTION_SOURCES, CHECKPOINT_NAME, latest=False)
+        except Exception as e:
+            logging.error(f"Failed to append to transfer store: {str(e)}")
+
+    last_block = get_last_block()
+    output = None
+    bridge_output = None
+    backlog_exports = None
+    started = time.time()
+    for head in watch_heads(rpc_pool, poll_interval):
+        if max_runtime is not None and time.time() - started >= max_runtime:
+            break
+        if head is None:
+            continue
+        target = head - confirmations
+        if last_block is None:
+            last_block = target - 1
+            logging.info(f"Following chain from block {target}")
+        elif target - last_block > BLOCKS_PER_HOUR:
+            # Too far behind to catch up quickly; leave the gap to the backlog and resume near the head
+            checkpoint.queue_backlog(CHECKPOINT_NAME, last_block + 1, target - BLOCKS_PER_HOUR - 1)
+            last_block = target - BLOCKS_PER_HOUR - 1
+            if output is not None:
+                output.skip(last_block)
+        if output is None:
+            bridge_output = sink.StreamingSink(
+                OUTPUT_DIR, "usdc_bridge_transfers", BRIDGE_CSV_FIELDS, last_block + 1, export=is_bridge_exported,
+                max_file_blocks=FOLLOW_FILE_BLOCKS,
+            )
+            output = sink.StreamingSink(
+                OUTPUT_DIR, "large_transfers", CSV_FIELDS, last_block + 1, on_flush=store_chunk, export=is_exported,
+                max_file_blocks=FOLLOW_FILE_BLOCKS,
+            )
+
+        while last_block < target:
+            batch_end = min(last_block + BATCH_SIZE, target)
+            batch_transactions, xdc_price, failed_blocks = scan_batch(rpc_pool, w3, last_block + 1, batch_end, xdc_price)
+            write_batch(output, batch_transactions, last_block + 1, batch_end, failed_blocks)
+            if output.buffer:
+                # Store detections right away rather than once a chunk fills up
+                output.flush()
+            save_last_block(batch_end)
+            last_block = batch_end
+
+        backlog = checkpoint.load_backlog(CHECKPOINT_NAME)
+        if backlog and FOLLOW_BACKLOG_BUDGET > 0:
+            if backlog_exports is None:
+                backlog_exports = open_exports(backlog[0][0])
+            checkpoint.drain_backlog(
+                CHECKPOINT_NAME,
+                lambda from_block, to_block: scan_backlog_chunk(rpc_pool, w3, from_block, to_block, xdc_price, backlog_exports),
+                FOLLOW_BACKLOG_BUDGET,
+                FOLLOW_BACKLOG_CHUNK_SIZE
+            )
+        if not METRICS_PORT:
+            metrics.write_prometheus()
+
+    if output is not None:
+        output.close()
+        bridge_output.close()
+        logging.info(output.summary())
+    for export in backlog_exports or ():
+        export.close()
+
+    token_cache.log_stats()
+    logging.info(f"RPC endpoint health: {rpc_pool.summary()}")
+    logging.info(bloom.summary())
+    logging.info(multicall.summary())
+    logging.info(price_history.summary())
+    logging.info(metrics.summary())
 
 if __name__ == "__main__":
+    setup_logging()
+    if not check_config():
+        exit(1)
     try:
-        process_transactions()
+        if "--follow" in sys.argv[1:]:
+            follow_chain()
+        else:
+            process_transactions()
     except Exception as e:
         logging.error(f"Script failed: {str(e)}")
         raise
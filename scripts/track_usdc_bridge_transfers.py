@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 import os
 import time
-import json
 from datetime import datetime
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
-import pandas as pd
 from dotenv import load_dotenv
 from pathlib import Path
+import numpy as np
+from eth_utils import to_checksum_address
+from rpc_pool import Endpoint, EndpointPool
+from rpc_client import batch_request, get_logs_raw, hex_str, hex_to_int
+import block_times
+import bridge_watchlist
+import detectors
+import price_service
+import price_history
+import transfer_store
+import checkpoint
+import labels
+import metrics
+import sink
 
 # Load environment variables
 load_dotenv('/root/xdc-intel/.env')
@@ -15,8 +25,7 @@ XDCSCAN_API_KEY = os.getenv('XDCSCAN_API_KEY')
 COINMARKETCAP_API_KEY = os.getenv('COINMARKETCAP_API_KEY')
 
 # Constants
-USDC_E_ADDRESS = "0x2A8E898b6242355c290E1f4Fc966b8788729A4D4"  # USDC.e token contract
-BRIDGE_ADDRESS = None  # To be determined; placeholder for now
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
 RPC_URLS = [
     "https://rpc.xinfin.network",
     "https://rpc1.xinfin.network",
@@ -28,43 +37,44 @@ TRANSFER_THRESHOLD_USD = 5000  # $5,000 threshold
 DATA_DIR = Path('/root/xdc-intel-reports/data')
 LOG_FILE = Path('/root/xdc-intel/usdc_bridge_transfers.log')
 LAST_BLOCK_FILE = Path('/root/xdc-intel/last_block_usdc.txt')
-PRICE_CACHE_FILE = Path('/root/xdc-intel/usdc_price_cache.json')
-PRICE_CACHE_DURATION = 600  # 10 minutes in seconds
-
-# USDC.e ABI (including Transfer event)
-USDC_E_ABI = [
-    {
-        "constant": True,
-        "inputs": [{"name": "_owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "balance", "type": "uint256"}],
-        "type": "function"
-    },
-    {
-        "anonymous": False,
-        "inputs": [
-            {"indexed": True, "name": "from", "type": "address"},
-            {"indexed": True, "name": "to", "type": "address"},
-            {"indexed": False, "name": "value", "type": "uint256"}
-        ],
-        "name": "Transfer",
-        "type": "event"
-    }
-]
+RPC_RATE_LIMIT = 3  # Requests per second per endpoint before adaptive backoff
+CHECKPOINT_NAME = 'usdc_bridge'
+CSV_COLUMNS = ['tx_hash', 'from', 'to', 'value_usdc', 'block_number', 'timestamp', 'value_usd', 'token_symbol', 'from_label', 'to_label']
+STANDALONE = os.getenv('USDC_STANDALONE', '0') == '1'  # Scan even while the large scanner's bridge detector covers these transfers
+INTERPOLATE_BLOCK_TIMES = os.getenv('INTERPOLATE_BLOCK_TIMES', '0') == '1'  # Estimate event timestamps from header anchors
 
-# Initialize Web3 with failover
-def get_web3():
-    for rpc_url in RPC_URLS:
-        try:
+rpc_pool = None
+watchlist = None
+
+# Initialize Web3 endpoints behind a health-aware pool (built once per run).
+# Endpoints are not probed up front: a dead RPC fails its first real call and the pool cools it down.
+def get_rpc_pool():
+    global rpc_pool
+    if rpc_pool is None:
+        from web3 import Web3
+        from web3.middleware import geth_poa_middleware
+
+        endpoints = []
+        for rpc_url in RPC_URLS:
             w3 = Web3(Web3.HTTPProvider(rpc_url))
             # Add PoA middleware for XDC Network
             w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-            if w3.is_connected():
-                log_message(f"Connected to RPC: {rpc_url}")
-                return w3
-        except Exception as e:
-            log_message(f"Failed to connect to RPC {rpc_url}: {str(e)}")
-    raise Exception("All RPC endpoints failed")
+            w3.middleware_onion.add(metrics.rpc_middleware)
+            endpoints.append(Endpoint(rpc_url, w3, RPC_RATE_LIMIT))
+        log_message(f"Using {len(endpoints)} RPC endpoints: {', '.join(RPC_URLS)}")
+        rpc_pool = EndpointPool(endpoints, log=log_message)
+    return rpc_pool
+
+# Return the currently healthiest Web3 instance
+def get_web3():
+    return get_rpc_pool().best().w3
+
+# Run func(w3) on the best endpoint with failover; raise if every endpoint fails
+def rpc_call(func, *args):
+    result = get_rpc_pool().call(func, *args)
+    if result is None:
+        raise Exception(f"All RPC endpoints failed for {getattr(func, '__name__', 'call')}")
+    return result
 
 # Logging function
 def log_message(message):
@@ -72,33 +82,29 @@ def log_message(message):
     with open(LOG_FILE, 'a') as f:
         f.write(f"[{timestamp}] {message}\n")
 
-# Get or cache USDC price
-def get_usdc_price():
-    if PRICE_CACHE_FILE.exists():
-        with open(PRICE_CACHE_FILE, 'r') as f:
-            cache = json.load(f)
-        if time.time() - cache['timestamp'] < PRICE_CACHE_DURATION:
-            log_message("Using cached USDC price")
-            return cache['price']
-
-    # Fetch from CoinMarketCap Sandbox API
-    import requests
-    url = "https://sandbox-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-    headers = {"X-CMC_PRO_API_KEY": COINMARKETCAP_API_KEY}
-    params = {"symbol": "USDC", "convert": "USD"}
-    log_message("Fetching USDC price from CoinMarketCap Sandbox API")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        log_message(f"CMC API response: {data}")
-        price = data['data']['USDC']['quote']['USD']['price']
-        with open(PRICE_CACHE_FILE, 'w') as f:
-            json.dump({'timestamp': time.time(), 'price': price}, f)
-        return price
-    except Exception as e:
-        log_message(f"Error fetching USDC price: {str(e)}")
-        return 1.0  # Assume 1:1 if API fails (since USDC is a stablecoin)
+# Load the watchlist (bridge_watchlist.json) once per run. Returns {lowercase token address: entry}.
+def get_watchlist():
+    global watchlist
+    if watchlist is None:
+        watchlist = bridge_watchlist.load_watchlist(log=log_message)
+    return watchlist
+
+# Price every watched token with one lookup in the shared price cache. Returns {symbol: price}.
+# Tokens without a quote use their fallback_price (e.g. 1.0 for stablecoins) or are left out.
+def get_token_prices():
+    tokens = get_watchlist().values()
+    quotes = price_service.get_prices({token['price_symbol'] for token in tokens}, wait=True)
+    prices = {}
+    for token in tokens:
+        price = quotes.get(token['price_symbol'])
+        if not price:
+            price = token['fallback_price']
+            if not price:
+                log_message(f"{token['symbol']} price unavailable and no fallback price, skipping its transfers")
+                continue
+            log_message(f"{token['symbol']} price unavailable, assuming ${price:.2f}")
+        prices[token['symbol']] = price
+    return prices
 
 # Get the last processed block
 def get_last_block():
@@ -107,8 +113,7 @@ def get_last_block():
             last_block = int(f.read().strip())
             log_message(f"Last processed block from file: {last_block}")
             return last_block
-    w3 = get_web3()
-    last_block = w3.eth.block_number - BLOCKS_PER_DAY
+    last_block = rpc_call(lambda w3: w3.eth.block_number) - BLOCKS_PER_DAY
     log_message(f"No last block file found. Defaulting to {last_block}")
     return last_block
 
@@ -118,93 +123,188 @@ def save_last_block(block):
         f.write(str(block))
     log_message(f"Saved last block: {block}")
 
-# Fetch USDC.e transfers using Web3.py
-def fetch_usdc_transfers(start_block, end_block):
+# Fetch block headers in JSON-RPC batches and return {block_number: timestamp}
+def fetch_block_headers(block_numbers):
+    calls = [("eth_getBlockByNumber", [hex(block_number), False]) for block_number in block_numbers]
+    results, errors = rpc_call(lambda w3: batch_request(w3.provider.endpoint_uri, calls))
+    return {
+        block_number: hex_to_int(result["timestamp"])
+        for block_number, result, error in zip(block_numbers, results, errors)
+        if not error and result
+    }
+
+# Fetch Transfer events of every watched token with one stateless eth_getLogs per range
+# (address array + Transfer topic), so each extra token costs no extra RPC calls.
+# Returns None when the range could not be fetched.
+def fetch_bridge_transfers(start_block, end_block):
+    tokens = get_watchlist()
+    filter_params = {
+        "fromBlock": start_block,
+        "toBlock": end_block,
+        "address": [token['address'] for token in tokens.values()],
+        "topics": [TRANSFER_TOPIC],
+    }
     transfers = []
-    w3 = get_web3()
-    contract = w3.eth.contract(address=USDC_E_ADDRESS, abi=USDC_E_ABI)
-    decimals = 6  # USDC.e uses 6 decimals
 
-    log_message(f"Fetching transfers for USDC.e contract {USDC_E_ADDRESS} from block {start_block} to {end_block}")
+    log_message(f"Fetching transfers for {len(tokens)} watched token(s) from block {start_block} to {end_block}")
 
     try:
-        # Fetch Transfer events
-        transfer_filter = contract.events.Transfer.create_filter(fromBlock=start_block, toBlock=end_block)
-        events = transfer_filter.get_all_entries()
-        if not events:
+        with metrics.timer('stage_seconds', stage='fetch_logs'):
+            logs = rpc_call(lambda w3: get_logs_raw(w3.provider.endpoint_uri, filter_params))
+        if not logs:
             log_message(f"No Transfer events found between blocks {start_block} and {end_block}")
-        for event in events:
-            value = event['args']['value'] / (10 ** decimals)
-            block = event['blockNumber']
-            # Fetch block to get timestamp
-            block_data = w3.eth.get_block(block)
-            timestamp = datetime.utcfromtimestamp(block_data['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        # Resolve timestamps for all unique event blocks at once
+        with metrics.timer('stage_seconds', stage='block_timestamps'):
+            timestamps = block_times.get_block_timestamps(
+                [log['blockNumber'] for log in logs], fetch_block_headers, INTERPOLATE_BLOCK_TIMES
+            )
+        for log in logs:
+            token = tokens.get(log['address'].lower())
+            # ERC-721 Transfers share the topic but index the token id as a fourth topic
+            if token is None or len(log['topics']) != 3:
+                continue
+            from_address = to_checksum_address(hex_str(log['topics'][1])[-40:])
+            to_address = to_checksum_address(hex_str(log['topics'][2])[-40:])
+            if token['bridges'] and from_address.lower() not in token['bridges'] and to_address.lower() not in token['bridges']:
+                continue
+            tx_hash = hex_str(log['transactionHash'])
+            block = log['blockNumber']
+            if block not in timestamps:
+                log_message(f"Skipping transfer {tx_hash}: no timestamp for block {block}")
+                continue
+            value = int(log['data'], 16) / (10 ** token['decimals'])
+            timestamp = datetime.utcfromtimestamp(timestamps[block]).strftime('%Y-%m-%d %H:%M:%S')
             transfers.append({
-                'tx_hash': event['transactionHash'].hex(),
-                'from': event['args']['from'],
-                'to': event['args']['to'],
-                'value_usdc': value,
+                'tx_hash': tx_hash,
+                'from': from_address,
+                'to': to_address,
+                'value_usdc': value,  # Amount in the token's own units; column name kept for the published CSV
                 'block_number': block,
-                'timestamp': timestamp
+                'log_index': log['logIndex'],
+                'timestamp': timestamp,
+                'token_symbol': token['symbol'],
             })
-            log_message(f"Fetched transfer: {event['transactionHash'].hex()} - {value} USDC.e from {event['args']['from']} to {event['args']['to']}")
+            log_message(f"Fetched transfer: {tx_hash} - {value} {token['symbol']} from {from_address} to {to_address}")
     except Exception as e:
-        log_message(f"Error fetching transfers via Web3.py: {str(e)}")
+        log_message(f"Error fetching transfers: {str(e)}")
+        return None
 
     return transfers
 
+# Keep transfers ≥ $5,000 and tag them with their USD value
+# Each transfer is valued at its token's price at the transfer's block time; prices (current quotes or
+# fallback prices) anchor the series and stand in where there is no price history.
+def filter_transfers(transfers, prices):
+    price_symbols = {token['symbol']: token['price_symbol'] for token in get_watchlist().values()}
+    transfers = [transfer for transfer in transfers if transfer['token_symbol'] in prices]
+    if not transfers:
+        return []
+    timestamps = np.array([transfer['timestamp'] for transfer in transfers], dtype='datetime64[s]').astype(np.int64)
+    price_history.ensure({price_symbols.get(symbol, symbol) for symbol in prices}, timestamps.min(), timestamps.max())
+    symbols = np.array([transfer['token_symbol'] for transfer in transfers])
+    transfer_prices = np.zeros(len(transfers))
+    for symbol in set(symbols.tolist()):
+        rows = symbols == symbol
+        transfer_prices[rows] = price_history.prices_at(price_symbols.get(symbol, symbol), timestamps[rows], prices[symbol])
+
+    filtered_transfers = []
+    for transfer, price in zip(transfers, transfer_prices.tolist()):
+        value_usd = transfer['value_usdc'] * price
+        if value_usd >= TRANSFER_THRESHOLD_USD:
+            transfer['value_usd'] = value_usd
+            filtered_transfers.append(transfer)
+        else:
+            log_message(f"Transfer {transfer['tx_hash']} filtered out: ${value_usd:.2f} < $5,000 threshold")
+    return filtered_transfers
+
+# Whether the large scanner runs the bridge watchlist detector, which stores the same usdc_bridge rows
+# (and usdc_bridge_transfers CSV export) from its own pass over the blocks
+def covered_by_large_scanner():
+    return detectors.runs_bridge_detector(os.getenv('DETECTORS', detectors.DEFAULT_DETECTORS).split(','))
+
 # Main function
 def main():
     start_time = time.time()
-    log_message("Starting USDC transfer scan...")
+    if covered_by_large_scanner() and not STANDALONE:
+        log_message("Bridged token transfers are detected by the large scanner's bridge_watchlist detector; skipping this scan (USDC_STANDALONE=1 runs it anyway)")
+        return
+    log_message("Starting bridged token transfer scan...")
 
     # Ensure data directory exists
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
     # Get block range
-    w3 = get_web3()
-    end_block = w3.eth.block_number
+    end_block = rpc_call(lambda w3: w3.eth.block_number)
     log_message(f"Current block number: {end_block}")
-    start_block = get_last_block()
-    log_message(f"Scanning blocks {start_block} to {end_block}")
+    journal = checkpoint.load_journal(CHECKPOINT_NAME)
+    if journal is not None:
+        # Resume an interrupted run from its last committed batch
+        start_block = journal['start_block']
+        resume_block = journal['committed_block'] + 1
+        flushed_block = journal['flushed_block']
+        pending_transfers = journal['results']
+        log_message(f"Resuming interrupted run at block {resume_block} with {len(pending_transfers)} committed transfers not yet written out")
+    else:
+        start_block = get_last_block()
+        resume_block = start_block
+        flushed_block = start_block - 1
+        pending_transfers = []
+    log_message(f"Scanning blocks {resume_block} to {end_block}")
 
-    # Fetch USDC price
-    usdc_price = get_usdc_price()
-    log_message(f"USDC price: ${usdc_price}")
+    # Price every watched token
+    prices = get_token_prices()
+    log_message(f"Token prices: {', '.join(f'{symbol} ${price}' for symbol, price in sorted(prices.items()))}")
 
-    # Fetch transfers
-    transfers = []
-    for block in range(start_block, end_block + 1, BATCH_SIZE):
-        batch_end = min(block + BATCH_SIZE - 1, end_block)
-        batch_transfers = fetch_usdc_transfers(block, batch_end)
-        transfers.extend(batch_transfers)
-        time.sleep(0.5)  # Increased delay to avoid overwhelming the RPC node
+    checkpoint.begin_run(CHECKPOINT_NAME, start_block, end_block, resume_block - 1, pending_transfers, flushed_block)
 
-    # Filter transfers ≥ $5,000
-    filtered_transfers = []
-    for transfer in transfers:
-        value_usd = transfer['value_usdc'] * usdc_price
-        if value_usd >= TRANSFER_THRESHOLD_USD:
-            transfer['value_usd'] = value_usd
-            transfer['token_symbol'] = 'USDC.e'
-            filtered_transfers.append(transfer)
-        else:
-            log_message(f"Transfer {transfer['tx_hash']} filtered out: ${value_usd:.2f} < $5,000 threshold")
+    # Transfers over the threshold stream out chunk by chunk to the CSV export and the transfer store
+    def store_chunk(rows, from_block, to_block):
+        try:
+            transfer_store.append_transfers(CHECKPOINT_NAME, rows, from_block, to_block, latest=False)
+        except Exception as e:
+            log_message(f"Failed to append to transfer store: {str(e)}")
+        checkpoint.mark_flushed(CHECKPOINT_NAME, to_block)
 
-    # Save to CSV
-    if filtered_transfers:
-        df = pd.DataFrame(filtered_transfers)
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        temp_csv = DATA_DIR / f"usdc_bridge_transfers_{timestamp}.csv.tmp"
-        final_csv = DATA_DIR / f"usdc_bridge_transfers_{timestamp}.csv"
-        df.to_csv(temp_csv, index=False)
-        temp_csv.rename(final_csv)
-        log_message(f"Saved {len(filtered_transfers)} transfers to {final_csv}")
-    else:
+    output = sink.StreamingSink(DATA_DIR, "usdc_bridge_transfers", CSV_COLUMNS, flushed_block + 1, on_flush=store_chunk, log=log_message)
+    output.write(pending_transfers, resume_block - 1)
+    del pending_transfers
+
+    # Fetch transfers batch by batch, committing each batch to the journal
+    for block in range(resume_block, end_block + 1, BATCH_SIZE):
+        batch_end = min(block + BATCH_SIZE - 1, end_block)
+        batch_transfers = fetch_bridge_transfers(block, batch_end)
+        if batch_transfers is None:
+            output.close()
+            log_message(f"Stopping at block {block}; the next run resumes from the last committed batch")
+            return
+        batch_filtered = filter_transfers(batch_transfers, prices)
+        labeled = labels.enrich(batch_filtered)
+        if labeled:
+            log_message(f"Labeled {labeled}/{len(batch_filtered)} transfers from the address label index")
+        metrics.inc('blocks_processed_total', batch_end - block + 1)
+        metrics.inc('logs_processed_total', len(batch_transfers))
+        metrics.inc('detections_total', len(batch_filtered), source=CHECKPOINT_NAME)
+        checkpoint.commit_batch(CHECKPOINT_NAME, batch_end, batch_filtered)
+        output.write(batch_filtered, batch_end)
+
+    output.close()
+    if not output.exported:
         log_message("No transfers ≥ $5,000 found. No CSV generated.")
+    log_message(output.summary())
 
-    # Update last block
+    # Make the stored chunks the source's latest run (what the poster reads)
+    try:
+        transfer_store.record_run(CHECKPOINT_NAME, start_block, end_block)
+    except Exception as e:
+        log_message(f"Failed to record the run in the transfer store: {str(e)}")
+
+    # Update last block and close the journal
     save_last_block(end_block)
+    checkpoint.finish_run(CHECKPOINT_NAME)
+
+    log_message(block_times.summary())
+    log_message(price_history.summary())
+    log_message(metrics.summary())
 
     runtime = time.time() - start_time
     log_message(f"Scan completed in {runtime:.2f} seconds.")
@@ -0,0 +1,66 @@
+import logging
+import numpy as np
+from rpc_client import hex_str
+
+# 2**192, 2**128, 2**64, 1 as floats, for folding four big-endian uint64 limbs into one uint256 value
+LIMB_WEIGHTS = np.array([2.0 ** 192, 2.0 ** 128, 2.0 ** 64, 1.0])
+
+
+# Turn a batch of raw Transfer logs into column arrays.
+# Logs without exactly three topics or with a non-uint256 data field are dropped.
+def decode_transfer_logs(logs):
+    rows = []
+    data_words = []
+    for log in logs:
+        if len(log["topics"]) != 3:
+            continue
+        data_hex = hex_str(log["data"])[2:]
+        if len(data_hex) != 64:
+            logging.warning(f"Invalid ERC-20 log data in block {log['blockNumber']}: {data_hex}")
+            continue
+        rows.append(log)
+        data_words.append(data_hex)
+
+    try:
+        raw = bytes.fromhex("".join(data_words))
+    except ValueError:
+        # Rare: some word is not valid hex, so find and drop the bad rows
+        valid = []
+        for log, word in zip(rows, data_words):
+            try:
+                bytes.fromhex(word)
+                valid.append((log, word))
+            except ValueError:
+                logging.warning(f"Invalid ERC-20 log data in block {log['blockNumber']}: {word}")
+        rows = [log for log, _ in valid]
+        data_words = [word for _, word in valid]
+        raw = bytes.fromhex("".join(data_words))
+
+    limbs = np.frombuffer(raw, dtype=">u8").reshape(-1, 4).astype(np.float64)
+    return {
+        "logs": rows,
+        "data": data_words,
+        "token": np.array([hex_str(log["address"]).lower() for log in rows], dtype=object),
+        "amount": limbs @ LIMB_WEIGHTS if len(rows) else np.zeros(0),
+        "block": np.array([log["blockNumber"] for log in rows], dtype=np.int64),
+    }
+
+
+# Value every decoded transfer in USD and return a boolean mask of rows at or above min_usd, along with
+# each row's USD value and the price it was valued at. token_metadata maps token address -> (symbol, decimals);
+# price_at(symbol, rows) returns the USD prices of a symbol for an array of row indices (e.g. at each row's block time).
+def usd_threshold_mask(columns, token_metadata, price_at, min_usd):
+    if not len(columns["token"]):
+        return np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0)
+    metadata = {hex_str(address).lower(): value for address, value in token_metadata.items()}
+    tokens, inverse = np.unique(columns["token"], return_inverse=True)
+    scale = np.ones(len(tokens))
+    price = np.zeros(len(inverse))
+    for i, token in enumerate(tokens):
+        if token in metadata:
+            symbol, decimals = metadata[token]
+            scale[i] = 10.0 ** decimals
+            rows = np.flatnonzero(inverse == i)
+            price[rows] = price_at(symbol, rows)
+    value_usd = columns["amount"] / scale[inverse] * price
+    return value_usd >= min_usd, value_usd, price
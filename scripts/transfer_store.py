@@ -0,0 +1,375 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import fcntl
+from contextlib import contextmanager
+import rollups
+
+# Constants
+STORE_DIR = os.path.join(os.path.expanduser("~"), "xdc-intel", "transfer_store")
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+COMPACT_AFTER_DAYS = 2  # Date partitions this old are settled; their files are merged into one per source...
+COMPACT_MIN_FILES = 8  # ...once a source has this many files in one
+
+# Normalized schema shared by every scanner: (column, arrow type name)
+SCHEMA_FIELDS = [
+    ("source", "string"),
+    ("tx_hash", "string"),
+    ("log_index", "int64"),
+    ("from", "string"),
+    ("to", "string"),
+    ("value", "float64"),
+    ("value_usd", "float64"),
+    ("token_symbol", "string"),
+    ("block_number", "int64"),
+    ("timestamp", "string"),
+    ("from_label", "string"),  # Address labels the scanner found (labels.py), None when unlabeled
+    ("to_label", "string"),
+]
+
+
+def get_schema():
+    import pyarrow as pa
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in SCHEMA_FIELDS])
+
+
+# Read a stored file in the current schema: files written before a column existed get it as nulls
+def read_table(path, columns=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = get_schema()
+    names = columns or schema.names
+    stored = set(pq.read_schema(path).names)
+    table = pq.read_table(path, columns=[name for name in names if name in stored])
+    for name in names:
+        if name not in stored:
+            table = table.append_column(schema.field(name), pa.nulls(table.num_rows, schema.field(name).type))
+    return table.select(names)
+
+
+# Normalize a detection from either scanner into the shared schema
+def normalize(source, row):
+    tx_hash = str(row["tx_hash"]).lower()
+    if not tx_hash.startswith("0x"):
+        tx_hash = "0x" + tx_hash
+    value = row.get("value", row.get("value_xdc", row.get("value_usdc")))
+    return {
+        "source": source,
+        "tx_hash": tx_hash,
+        "log_index": int(row.get("log_index", -1)),
+        "from": row["from"],
+        "to": row["to"],
+        "value": float(value),
+        "value_usd": float(row["value_usd"]),
+        "token_symbol": row["token_symbol"],
+        "block_number": int(row["block_number"]),
+        "timestamp": row["timestamp"],
+        "from_label": row.get("from_label"),
+        "to_label": row.get("to_label"),
+    }
+
+
+def partition_key(date, token_symbol):
+    return f"date={date}/token={re.sub(r'[^A-Za-z0-9._-]', '_', token_symbol)}"
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"partitions": {}, "runs": {}}
+
+
+def save_manifest(manifest):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    temp_path = f"{MANIFEST_FILE}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp_path, MANIFEST_FILE)
+
+
+# Serialize manifest updates between scanners running at the same time
+@contextmanager
+def manifest_lock():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with open(os.path.join(STORE_DIR, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# The block range a source's part file was written for, or None for another source's file
+def file_range(source, file_name):
+    match = re.match(rf"part-{re.escape(source)}-(\d+)-(\d+)\.parquet$", file_name)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+# A source's stored files whose range overlaps [from_block, to_block], as (partition key, file name, range).
+# Partitions whose covered ranges miss the blocks are skipped without looking at their files.
+def source_files(manifest, source, from_block, to_block):
+    found = []
+    for key, partition in sorted(manifest["partitions"].items()):
+        if not any(start <= to_block and from_block <= end for start, end in partition["block_ranges"]):
+            continue
+        for file_name in partition["files"]:
+            blocks = file_range(source, file_name)
+            if blocks and blocks[0] <= to_block and from_block <= blocks[1]:
+                found.append((key, file_name, blocks))
+    return found
+
+
+def write_file(table, path):
+    import pyarrow.parquet as pq
+
+    temp_path = f"{path}.tmp"
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+
+# Remove a file from disk, its partition and any run listing it
+def drop_file(manifest, key, file_name):
+    partition = manifest["partitions"][key]
+    partition["files"].remove(file_name)
+    partition["rows"].pop(file_name, None)
+    try:
+        os.remove(os.path.join(STORE_DIR, key, file_name))
+    except FileNotFoundError:
+        pass
+    path = os.path.join(key, file_name)
+    for run in manifest["runs"].values():
+        if path in run["files"]:
+            run["files"].remove(path)
+
+
+# Merge a block range into a sorted list of non-overlapping ranges
+def merge_range(ranges, from_block, to_block):
+    merged = []
+    for start, end in sorted(ranges + [[from_block, to_block]]):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+# Append one scan's detections, partitioned by date and token.
+# A scanned range replaces what the source stored for those blocks before, whatever the earlier chunk
+# boundaries were, so rescans never leave duplicates behind.
+# Rows are deduplicated by (tx_hash, log_index), e.g. a transfer a chunk of a backfill shard saw twice.
+# latest=False stores the rows without making them the source's latest run (e.g. backlog or backfill).
+def append_transfers(source, rows, from_block, to_block, latest=True):
+    groups = {}
+    records = []
+    seen = set()
+    for row in rows:
+        record = normalize(source, row)
+        if (record["tx_hash"], record["log_index"]) in seen:
+            continue
+        seen.add((record["tx_hash"], record["log_index"]))
+        key = partition_key(record["timestamp"][:10], record["token_symbol"])
+        groups.setdefault(key, []).append(record)
+        records.append(record)
+
+    with manifest_lock():
+        manifest = load_manifest()
+        written = write_partitions(manifest, source, groups, from_block, to_block)
+        replace_range(manifest, source, from_block, to_block, written)
+        if latest:
+            manifest["runs"][source] = {
+                "from_block": from_block,
+                "to_block": to_block,
+                "files": written,
+                "written_at": time.time(),
+            }
+        compact(manifest, source)
+        save_manifest(manifest)
+    logging.info(f"Stored {len(records)} {source} transfers in {len(written)} partition(s)")
+
+    # Fold the range into the hourly/daily rollups; the stored files stay the source of truth if this fails
+    try:
+        rollups.merge(source, records, from_block, to_block)
+    except Exception as e:
+        logging.warning(f"Failed to update rollups for {source} blocks {from_block} to {to_block}: {str(e)}")
+    return written
+
+
+# Append detections tagged with a "source" key, one append per source.
+# Rows without a source belong to default_source. Every source listed in sources is appended,
+# so a scan that found nothing still records its run.
+def append_detections(rows, from_block, to_block, sources, default_source=None, latest=True):
+    grouped = {source: [] for source in sources}
+    for row in rows:
+        grouped.setdefault(row.get("source", default_source), []).append(row)
+    return {source: append_transfers(source, source_rows, from_block, to_block, latest) for source, source_rows in grouped.items()}
+
+
+# Make the stored files of a source within [from_block, to_block] its latest run, for a scan that
+# was appended chunk by chunk with latest=False (see sink.StreamingSink)
+def record_run(source, from_block, to_block):
+    with manifest_lock():
+        manifest = load_manifest()
+        files = [
+            os.path.join(key, file_name) for key, file_name, (start, end) in source_files(manifest, source, from_block, to_block)
+            if from_block <= start and end <= to_block
+        ]
+        manifest["runs"][source] = {"from_block": from_block, "to_block": to_block, "files": files, "written_at": time.time()}
+        save_manifest(manifest)
+    return files
+
+
+def write_partitions(manifest, source, groups, from_block, to_block):
+    import pyarrow as pa
+
+    file_name = f"part-{source}-{from_block}-{to_block}.parquet"
+    written = []
+    for key, records in groups.items():
+        partition_dir = os.path.join(STORE_DIR, key)
+        os.makedirs(partition_dir, exist_ok=True)
+        write_file(pa.Table.from_pylist(records, schema=get_schema()), os.path.join(partition_dir, file_name))
+
+        partition = manifest["partitions"].setdefault(key, {"files": [], "block_ranges": [], "rows": {}})
+        if file_name not in partition["files"]:
+            partition["files"].append(file_name)
+        partition["rows"][file_name] = len(records)
+        partition["block_ranges"] = merge_range(partition["block_ranges"], from_block, to_block)
+        written.append(os.path.join(key, file_name))
+    return written
+
+
+# Take [from_block, to_block] out of the source's other files once written holds the new scan of it:
+# files inside the range are dropped, files reaching past it are rewritten with the rows outside it
+def replace_range(manifest, source, from_block, to_block, written):
+    import pyarrow.compute as pc
+
+    for key, file_name, (start, end) in source_files(manifest, source, from_block, to_block):
+        if os.path.join(key, file_name) in written:
+            continue
+        if from_block <= start and end <= to_block:
+            drop_file(manifest, key, file_name)
+            continue
+        path = os.path.join(STORE_DIR, key, file_name)
+        table = read_table(path)
+        blocks = table["block_number"]
+        table = table.filter(pc.or_(pc.less(blocks, from_block), pc.greater(blocks, to_block)))
+        if table.num_rows == 0:
+            drop_file(manifest, key, file_name)
+        else:
+            write_file(table, path)
+            manifest["partitions"][key]["rows"][file_name] = table.num_rows
+
+
+# Merge a source's files in settled date partitions into one file per partition, so the manifest (and
+# every walk over it) stays small however many chunks were stored. Files of a run are left alone.
+def compact(manifest, source):
+    import pyarrow as pa
+
+    cutoff = time.strftime("%Y-%m-%d", time.gmtime(time.time() - COMPACT_AFTER_DAYS * 24 * 60 * 60))
+    run_files = {path for run in manifest["runs"].values() for path in run["files"]}
+    for key, partition in sorted(manifest["partitions"].items()):
+        if key.split("/")[0][len("date="):] >= cutoff:
+            continue
+        files = [
+            (file_name, file_range(source, file_name)) for file_name in partition["files"]
+            if file_range(source, file_name) and os.path.join(key, file_name) not in run_files
+        ]
+        if len(files) < COMPACT_MIN_FILES:
+            continue
+        table = pa.concat_tables([read_table(os.path.join(STORE_DIR, key, file_name)) for file_name, _ in files])
+        file_name = f"part-{source}-{min(start for _, (start, _) in files)}-{max(end for _, (_, end) in files)}.parquet"
+        write_file(table, os.path.join(STORE_DIR, key, file_name))
+        for old_name, _ in files:
+            if old_name != file_name:
+                drop_file(manifest, key, old_name)
+        if file_name not in partition["files"]:
+            partition["files"].append(file_name)
+        partition["rows"][file_name] = table.num_rows
+        logging.info(f"Compacted {len(files)} {source} files in {key} into {file_name}")
+
+
+# Pick partition directories matching a date range (YYYY-MM-DD strings) and token list
+def select_partitions(manifest, start_date=None, end_date=None, tokens=None):
+    token_keys = {partition_key("", token).split("/")[1] for token in tokens} if tokens else None
+    selected = []
+    for key in manifest["partitions"]:
+        date_part, token_part = key.split("/")
+        date = date_part[len("date="):]
+        if start_date and date < start_date:
+            continue
+        if end_date and date > end_date:
+            continue
+        if token_keys is not None and token_part not in token_keys:
+            continue
+        selected.append(key)
+    return sorted(selected)
+
+
+def read_files(paths, columns=None, min_block=None):
+    import pandas as pd
+
+    if not paths:
+        return pd.DataFrame(columns=columns or [name for name, _ in SCHEMA_FIELDS])
+    read_columns = columns
+    if columns and min_block is not None and "block_number" not in columns:
+        read_columns = columns + ["block_number"]
+    frames = [read_table(os.path.join(STORE_DIR, path), read_columns).to_pandas() for path in paths]
+    df = pd.concat(frames, ignore_index=True)
+    if min_block is not None:
+        df = df[df["block_number"] >= min_block]
+    return (df[columns] if columns else df).reset_index(drop=True)
+
+
+# Read detections, loading only the partitions, files and columns the query needs
+def read_transfers(start_date=None, end_date=None, tokens=None, columns=None, sources=None, min_block=None):
+    manifest = load_manifest()
+    paths = [
+        os.path.join(key, file_name)
+        for key in select_partitions(manifest, start_date, end_date, tokens)
+        for file_name in manifest["partitions"][key]["files"]
+        if not sources or any(file_name.startswith(f"part-{source}-") for source in sources)
+    ]
+    return read_files(paths, columns, min_block)
+
+
+# Read the detections written by a source's most recent scan
+def read_latest_run(source, columns=None):
+    run = load_manifest()["runs"].get(source)
+    return read_files(run["files"] if run else [], columns)
+
+
+# Same rows as read_latest_run, as a list of dicts read with pyarrow alone (the poster never needs pandas)
+def read_latest_records(source, columns=None):
+    run = load_manifest()["runs"].get(source)
+    if not run or not run["files"]:
+        return []
+    records = []
+    for path in run["files"]:
+        records.extend(read_table(os.path.join(STORE_DIR, path), columns).to_pylist())
+    return records
+
+
+# Rows a source stored for blocks after after_block, oldest first, read with pyarrow alone. Unlike
+# read_latest_records this sees every stored chunk, e.g. each batch follow mode stores, so the poster
+# can keep after_block as a cursor.
+def read_records_after(source, after_block, columns=None):
+    import pyarrow.compute as pc
+
+    read_columns = columns if columns is None or "block_number" in columns else columns + ["block_number"]
+    records = []
+    for key, file_name, _ in source_files(load_manifest(), source, after_block + 1, sys.maxsize):
+        table = read_table(os.path.join(STORE_DIR, key, file_name), read_columns)
+        table = table.filter(pc.greater(table["block_number"], after_block))
+        records.extend(table.select(columns).to_pylist() if columns else table.to_pylist())
+    return sorted(records, key=lambda record: record.get("block_number", 0))
+
+
+# Block ranges covered for each partition, e.g. to spot gaps before a backfill
+def covered_ranges(start_date=None, end_date=None, tokens=None):
+    manifest = load_manifest()
+    return {key: manifest["partitions"][key]["block_ranges"] for key in select_partitions(manifest, start_date, end_date, tokens)}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import time
+
+STARTED = time.perf_counter()  # Taken before any other import so startup covers the whole entry point
+
+import os
+import sys
+import logging
+import argparse
+
+# Each subcommand imports its own modules, so e.g. `post` never loads web3 and `scan` never loads tweepy.
+# Cron can call `xdc-intel scan`, `xdc-intel usdc`, `xdc-intel post` in place of the individual scripts.
+
+
+# Seconds since the interpreter started, from /proc when available (covers Python's own startup),
+# else since this module was first executed
+def process_age():
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return time.perf_counter() - STARTED
+
+
+# Log how long the command took to get ready for its first RPC or API call
+def report_startup(command, log):
+    import metrics
+
+    startup = process_age()
+    metrics.observe("startup_seconds", startup, command=command)
+    log(f"Startup took {startup:.2f}s ({command})")
+
+
+def run_scan(args):
+    import track_large_token_movements as scanner
+
+    scanner.setup_logging()
+    if not scanner.check_config():
+        return 1
+    report_startup("scan", logging.info)
+    try:
+        if args.follow:
+            scanner.follow_chain()
+        else:
+            scanner.process_transactions()
+    except Exception as e:
+        logging.error(f"Script failed: {str(e)}")
+        raise
+    return 0
+
+
+def run_usdc(args):
+    import track_usdc_bridge_transfers as tracker
+
+    report_startup("usdc", tracker.log_message)
+    try:
+        tracker.main()
+    except Exception as e:
+        tracker.log_message(f"Error in main: {str(e)}")
+        raise
+    return 0
+
+
+def run_post(args):
+    import post_to_x
+
+    report_startup("post", post_to_x.log_message)
+    try:
+        post_to_x.post_to_twitter()
+    except Exception as e:
+        post_to_x.log_message(f"Error in post_to_twitter: {str(e)}")
+        raise
+    return 0
+
+
+def run_backfill(args):
+    import backfill
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+    report_startup("backfill", logging.info)
+    backfill.main(args.backfill_args)
+    return 0
+
+
+# Answer summary questions from the hourly/daily rollups, e.g. `xdc-intel rollups --top senders --token XDC --days 30`
+def run_rollups(args):
+    from datetime import datetime, timedelta
+    import rollups
+    import labels
+
+    if args.rebuild:
+        logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+        print(f"Rebuilt rollups from {rollups.rebuild_from_store()} stored files")
+    end = datetime.utcnow()
+    start = end - timedelta(days=args.days)
+    if args.volume:
+        volume = rollups.token_volume(args.volume, start, end)
+        print(
+            f"{args.volume} over {args.days} days: {volume['count']} transfers, {volume['value']:,.2f} {args.volume} "
+            f"(${volume['value_usd']:,.2f}), largest ${volume['max_usd']:,.2f}"
+        )
+    if args.top:
+        direction = "out" if args.top == "senders" else "in"
+        print(f"Top {args.limit} {args.top} of {args.token or 'all tokens'} over {args.days} days:")
+        for address, count, value, value_usd in rollups.top_addresses(start, end, direction, args.token, args.limit):
+            label = labels.lookup(address)
+            print(f"  {address}  {count:>5} transfers  {value:>20,.2f}  ${value_usd:,.2f}" + (f"  {label[0]} ({label[1]})" if label else ""))
+    if args.net_flow:
+        print(f"Net flow into {args.net_flow} over {args.days} days:")
+        for token, flow in sorted(rollups.net_flow(args.net_flow, start, end, args.token).items()):
+            print(f"  {token}: in ${flow['in_usd']:,.2f}, out ${flow['out_usd']:,.2f}, net ${flow['net_usd']:,.2f} ({flow['net_value']:,.2f} {token})")
+    return 0
+
+
+# Build the address label index from the label lists (only changed lists are recompiled) and look addresses up,
+# e.g. `xdc-intel labels --build 0x...`
+def run_labels(args):
+    import labels
+
+    if args.build or args.force:
+        logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+        labels.build_index(force=args.force)
+    for address in args.addresses:
+        label = labels.lookup(address)
+        print(f"{address}  {f'{label[0]} ({label[1]})' if label else '-'}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="xdc-intel", description="XDC intel scanners and poster")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan", help="Scan new blocks for large transfers")
+    scan.add_argument("--follow", action="store_true", help="Keep running and scan blocks as they are produced")
+    scan.set_defaults(run=run_scan)
+    commands.add_parser("usdc", help="Scan USDC.e bridge transfers").set_defaults(run=run_usdc)
+    commands.add_parser("post", help="Post the latest detections to X").set_defaults(run=run_post)
+    rollups = commands.add_parser("rollups", help="Query transfer rollups (volume, top addresses, net flow)")
+    rollups.add_argument("--rebuild", action="store_true", help="Rebuild the rollups from the transfer store first")
+    rollups.add_argument("--volume", metavar="TOKEN", help="Total volume of a token")
+    rollups.add_argument("--top", choices=("senders", "receivers"), help="Largest senders or receivers by USD")
+    rollups.add_argument("--net-flow", metavar="ADDRESS", help="Net flow into an address per token")
+    rollups.add_argument("--token", help="Limit --top / --net-flow to one token")
+    rollups.add_argument("--days", type=float, default=7, help="Look back this many days (default 7)")
+    rollups.add_argument("--limit", type=int, default=20)
+    rollups.set_defaults(run=run_rollups)
+    labels = commands.add_parser("labels", help="Build the address label index or look addresses up")
+    labels.add_argument("--build", action="store_true", help="Rebuild the index from the label lists that changed")
+    labels.add_argument("--force", action="store_true", help="Recompile every label list")
+    labels.add_argument("addresses", nargs="*", help="Addresses to look up")
+    labels.set_defaults(run=run_labels)
+    backfill = commands.add_parser("backfill", help="Rebuild detections for a block range (see `backfill --help`)", add_help=False)
+    backfill.set_defaults(run=run_backfill)
+    # Everything after `backfill` is passed through to backfill.py's own parser
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "backfill":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.backfill_args = extra
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The scripts are plain modules that derive their cache and output paths from HOME when imported,
+# so HOME points at a scratch directory before any test imports them
+os.environ["HOME"] = tempfile.mkdtemp(prefix="xdc-intel-tests-")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+
+# A stub JSON-RPC node (and CMC quotes API) on a local port: yields (url, chain)
+@pytest.fixture
+def stub_node():
+    import stub_rpc_node
+
+    server, chain = stub_rpc_node.serve()
+    yield f"http://127.0.0.1:{server.server_port}", chain
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,45 @@
+import time
+import pytest
+import async_scanner
+import stub_rpc_node
+
+
+@pytest.fixture
+def rate_limited_node():
+    server, chain = stub_rpc_node.serve(rate_limit_ratio=1, retry_after=0.3)
+    yield f"http://127.0.0.1:{server.server_port}", chain
+    server.shutdown()
+    server.server_close()
+
+
+def test_blocks_are_fetched_with_transactions_only_when_asked(stub_node):
+    url, _ = stub_node
+    full = async_scanner.fetch_blocks([url], [10, 11])
+    hashes_only = async_scanner.fetch_blocks([url], [10, 11], full_transactions=False)
+    assert len(full[10]["transactions"]) == 1
+    assert hashes_only[10]["transactions"] == [] and hashes_only[11]["number"] == 11
+
+
+def test_rate_limited_endpoint_waits_out_retry_after(rate_limited_node, monkeypatch):
+    url, chain = rate_limited_node
+    monkeypatch.setattr(async_scanner, "ENDPOINT_CONCURRENCY", 1)
+    monkeypatch.setattr(async_scanner, "RETRY_BACKOFF", 0)
+    start = time.monotonic()
+    results, errors = async_scanner.run_calls([url], [("eth_blockNumber", [])])
+
+    # Every attempt was answered 429, and each retry waited for the node's Retry-After first
+    assert results == [None] and errors[0]
+    assert chain.http["rate_limited"] == async_scanner.MAX_ATTEMPTS
+    assert time.monotonic() - start >= 0.3 * (async_scanner.MAX_ATTEMPTS - 1)
+
+
+def test_token_bucket_halves_its_rate_after_a_rate_limit():
+    bucket = async_scanner.TokenBucket(4)
+    bucket.slow_down(0)
+    bucket.slow_down(0)
+    assert bucket.rate == 1
+    bucket.speed_up()
+    assert bucket.rate == pytest.approx(1.1)
+    for _ in range(100):
+        bucket.slow_down(0)
+    assert bucket.rate == async_scanner.MIN_RATE
@@ -0,0 +1,30 @@
+import backfill
+import price_history
+import price_service
+import transfer_store
+import track_large_token_movements as scanner
+
+
+def test_large_shard_skips_and_reports_failed_blocks(stub_node, monkeypatch):
+    url, _ = stub_node
+    monkeypatch.setenv("CMC_API_KEY", "test")
+    monkeypatch.setattr(scanner, "XDC_RPC_URLS", [url])
+    monkeypatch.setattr(price_service, "CMC_API_URL", f"{url}/v1/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+    stored = []
+    monkeypatch.setattr(transfer_store, "append_detections", lambda rows, from_block, to_block, *args, **kwargs: stored.append((from_block, to_block, len(rows))))
+
+    # Blocks 915 to 924 fail, as if every RPC was down for them
+    def scan_batch(rpc_pool, w3, from_block, to_block, xdc_price):
+        failed = [block for block in range(915, 925) if from_block <= block <= to_block]
+        rows = [{"tx_hash": f"0x{block:064x}", "block_number": block} for block in range(from_block, to_block + 1, 10) if block not in failed]
+        return rows, xdc_price, failed
+
+    monkeypatch.setattr(scanner, "scan_batch", scan_batch)
+    summary = backfill.scan_large_shard(0, 900, 999)
+
+    assert summary["failed_ranges"] == [(915, 924)]
+    assert summary["detections"] == 9
+    assert all(to_block < 915 or from_block > 924 for from_block, to_block, _ in stored)
+    assert sum(rows for _, _, rows in stored) == 9
+    assert (900, 914) in [(from_block, to_block) for from_block, to_block, _ in stored]
@@ -0,0 +1,59 @@
+import glob
+import os
+import pytest
+import checkpoint
+import detectors
+import price_history
+import price_service
+import transfer_store
+import track_large_token_movements as scanner
+import track_usdc_bridge_transfers as tracker
+
+
+@pytest.fixture
+def bridge_scanner(stub_node, tmp_path, monkeypatch):
+    url, _ = stub_node
+    monkeypatch.setenv("CMC_API_KEY", "test")
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(scanner, "XDC_RPC_URLS", [url])
+    monkeypatch.setattr(scanner, "LAST_BLOCK_FILE", str(tmp_path / "last_block.txt"))
+    monkeypatch.setattr(scanner, "OUTPUT_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(scanner, "BLOCKS_PER_HOUR", 20)
+    monkeypatch.setattr(scanner, "BACKLOG_TIME_BUDGET", 0)
+    monkeypatch.setattr(price_service, "CMC_API_URL", f"{url}/v1/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+    monkeypatch.setattr(transfer_store, "record_run", lambda *args: None)
+    # Only the bridge detector, so the stub's logs all come from the watched USDC.e contract
+    active_detectors = detectors.load_detectors(["bridge_watchlist"], scanner.MIN_USD_VALUE)
+    monkeypatch.setattr(scanner, "active_detectors", active_detectors)
+    monkeypatch.setattr(scanner, "query_plan", detectors.build_query_plan(active_detectors))
+    monkeypatch.setattr(scanner, "DETECTION_SOURCES", sorted({detector.source for detector in active_detectors}))
+    stored = []
+    monkeypatch.setattr(transfer_store, "append_detections", lambda rows, from_block, to_block, sources, *args, **kwargs: stored.append((sources, rows)))
+    with open(tmp_path / "last_block.txt", "w") as f:
+        f.write("979")
+    return tmp_path, stored
+
+
+def test_bridge_detector_stores_and_exports_usdc_bridge_rows(bridge_scanner):
+    tmp_path, stored = bridge_scanner
+    scanner.process_transactions()
+
+    # The rows land under the source the poster reads, and in the bridge tracker's CSV export
+    rows = [row for _, chunk in stored for row in chunk]
+    assert rows and {row["source"] for row in rows} == {"usdc_bridge"}
+    assert all(sources == ["usdc_bridge"] for sources, _ in stored)
+    assert glob.glob(os.path.join(tmp_path, "data", "usdc_bridge_transfers_*.csv"))
+    assert not glob.glob(os.path.join(tmp_path, "data", "large_transfers_*.csv"))
+
+
+def test_tracker_skips_its_scan_while_the_large_scanner_covers_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracker, "LOG_FILE", tmp_path / "usdc.log")
+    monkeypatch.setattr(tracker, "rpc_call", lambda call: pytest.fail("the tracker scanned"))
+    monkeypatch.delenv("DETECTORS", raising=False)
+    tracker.main()
+
+    monkeypatch.setenv("DETECTORS", "native,erc20")
+    assert not tracker.covered_by_large_scanner()
+    monkeypatch.setenv("DETECTORS", "native,usdc_bridge")
+    assert tracker.covered_by_large_scanner()
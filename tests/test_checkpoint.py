@@ -0,0 +1,84 @@
+import pytest
+import checkpoint
+import price_history
+import price_service
+import transfer_store
+import track_large_token_movements as scanner
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    chunks = []
+    monkeypatch.setattr(transfer_store, "append_detections", lambda rows, from_block, to_block, *args, **kwargs: chunks.append((from_block, to_block, len(rows))))
+    return chunks
+
+
+def test_failed_backlog_chunk_stays_queued(stored):
+    checkpoint.queue_backlog("test", 100, 199)
+    drained = checkpoint.drain_backlog("test", lambda from_block, to_block: None if from_block >= 150 else [], 60, 50)
+    assert drained == [(100, 149, 0)]
+    assert checkpoint.load_backlog("test") == [[150, 199]]
+
+
+def test_partially_scanned_backlog_chunk_is_not_stored(stored, monkeypatch):
+    def scan_batch(rpc_pool, w3, from_block, to_block, xdc_price):
+        return [{"tx_hash": f"0x{from_block}"}], xdc_price, [120] if from_block <= 120 <= to_block else []
+
+    monkeypatch.setattr(scanner, "scan_batch", scan_batch)
+    assert scanner.scan_backlog_chunk(None, None, 100, 199, 0.05) is None
+    assert scanner.scan_backlog_chunk(None, None, 200, 299, 0.05) == [{"tx_hash": "0x200"}, {"tx_hash": "0x250"}]
+    assert stored == [(200, 299, 2)]
+
+    monkeypatch.setattr(scanner, "scan_batch", lambda *args: 1 / 0)
+    assert scanner.scan_backlog_chunk(None, None, 300, 399, 0.05) is None
+    assert stored == [(200, 299, 2)]
+
+
+@pytest.fixture
+def run_env(stub_node, tmp_path, monkeypatch):
+    url, _ = stub_node
+    monkeypatch.setenv("CMC_API_KEY", "test")
+    monkeypatch.setattr(scanner, "XDC_RPC_URLS", [url])
+    monkeypatch.setattr(scanner, "LAST_BLOCK_FILE", str(tmp_path / "last_block.txt"))
+    monkeypatch.setattr(scanner, "OUTPUT_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(scanner, "BLOCKS_PER_HOUR", 20)
+    monkeypatch.setattr(scanner, "BACKLOG_TIME_BUDGET", 0)
+    monkeypatch.setattr(price_service, "CMC_API_URL", f"{url}/v1/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+    monkeypatch.setattr(transfer_store, "record_run", lambda *args: None)
+    return tmp_path
+
+
+def test_resumed_run_stores_pending_results_up_to_their_own_block(stored, run_env):
+    # An interrupted run committed blocks up to 150, flushing up to 120; the head has since moved to 1000
+    pending = [{"tx_hash": "0xpending", "block_number": 140, "source": scanner.CHECKPOINT_NAME}]
+    checkpoint.begin_run(scanner.CHECKPOINT_NAME, 100, 200, 150, pending, 120)
+    scanner.process_transactions()
+
+    # The pending results are stored as blocks 121 to 150; the blocks after them are queued, not claimed
+    assert stored[0] == (121, 150, 1)
+    assert all(to_block < 151 or from_block > 979 for from_block, to_block, _ in stored)
+    assert checkpoint.load_backlog(scanner.CHECKPOINT_NAME) == [[151, 979]]
+    assert stored[-1][1] == 1000
+
+
+def test_blocks_a_batch_could_not_scan_go_to_the_backlog(stored, run_env, monkeypatch):
+    scan_batch = scanner.scan_batch
+
+    # Blocks 985 to 987 fail as if every RPC was down for them
+    def failing_scan_batch(rpc_pool, w3, from_block, to_block, xdc_price):
+        rows, xdc_price, failed_blocks = scan_batch(rpc_pool, w3, from_block, to_block, xdc_price)
+        failed = [block for block in range(985, 988) if from_block <= block <= to_block]
+        return [row for row in rows if row["block_number"] not in failed], xdc_price, sorted(set(failed_blocks) | set(failed))
+
+    monkeypatch.setattr(scanner, "scan_batch", failing_scan_batch)
+    with open(run_env / "last_block.txt", "w") as f:
+        f.write("979")
+    scanner.process_transactions()
+
+    # The run moves on, but the failed blocks are queued and no stored chunk covers them
+    assert open(run_env / "last_block.txt").read().strip() == "1000"
+    assert checkpoint.load_backlog(scanner.CHECKPOINT_NAME) == [[985, 987]]
+    assert all(to_block < 985 or from_block > 987 for from_block, to_block, _ in stored)
+    assert (980, 984) in [(from_block, to_block) for from_block, to_block, _ in stored]
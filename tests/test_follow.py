@@ -0,0 +1,76 @@
+import os
+import csv
+import glob
+import time
+import pytest
+import checkpoint
+import price_history
+import price_service
+import track_large_token_movements as scanner
+
+CONFIRMATIONS = 5
+
+
+@pytest.fixture
+def follow_env(stub_node, tmp_path, monkeypatch):
+    url, chain = stub_node
+    monkeypatch.setenv("CMC_API_KEY", "test")
+    monkeypatch.setattr(scanner, "XDC_RPC_URLS", [url])
+    monkeypatch.setattr(scanner, "LAST_BLOCK_FILE", str(tmp_path / "last_block.txt"))
+    monkeypatch.setattr(scanner, "OUTPUT_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(scanner, "METRICS_PORT", 0)
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(price_service, "CMC_API_URL", f"{url}/v1/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+    # The head advances four blocks a second while the scanner follows it
+    chain.block_time = 0.25
+    chain.started = time.time()
+
+    scanned = []
+    scan_batch = scanner.scan_batch
+
+    def recording_scan_batch(rpc_pool, w3, from_block, to_block, xdc_price):
+        scanned.append((from_block, to_block, chain.head()))
+        return scan_batch(rpc_pool, w3, from_block, to_block, xdc_price)
+
+    monkeypatch.setattr(scanner, "scan_batch", recording_scan_batch)
+    return chain, scanned, tmp_path
+
+
+def test_follow_scans_new_blocks_behind_the_head(follow_env):
+    chain, scanned, tmp_path = follow_env
+    first_head = chain.head()
+    scanner.follow_chain(confirmations=CONFIRMATIONS, poll_interval=0.5, max_runtime=5)
+
+    # Every batch stays the confirmation depth behind the head, and batches are contiguous
+    assert scanned
+    for from_block, to_block, head in scanned:
+        assert to_block <= head - CONFIRMATIONS
+    assert all(previous[1] + 1 == current[0] for previous, current in zip(scanned, scanned[1:]))
+    assert scanned[0][0] >= first_head - CONFIRMATIONS
+
+    # Blocks produced while following were picked up, and the progress marker matches the last batch
+    last_block = int(open(tmp_path / "last_block.txt").read())
+    assert last_block == scanned[-1][1]
+    assert last_block >= first_head - CONFIRMATIONS + 10
+
+    # One export for the whole session, holding the stub's 1M XDC transfer of every 10th block scanned
+    exports = glob.glob(os.path.join(tmp_path, "data", "large_transfers_*.csv"))
+    assert len(exports) == 1
+    with open(exports[0], newline="") as f:
+        native_blocks = sorted(int(row["block_number"]) for row in csv.DictReader(f) if row["token_symbol"] == "XDC")
+    assert native_blocks == [block for block in range(scanned[0][0], last_block + 1) if block % 10 == 0]
+    assert not glob.glob(os.path.join(tmp_path, "data", "*.tmp"))
+
+
+# Ranges queued as backlog are scanned between polls once follow mode has caught up with the head
+def test_follow_drains_backlog_between_polls(follow_env, monkeypatch):
+    chain, scanned, tmp_path = follow_env
+    monkeypatch.setattr(scanner, "FOLLOW_BACKLOG_BUDGET", 30)
+    backlog_from, backlog_to = chain.head() - 400, chain.head() - 301
+    checkpoint.queue_backlog(scanner.CHECKPOINT_NAME, backlog_from, backlog_to)
+    scanner.follow_chain(confirmations=CONFIRMATIONS, poll_interval=0.5, max_runtime=4)
+
+    assert checkpoint.load_backlog(scanner.CHECKPOINT_NAME) == []
+    backlog_batches = [(from_block, to_block) for from_block, to_block, _ in scanned if to_block <= backlog_to]
+    assert backlog_batches[0][0] == backlog_from and backlog_batches[-1][1] == backlog_to
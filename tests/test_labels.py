@@ -0,0 +1,84 @@
+import os
+import pytest
+import labels
+
+LOWEST = "0x" + "00" * 20
+HIGHEST = "0x" + "ff" * 20
+BINANCE = "0x" + "ab" * 20
+
+
+@pytest.fixture
+def label_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(labels, "LABELS_DIR", str(tmp_path / "labels"))
+    monkeypatch.setattr(labels, "INDEX_FILE", str(tmp_path / "labels.idx"))
+    monkeypatch.setattr(labels, "SEGMENT_DIR", str(tmp_path / "labels.segments"))
+    monkeypatch.setattr(labels, "SEGMENT_MANIFEST", str(tmp_path / "labels.segments" / "manifest.json"))
+    monkeypatch.setattr(labels, "_index", None)
+    monkeypatch.setattr(labels, "_index_stat", None)
+    os.makedirs(tmp_path / "labels")
+    return tmp_path / "labels"
+
+
+def write_list(path, rows, mtime=None):
+    with open(path, "w") as f:
+        f.write("address,label,category\n")
+        for row in rows:
+            f.write(",".join(row) + "\n")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_lookup_hits_misses_and_prefix_boundaries(label_dir):
+    write_list(label_dir / "exchanges.csv", [
+        (LOWEST, "Zero address", "burn"),
+        (HIGHEST, "Max address", ""),
+        (BINANCE.upper().replace("0X", "xdc"), "Binance hot wallet", "exchange"),
+        ("0x" + "00" * 19 + "01", "Right after zero", "test"),
+        ("0x" + "ff" * 19 + "fe", "Right before max", "test"),
+        ("not-an-address", "Skipped", ""),
+    ])
+    assert labels.build_index() == 5
+
+    assert labels.lookup(LOWEST) == ("Zero address", "burn")
+    assert labels.lookup(HIGHEST) == ("Max address", "exchanges")
+    assert labels.lookup("0x" + "00" * 19 + "01") == ("Right after zero", "test")
+    assert labels.lookup("0x" + "ff" * 19 + "fe") == ("Right before max", "test")
+    assert labels.lookup("xdc" + "AB" * 20) == ("Binance hot wallet", "exchange")
+    assert labels.lookup("0x" + "00" * 19 + "02") is None
+    assert labels.lookup("0x" + "ff" * 19 + "fd") is None
+    assert labels.lookup("0x" + "ab" * 19 + "ac") is None
+    assert labels.lookup("0x1234") is None
+
+    rows = [{"from": BINANCE, "to": "0x" + "12" * 20}, {"from": None, "to": None}]
+    assert labels.enrich(rows) == 1
+    assert (rows[0]["from_label"], rows[0]["to_label"]) == ("Binance hot wallet", None)
+
+
+def test_list_whose_name_sorts_last_overrides(label_dir):
+    write_list(label_dir / "10-exchanges.csv", [(BINANCE, "Binance", "exchange"), (LOWEST, "Zero address", "burn")])
+    write_list(label_dir / "99-manual.csv", [(BINANCE, "Binance cold wallet", "exchange")])
+    write_list(label_dir / "50-whales.csv", [(BINANCE, "Whale", "whale")])
+    assert labels.build_index() == 2
+    assert labels.lookup(BINANCE) == ("Binance cold wallet", "exchange")
+    assert labels.lookup(LOWEST) == ("Zero address", "burn")
+
+
+def test_rebuild_recompiles_only_the_changed_list(label_dir, monkeypatch):
+    write_list(label_dir / "exchanges.csv", [(BINANCE, "Binance", "exchange")], mtime=1_000_000_000)
+    write_list(label_dir / "whales.csv", [(HIGHEST, "Whale", "whale")], mtime=1_000_000_000)
+    assert labels.build_index() == 2
+    assert labels.build_index() is None
+
+    compiled = []
+    compile_list = labels.compile_list
+    monkeypatch.setattr(labels, "compile_list", lambda source_path, segment_path: compiled.append(os.path.basename(source_path)) or compile_list(source_path, segment_path))
+    write_list(label_dir / "whales.csv", [(HIGHEST, "Big whale", "whale"), (LOWEST, "Zero address", "burn")], mtime=2_000_000_000)
+    assert labels.build_index() == 3
+    assert compiled == ["whales.csv"]
+    # The mapped index is reopened once the rebuild replaced the file
+    assert labels.lookup(HIGHEST) == ("Big whale", "whale")
+    assert labels.lookup(BINANCE) == ("Binance", "exchange")
+
+    os.remove(label_dir / "whales.csv")
+    assert labels.build_index() == 1
+    assert labels.lookup(HIGHEST) is None
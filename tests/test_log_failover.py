@@ -0,0 +1,60 @@
+import requests
+import track_large_token_movements as scanner
+
+
+class Endpoint:
+    def __init__(self, url, error=None):
+        self.url = url
+        self.w3 = self
+        self.error = error
+
+
+# Stands in for the RPC pool: tries the endpoints in order and records their failures
+class Pool:
+    def __init__(self, *endpoints):
+        self.endpoints = list(endpoints)
+        self.failures = []
+
+    def ranked(self):
+        return self.endpoints
+
+    def wait_for(self, endpoint):
+        pass
+
+    def record_failure(self, endpoint, error):
+        self.failures.append(endpoint.url)
+
+    def record_success(self, endpoint, seconds):
+        pass
+
+
+def fake_get_logs(endpoint, filter_params):
+    if endpoint.error:
+        raise endpoint.error
+    return [{"blockNumber": filter_params["fromBlock"]}]
+
+
+def test_timeout_fails_over_to_the_next_endpoint(monkeypatch):
+    monkeypatch.setattr(scanner, "get_logs", fake_get_logs)
+    pool = Pool(Endpoint("a", requests.exceptions.ReadTimeout("Read timed out")), Endpoint("b"))
+    logs, range_too_large = scanner.query_transfer_logs(pool, 10, 20)
+    assert logs == [{"blockNumber": 10}] and not range_too_large
+    assert pool.failures == ["a"]
+
+
+def test_range_refused_by_one_endpoint_is_tried_on_the_next(monkeypatch):
+    monkeypatch.setattr(scanner, "get_logs", fake_get_logs)
+    pool = Pool(Endpoint("a", ValueError("query returned more than 10000 results")), Endpoint("b"))
+    logs, range_too_large = scanner.query_transfer_logs(pool, 10, 20)
+    assert logs == [{"blockNumber": 10}] and not range_too_large
+    assert pool.failures == []
+
+
+def test_window_shrinks_only_after_every_endpoint_failed(monkeypatch):
+    monkeypatch.setattr(scanner, "get_logs", fake_get_logs)
+    refused = ValueError("block range is too wide")
+    pool = Pool(Endpoint("a", refused), Endpoint("b", ConnectionError("connection reset")))
+    assert scanner.query_transfer_logs(pool, 10, 20) == (None, True)
+    assert scanner.query_transfer_logs(pool, 10, 10) == (None, False)
+    pool = Pool(Endpoint("a", ConnectionError("connection reset")), Endpoint("b", requests.exceptions.ReadTimeout("Read timed out")))
+    assert scanner.query_transfer_logs(pool, 10, 20) == (None, False)
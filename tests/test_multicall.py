@@ -0,0 +1,73 @@
+import pytest
+import multicall
+import stub_rpc_node
+from stub_rpc_node import REVERTING_CONTRACT, STUB_TOKEN
+
+HOLDER = "0x" + "44" * 20
+CALLS = [
+    (STUB_TOKEN, "symbol", ()),
+    (STUB_TOKEN, "decimals", ()),
+    (STUB_TOKEN, "balanceOf", (HOLDER,)),
+    (REVERTING_CONTRACT, "symbol", ()),
+    (STUB_TOKEN, "decimals", ()),
+]
+EXPECTED = ["USDC", 6, 10 ** 12, None, 6]
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(multicall, "_multicall_missing", set())
+    monkeypatch.setattr(multicall, "stats", dict.fromkeys(multicall.stats, 0))
+
+
+@pytest.fixture
+def node_without_multicall():
+    server, chain = stub_rpc_node.serve(multicall=False)
+    yield f"http://127.0.0.1:{server.server_port}", chain
+    server.shutdown()
+    server.server_close()
+
+
+def test_encode_and_decode():
+    assert multicall.encode_call("balanceOf", (HOLDER,)) == "0x70a08231" + "00" * 12 + "44" * 20
+    assert multicall.decode_result("decimals", "0x" + "00" * 31 + "12") == 18
+    assert multicall.decode_result("symbol", stub_rpc_node.encode_string("USDC")) == "USDC"
+    assert multicall.decode_result("symbol", "0x") is None
+    assert multicall.decode_result("symbol", "0x" + "00" * 3) is None
+
+
+def test_reads_go_out_as_one_aggregate3_call(stub_node):
+    url, chain = stub_node
+    results, errors = multicall.read(url, CALLS)
+
+    # The reverting target answers None without failing the reads after it
+    assert results == EXPECTED
+    assert errors == [None] * len(CALLS)
+    assert chain.calls == {"eth_call": 1}
+    assert multicall.stats["multicall_requests"] == 1 and multicall.stats["reverted"] == 1
+
+
+def test_reads_are_chunked(stub_node, monkeypatch):
+    url, chain = stub_node
+    monkeypatch.setattr(multicall, "MULTICALL_CHUNK_SIZE", 2)
+    assert multicall.read(url, CALLS) == (EXPECTED, [None] * len(CALLS))
+    assert chain.calls == {"eth_call": 3}
+
+
+def test_chain_without_multicall_falls_back_to_batched_calls(node_without_multicall):
+    url, chain = node_without_multicall
+    assert multicall.read(url, CALLS) == (EXPECTED, [None] * len(CALLS))
+    assert url in multicall._multicall_missing
+
+    # The missing contract is remembered, so later reads skip the aggregate3 probe
+    chain.reset_counters()
+    assert multicall.read(url, CALLS[:1]) == (["USDC"], [None])
+    assert chain.calls == {"eth_call": 1}
+    assert multicall.stats["multicall_requests"] == 1 and multicall.stats["batched_requests"] == 2
+
+
+def test_node_errors_are_not_mistaken_for_reverts():
+    assert multicall.is_revert({"code": 3, "message": "execution reverted"})
+    assert multicall.is_revert({"code": -32000, "message": "invalid opcode: INVALID"})
+    assert not multicall.is_revert({"code": -32000, "message": "header not found"})
+    assert not multicall.is_revert("Read timed out")
@@ -0,0 +1,50 @@
+import time
+import pytest
+import outbox
+
+
+@pytest.fixture(autouse=True)
+def outbox_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_FILE", str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "_connection", None)
+
+
+def transfer(tx_hash, log_index=-1, source="large_transfers"):
+    return {"source": source, "tx_hash": tx_hash, "log_index": log_index, "block_number": 100}
+
+
+def test_transfers_are_queued_and_posted_once():
+    assert outbox.enqueue([transfer("0xAB"), transfer("ab"), transfer("0xab", 2), transfer("0xab", source="usdc_bridge")]) == 3
+    assert [key for key, _ in outbox.pending()] == ["large_transfers:0xab:-1", "large_transfers:0xab:2", "usdc_bridge:0xab:-1"]
+
+    outbox.mark_posted(["large_transfers:0xab:-1"], 12345)
+    assert outbox.enqueue([transfer("0xab")]) == 0
+    assert outbox.counts() == {"pending": 2, "posted": 1}
+
+
+def test_failed_posts_are_retried_with_backoff_then_dropped(monkeypatch):
+    outbox.enqueue([transfer("0xab")])
+    key = "large_transfers:0xab:-1"
+    now = time.time()
+    outbox.mark_failed(key, "connection reset")
+    assert outbox.pending() == []
+    next_attempt_at, last_error = outbox.get_connection().execute("SELECT next_attempt_at, last_error FROM outbox").fetchone()
+    assert next_attempt_at >= now + outbox.RETRY_BASE and last_error == "connection reset"
+
+    # Due again once the delay has passed
+    monkeypatch.setattr(outbox.time, "time", lambda: now + outbox.RETRY_BASE + 1)
+    assert [key for key, _ in outbox.pending()] == [key]
+
+    for _ in range(outbox.MAX_ATTEMPTS - 1):
+        outbox.mark_failed(key, "connection reset")
+    assert outbox.counts() == {"pending": 0, "dropped": 1}
+    assert outbox.enqueue([transfer("0xab")]) == 0
+
+
+def test_transfers_waiting_too_long_expire():
+    outbox.enqueue([transfer("0xab"), transfer("0xcd")])
+    outbox.get_connection().execute("UPDATE outbox SET queued_at = ? WHERE key LIKE '%0xab%'", (time.time() - outbox.MAX_PENDING_AGE - 1,))
+    assert outbox.expire() == 1
+    assert [key for key, _ in outbox.pending()] == ["large_transfers:0xcd:-1"]
+    assert outbox.counts() == {"pending": 1, "expired": 1}
+    assert outbox.enqueue([transfer("0xab")]) == 0
@@ -0,0 +1,153 @@
+import pytest
+import outbox
+import post_to_x
+import rollups
+import transfer_store
+
+
+@pytest.fixture
+def poster(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(transfer_store, "MANIFEST_FILE", str(tmp_path / "store" / "manifest.json"))
+    monkeypatch.setattr(rollups, "merge", lambda *args: None)
+    monkeypatch.setattr(outbox, "OUTBOX_FILE", str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(outbox, "_connection", None)
+    monkeypatch.setattr(post_to_x, "LOG_FILE", tmp_path / "scan.log")
+    return tmp_path
+
+
+def detection(block_number, log_index=-1):
+    return {
+        "tx_hash": f"0x{block_number:064x}",
+        "log_index": log_index,
+        "from": "0xfrom",
+        "to": "0xto",
+        "value_xdc": 1000000.0,
+        "value_usd": 50000.0,
+        "token_symbol": "XDC",
+        "block_number": block_number,
+        "timestamp": "2023-11-14 22:13:20",
+    }
+
+
+def pending_blocks():
+    return sorted(transfer["block_number"] for _, transfer in outbox.pending("large_transfers"))
+
+
+def test_poster_queues_every_batch_stored_since_its_cursor(poster):
+    # A cron run records its run; the poster starts from it
+    transfer_store.append_transfers("large_transfers", [detection(100)], 100, 149)
+    post_to_x.queue_new_transfers()
+    assert pending_blocks() == [100]
+    assert outbox.get_cursor("large_transfers") == 100
+
+    # Follow mode then stores batch after batch without replacing the latest run
+    for start in (150, 200, 250):
+        transfer_store.append_transfers("large_transfers", [detection(start + 5)], start, start + 49, latest=False)
+    post_to_x.queue_new_transfers()
+    assert pending_blocks() == [100, 155, 205, 255]
+    assert outbox.get_cursor("large_transfers") == 255
+
+    # Nothing new stored: nothing queued, and the cursor stays put
+    post_to_x.queue_new_transfers()
+    assert pending_blocks() == [100, 155, 205, 255]
+    assert outbox.get_cursor("large_transfers") == 255
+
+
+# Stands in for time.monotonic/time.sleep, so rate-limit waits take no real time
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(round(seconds, 3))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(post_to_x.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(post_to_x.time, "sleep", clock.sleep)
+    return clock
+
+
+def rate_limited(headers):
+    import requests
+    import tweepy
+
+    response = requests.Response()
+    response.status_code = 429
+    response.reason = "Too Many Requests"
+    response.headers.update(headers)
+    response._content = b'{"errors": [{"code": 88, "message": "Rate limit exceeded"}]}'
+    return tweepy.TooManyRequests(response)
+
+
+class Status:
+    def __init__(self, id):
+        self.id = id
+
+
+# Fake API client: update_status raises the queued errors first, then posts
+class FakeApi:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.posted = []
+
+    def update_status(self, text, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.posted.append(text)
+        return Status(len(self.posted))
+
+
+def test_token_bucket_spaces_posts_after_the_burst(clock):
+    api = FakeApi()
+    sender = post_to_x.PostSender(lambda: api, posts_per_hour=3600, burst=2, time_budget=60)
+    assert [sender.send(f"post {number}") for number in range(4)] == [1, 2, 3, 4]
+    assert clock.slept == [1.0, 1.0]
+
+    # A post the budget cannot wait for pauses posting instead
+    sender = post_to_x.PostSender(lambda: api, posts_per_hour=60, burst=1, time_budget=30)
+    sender.send("post")
+    with pytest.raises(post_to_x.PostingPaused):
+        sender.send("post")
+    assert sender.sent == 1
+
+
+def test_sender_waits_out_retry_after(clock):
+    api = FakeApi(rate_limited({"retry-after": "20"}), rate_limited({"x-rate-limit-reset": "0"}))
+    sender = post_to_x.PostSender(lambda: api, posts_per_hour=3600, burst=5, time_budget=60)
+    assert sender.send("post") == 1
+    assert clock.slept == [20.0, 1.0]
+
+    api = FakeApi(rate_limited({"retry-after": "900"}))
+    sender = post_to_x.PostSender(lambda: api, posts_per_hour=3600, burst=5, time_budget=60)
+    with pytest.raises(post_to_x.PostingPaused, match="X API rate limited"):
+        sender.send("post")
+    assert api.posted == []
+
+
+def test_failed_and_paused_posts_stay_in_the_outbox(poster, clock):
+    rows = [dict(detection(block), value=1000000.0, source="large_transfers") for block in (100, 200)]
+    outbox.enqueue(rows)
+
+    # The first post fails and is scheduled for a retry; the second goes out
+    api = FakeApi(RuntimeError("connection reset"))
+    post_to_x.post_individually(post_to_x.PostSender(lambda: api, time_budget=60), outbox.pending("large_transfers"))
+    assert len(api.posted) == 1
+    assert outbox.pending("large_transfers") == []
+    assert outbox.counts() == {"pending": 1, "posted": 1}
+
+    # A rate limit past the run's budget leaves the transfer queued, without counting a failed attempt
+    connection = outbox.get_connection()
+    connection.execute("UPDATE outbox SET next_attempt_at = 0")
+    api = FakeApi(rate_limited({"retry-after": "900"}))
+    with pytest.raises(post_to_x.PostingPaused):
+        post_to_x.post_individually(post_to_x.PostSender(lambda: api, time_budget=60), outbox.pending("large_transfers"))
+    assert connection.execute("SELECT attempts FROM outbox").fetchall() == [(1,)]
@@ -0,0 +1,77 @@
+import pytest
+import price_history
+
+HOUR = 3600
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def history(stub_node, tmp_path, monkeypatch):
+    url, _ = stub_node
+    clock = Clock(1792281600)
+    monkeypatch.setattr(price_history, "time", clock)
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_FILE", str(tmp_path / "price_history.db"))
+    monkeypatch.setattr(price_history, "PRICE_HISTORY", True)
+    monkeypatch.setattr(price_history, "_connection", None)
+    monkeypatch.setattr(price_history, "_coverage", {})
+    monkeypatch.setattr(price_history, "_series", {})
+    monkeypatch.setattr(price_history, "_retry_after", 0)
+    monkeypatch.setattr(price_history, "fetch_stats", {"requests": 0, "points": 0})
+    yield clock
+    price_history.get_connection().close()
+
+
+# Batches at the chain head, each a few seconds newer than the last, share one request
+def test_head_batches_make_one_request(history):
+    requests = 0
+    for _ in range(20):
+        history.now += 2
+        requests += price_history.ensure(["XDC", "USDC"], history.now - 100, history.now - 2)
+    assert requests == 1
+    assert price_history.fetch_stats["requests"] == 1
+
+
+# Following the head makes one more request per series step, not one per batch
+def test_head_requests_once_per_step(history):
+    requests = 0
+    for _ in range(3 * HOUR // 30):
+        history.now += 30
+        requests += price_history.ensure(["XDC"], history.now - 60, history.now)
+    assert requests <= 4
+
+
+# A month-long backfill walked shard by shard is filled by the first shard's request
+def test_backfill_range_fetched_once(history):
+    start = history.now - 30 * 24 * HOUR
+    requests = sum(
+        price_history.ensure(["XDC", "USDC"], shard_start, shard_start + 5 * HOUR)
+        for shard_start in range(start, history.now, 5 * HOUR)
+    )
+    assert requests == 1
+    times, prices = price_history.load_series("XDC")
+    assert len(times) >= 30 * 24
+    assert set(prices) == {0.05}
+
+
+# Only the part of a range not yet covered is fetched
+def test_earlier_range_fetches_only_the_gap(history):
+    assert price_history.ensure(["XDC"], history.now - 2 * 24 * HOUR, history.now) == 1
+    assert price_history.ensure(["XDC"], history.now - 3 * 24 * HOUR, history.now) == 1
+    assert price_history.ensure(["XDC"], history.now - 3 * 24 * HOUR, history.now) == 0
+    assert price_history.fetch_stats["points"] <= 2 * (3 * 24 + 3)
+
+
+def test_prices_at_interpolates_and_falls_back(history):
+    connection = price_history.get_connection()
+    with connection:
+        connection.executemany("INSERT INTO prices VALUES (?, ?, ?)", [("XDC", 1000, 1.0), ("XDC", 1000 + HOUR, 2.0)])
+    assert list(price_history.prices_at("XDC", [1000, 1000 + HOUR // 2, 1000 + HOUR])) == [1.0, 1.5, 2.0]
+    assert list(price_history.prices_at("UNKNOWN", [1000, 2000], current=3.0)) == [3.0, 3.0]
@@ -0,0 +1,84 @@
+import os
+import glob
+import json
+import time
+import threading
+import price_service
+
+
+def test_concurrent_saves_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_service, "PRICE_CACHE_FILE", str(tmp_path / "price_cache.json"))
+    monkeypatch.setattr(price_service, "_cache", {"XDC": {"price": 0.05, "timestamp": time.time()}})
+    errors = []
+
+    def save_repeatedly():
+        try:
+            for _ in range(100):
+                price_service.save_cache()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_repeatedly) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert json.load(open(tmp_path / "price_cache.json"))["XDC"]["price"] == 0.05
+    assert not glob.glob(os.path.join(tmp_path, "*.tmp"))
+
+
+def test_pick_coin_prefers_listed_id_then_rank():
+    coins = [{"id": 1, "cmc_rank": 5}, {"id": 2634, "cmc_rank": 90}]
+    assert price_service.pick_coin("XDC", coins)["id"] == 2634
+    assert price_service.pick_coin("XDC", [{"id": 1, "cmc_rank": 5}]) is None
+    assert price_service.pick_coin("FOO", [{"id": 7}, {"id": 5, "cmc_rank": 300}, {"id": 6, "cmc_rank": 20}])["id"] == 6
+    assert price_service.pick_coin("FOO", {"id": 3}) == {"id": 3}
+
+
+def use_cache(tmp_path, monkeypatch, cache):
+    monkeypatch.setattr(price_service, "PRICE_CACHE_FILE", str(tmp_path / "price_cache.json"))
+    monkeypatch.setattr(price_service, "_cache", cache)
+    monkeypatch.setattr(price_service, "_failed", {})
+    monkeypatch.setattr(price_service, "_refreshing", set())
+
+
+def test_lookups_serve_the_last_known_price_while_refreshing(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch, {"XDC": {"price": 0.05, "timestamp": time.time() - 3 * 24 * 60 * 60}})
+    release = threading.Event()
+    fetched = threading.Event()
+
+    def slow_fetch_quotes(symbols):
+        release.wait(5)
+        fetched.set()
+        return {symbol: 0.06 for symbol in symbols}
+
+    monkeypatch.setattr(price_service, "fetch_quotes", slow_fetch_quotes)
+    # An expired quote and a symbol never seen come back at once, as the last known price and 0
+    assert price_service.get_prices(["XDC", "FOO"]) == {"XDC": 0.05, "FOO": 0}
+    release.set()
+    assert fetched.wait(5)
+    deadline = time.time() + 5
+    while price_service._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert price_service.get_prices(["XDC", "FOO"]) == {"XDC": 0.06, "FOO": 0.06}
+
+
+def test_failed_fetches_are_not_retried_right_away(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch, {})
+    calls = []
+
+    def failing_fetch_quotes(symbols):
+        calls.append(symbols)
+        raise TimeoutError("Read timed out")
+
+    monkeypatch.setattr(price_service, "fetch_quotes", failing_fetch_quotes)
+    assert price_service.get_price("XDC") == 0
+    assert price_service.get_price("XDC") == 0
+    assert price_service.get_prices(["XDC"]) == {"XDC": 0}
+    assert calls == [["XDC"]]
+
+    # Once the retry delay has passed the symbol is fetched again
+    price_service._failed["XDC"] -= price_service.FAILED_FETCH_RETRY
+    assert price_service.get_price("XDC") == 0
+    assert len(calls) == 2
@@ -0,0 +1,68 @@
+import pytest
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+import detectors
+import price_history
+import price_service
+import track_large_token_movements as scanner
+from rpc_client import get_block_raw, get_logs_raw, hex_str
+
+BLOCKS = range(900, 1000)
+SCAN_BLOCKS = range(970, 1000)  # Per-block fetches are rate limited, so the scans cover fewer blocks
+
+
+@pytest.fixture
+def web3(stub_node):
+    url, _ = stub_node
+    w3 = Web3(Web3.HTTPProvider(url))
+    w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    return url, w3
+
+
+# The fields the detectors read from a block, in comparable form
+def tx_data(block):
+    return block["number"], block["timestamp"], [
+        (hex_str(tx["hash"]), Web3.to_checksum_address(tx["from"]), tx["to"] and Web3.to_checksum_address(tx["to"]), tx["value"])
+        for tx in block["transactions"]
+    ]
+
+
+def test_raw_blocks_match_web3(web3):
+    url, w3 = web3
+    for block_number in BLOCKS:
+        assert tx_data(get_block_raw(url, block_number)) == tx_data(w3.eth.get_block(block_number, full_transactions=True))
+
+
+def test_raw_logs_match_web3(web3):
+    url, w3 = web3
+    filter_params = {"fromBlock": BLOCKS[0], "toBlock": BLOCKS[-1], "topics": [detectors.TRANSFER_TOPIC]}
+    raw_logs = get_logs_raw(url, filter_params)
+    web3_logs = w3.eth.get_logs(filter_params)
+    assert raw_logs
+    assert [
+        (hex_str(log["transactionHash"]), log["address"].lower(), [hex_str(topic) for topic in log["topics"]], hex_str(log["data"]), log["blockNumber"], log["logIndex"])
+        for log in raw_logs
+    ] == [
+        (hex_str(log["transactionHash"]), log["address"].lower(), [hex_str(topic) for topic in log["topics"]], hex_str(log["data"]), log["blockNumber"], log["logIndex"])
+        for log in web3_logs
+    ]
+
+
+# The scanner finds the same detections through either path, with per-block fetches so every block goes through it
+@pytest.mark.parametrize("rpc_batch_size", [0, 100])
+def test_scan_batch_detections_match(stub_node, monkeypatch, rpc_batch_size):
+    url, _ = stub_node
+    monkeypatch.setenv("CMC_API_KEY", "test")
+    monkeypatch.setattr(scanner, "XDC_RPC_URLS", [url])
+    monkeypatch.setattr(scanner, "RPC_BATCH_SIZE", rpc_batch_size)
+    monkeypatch.setattr(price_service, "CMC_API_URL", f"{url}/v1/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(price_history, "CMC_HISTORY_URL", f"{url}/v2/cryptocurrency/quotes/historical")
+
+    detections = {}
+    for raw in (False, True):
+        monkeypatch.setattr(scanner, "RAW_RPC", raw)
+        rpc_pool = scanner.init_web3()
+        rows, _, _ = scanner.scan_batch(rpc_pool, rpc_pool.best().w3, SCAN_BLOCKS[0], SCAN_BLOCKS[-1], 0.05)
+        detections[raw] = sorted((row["source"], row["tx_hash"], row["log_index"], row["from"], row["to"], row["value_usd"]) for row in rows)
+    assert detections[False]
+    assert detections[True] == detections[False]
@@ -0,0 +1,49 @@
+import pytest
+import rollups
+
+
+@pytest.fixture
+def rollup_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_FILE", str(tmp_path / "rollups.db"))
+    monkeypatch.setattr(rollups, "_connection", None)
+    return tmp_path
+
+
+def record(block_number, log_index=0, value_usd=10000.0):
+    return {
+        "tx_hash": f"0x{block_number:064x}",
+        "log_index": log_index,
+        "token_symbol": "USDC.e",
+        "from": "0xFROM",
+        "to": "0xTO",
+        "value": value_usd,
+        "value_usd": value_usd,
+        "block_number": block_number,
+        "timestamp": "2023-11-14 22:13:20",
+    }
+
+
+def test_transfer_stored_under_several_sources_counts_once(rollup_db):
+    # The ERC-20 detector and the bridge detector both store the same USDC.e transfer
+    rollups.merge("large_transfers", [record(100)], 1, 199)
+    rollups.merge("usdc_bridge", [record(100), record(150, value_usd=5000.0)], 1, 199)
+
+    assert rollups.token_volume("USDC.e", "2023-11-14", "2023-11-15") == {"count": 2, "value": 15000.0, "value_usd": 15000.0, "max_usd": 10000.0}
+    assert rollups.token_volume("USDC.e", "2023-11-14 22:00:00", "2023-11-14 23:00:00")["count"] == 2
+    assert rollups.token_volume("USDC.e", "2023-11-14", "2023-11-15", source="large_transfers")["value_usd"] == 10000.0
+    assert rollups.top_addresses("2023-11-14", "2023-11-15") == [("0xfrom", 2, 15000.0, 15000.0)]
+    assert rollups.net_flow("0xto", "2023-11-14", "2023-11-15")["USDC.e"]["in_usd"] == 15000.0
+
+    # Rescanning one source's range leaves the other's copy counted once
+    rollups.merge("usdc_bridge", [], 1, 199)
+    assert rollups.token_volume("USDC.e", "2023-11-14", "2023-11-15")["value_usd"] == 10000.0
+
+
+def test_older_database_gets_the_all_sources_rollups(rollup_db):
+    rollups.merge("large_transfers", [record(100)], 1, 199)
+    connection = rollups.get_connection()
+    with connection:
+        connection.execute("DELETE FROM token_rollups WHERE source = ?", (rollups.ALL_SOURCES,))
+    connection.close()
+    rollups._connection = None
+    assert rollups.token_volume("USDC.e", "2023-11-14", "2023-11-15")["count"] == 1
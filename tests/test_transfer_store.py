@@ -0,0 +1,99 @@
+import pytest
+import rollups
+import transfer_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(transfer_store, "MANIFEST_FILE", str(tmp_path / "store" / "manifest.json"))
+    monkeypatch.setattr(rollups, "merge", lambda *args: None)
+    return tmp_path
+
+
+def detection(block_number, log_index=-1, tx_hash=None):
+    return {
+        "tx_hash": tx_hash or f"0x{block_number:064x}",
+        "log_index": log_index,
+        "from": "0xfrom",
+        "to": "0xto",
+        "value_xdc": 1000000.0,
+        "value_usd": 50000.0,
+        "token_symbol": "XDC",
+        "block_number": block_number,
+        "timestamp": "2023-11-14 22:13:20",
+    }
+
+
+def test_duplicate_detections_are_stored_once(store):
+    rows = [detection(10), detection(10, tx_hash=f"{10:064x}"), detection(10, log_index=3), detection(20)]
+    transfer_store.append_transfers("large_transfers", rows, 1, 100)
+    df = transfer_store.read_transfers(sources=["large_transfers"])
+    assert sorted(zip(df["block_number"], df["log_index"])) == [(10, -1), (10, 3), (20, -1)]
+
+
+def stored_blocks(source="large_transfers"):
+    return sorted(transfer_store.read_transfers(sources=[source])["block_number"])
+
+
+def test_rescan_with_other_boundaries_replaces_the_range(store):
+    transfer_store.append_transfers("large_transfers", [detection(block) for block in range(10, 50, 10)], 1, 49, latest=False)
+    transfer_store.append_transfers("large_transfers", [detection(block) for block in range(50, 150, 10)], 50, 149, latest=False)
+    # Rescan 30 to 79 in one chunk: it finds the transfers again, except the one at block 60
+    rescan = [detection(block) for block in (30, 40, 50, 70)]
+    transfer_store.append_transfers("large_transfers", rescan, 30, 79, latest=False)
+    assert stored_blocks() == [10, 20, 30, 40, 50, 70, 80, 90, 100, 110, 120, 130, 140]
+
+    files = transfer_store.record_run("large_transfers", 30, 79)
+    assert [path.split("/")[-1] for path in files] == ["part-large_transfers-30-79.parquet"]
+    partition = transfer_store.load_manifest()["partitions"]["date=2023-11-14/token=XDC"]
+    assert sum(partition["rows"].values()) == 13
+
+
+def test_rescan_that_finds_nothing_drops_the_old_rows(store):
+    transfer_store.append_transfers("large_transfers", [detection(10), detection(20)], 1, 49)
+    transfer_store.append_transfers("large_transfers", [], 1, 49)
+    assert stored_blocks() == []
+    assert transfer_store.load_manifest()["runs"]["large_transfers"]["files"] == []
+
+
+def test_settled_partitions_are_compacted(store):
+    for start in range(0, 80, 10):
+        transfer_store.append_transfers("large_transfers", [detection(start + 5)], start, start + 9, latest=False)
+    transfer_store.append_transfers("usdc_bridge", [detection(5, log_index=1)], 0, 9, latest=False)
+    partition = transfer_store.load_manifest()["partitions"]["date=2023-11-14/token=XDC"]
+    assert sorted(partition["files"]) == ["part-large_transfers-0-79.parquet", "part-usdc_bridge-0-9.parquet"]
+    assert stored_blocks() == list(range(5, 80, 10))
+
+    # Rescans still replace their blocks inside the compacted file
+    transfer_store.append_transfers("large_transfers", [], 40, 59, latest=False)
+    assert stored_blocks() == [5, 15, 25, 35, 65, 75]
+    assert stored_blocks("usdc_bridge") == [5]
+
+
+def test_rollups_rebuild_from_a_rescanned_store(store, monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_FILE", str(store / "rollups.db"))
+    monkeypatch.setattr(rollups, "_connection", None)
+    transfer_store.append_transfers("large_transfers", [detection(block) for block in range(10, 100, 10)], 1, 99, latest=False)
+    transfer_store.append_transfers("large_transfers", [detection(50)], 41, 60, latest=False)
+    rollups.rebuild_from_store()
+    assert rollups.token_volume("XDC", "2023-11-14", "2023-11-15")["count"] == 8
+
+
+def test_labels_are_stored_and_older_files_read_without_them(store):
+    import pyarrow.parquet as pq
+
+    labeled = dict(detection(10), from_label="Binance hot wallet", to_label=None)
+    transfer_store.append_transfers("large_transfers", [labeled], 1, 49, latest=False)
+    assert transfer_store.read_records_after("large_transfers", 0, ["block_number", "from_label", "to_label"]) == [
+        {"block_number": 10, "from_label": "Binance hot wallet", "to_label": None}
+    ]
+
+    # A file written before the label columns existed
+    transfer_store.append_transfers("large_transfers", [detection(60)], 50, 99, latest=False)
+    path = store / "store" / "date=2023-11-14" / "token=XDC" / "part-large_transfers-50-99.parquet"
+    pq.write_table(pq.read_table(path).drop_columns(["from_label", "to_label"]), path)
+    df = transfer_store.read_transfers(sources=["large_transfers"])
+    assert df["from_label"][0] == "Binance hot wallet" and df["from_label"].isna()[1]
+    transfer_store.append_transfers("large_transfers", [], 70, 79, latest=False)
+    assert stored_blocks() == [10, 60]